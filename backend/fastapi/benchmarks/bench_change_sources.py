@@ -0,0 +1,235 @@
+"""
+Change source benchmark
+Compares polling (updated_at / rowversion) with the native change log of PostgreSQL and SQL Server
+
+Creates a scratch table in each given database, records a watermark,
+changes a fraction of the rows and times detecting them both ways: a
+full pass over the change batches, then key lookups for every batch as
+the cloud pass of BiDirectionalSync does. For PostgreSQL it also counts
+how often the replication slot's WAL was decoded. Drops the table (and
+the replication slot it created) again.
+
+The containers of the `sync-test` compose profile provide both servers:
+
+    docker compose --profile sync-test up -d sync-test-postgres sync-test-mssql
+    python -m benchmarks.bench_change_sources --rows 200000 --changes 20000 \\
+        --pg-dsn "host=localhost port=55432 dbname=postgres user=postgres password=sync-test" \\
+        --mssql-dsn "DRIVER={ODBC Driver 17 for SQL Server};SERVER=localhost,51433;UID=sa;PWD=Sync-test-1"
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.bidirectional_sync import ChangeDetector
+from services.change_sources import MSSQLChangeTrackingSource, PostgresLogicalReplicationSource
+
+PG_TABLE = 'bench_change_sources'
+MSSQL_DATABASE = 'bench_change_sources'
+MSSQL_TABLE = 'dbo.bench_change_sources'
+SLOT_NAME = 'bench_change_sources'
+
+
+def setup_postgres(dsn, rows):
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {PG_TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {PG_TABLE} (
+                id integer PRIMARY KEY,
+                name varchar(100) NOT NULL,
+                quantity integer NOT NULL,
+                is_deleted boolean NOT NULL DEFAULT false,
+                updated_at timestamp NOT NULL DEFAULT now()
+            )
+        """)
+        cursor.execute(f"CREATE INDEX ON {PG_TABLE} (updated_at, id)")
+        cursor.execute(f"""
+            INSERT INTO {PG_TABLE} (id, name, quantity, updated_at)
+            SELECT i, 'item ' || i, i % 100, now() - interval '1 day'
+            FROM generate_series(1, %s) AS i
+        """, (rows,))
+    finally:
+        conn.close()
+
+
+def change_postgres(dsn, changes):
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        # One statement per 1000 rows, so the log holds many transactions
+        for first in range(1, changes + 1, 1000):
+            cursor.execute(
+                f"UPDATE {PG_TABLE} SET quantity = quantity + 1, updated_at = now() "
+                f"WHERE id BETWEEN %s AND %s",
+                (first, min(first + 999, changes))
+            )
+    finally:
+        conn.close()
+
+
+def teardown_postgres(dsn):
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {PG_TABLE}")
+        cursor.execute(
+            "SELECT pg_drop_replication_slot(slot_name) FROM pg_replication_slots WHERE slot_name = %s",
+            (SLOT_NAME,)
+        )
+    finally:
+        conn.close()
+
+
+def mssql_database_dsn(dsn):
+    return f"{dsn.rstrip(';')};DATABASE={MSSQL_DATABASE}"
+
+
+def setup_mssql(dsn, rows):
+    import pyodbc
+    conn = pyodbc.connect(dsn, autocommit=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"IF DB_ID('{MSSQL_DATABASE}') IS NULL CREATE DATABASE {MSSQL_DATABASE}")
+        cursor.execute(
+            f"IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_databases WHERE database_id = DB_ID('{MSSQL_DATABASE}')) "
+            f"ALTER DATABASE {MSSQL_DATABASE} SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 1 DAYS, AUTO_CLEANUP = ON)"
+        )
+    finally:
+        conn.close()
+
+    conn = pyodbc.connect(mssql_database_dsn(dsn), autocommit=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"IF OBJECT_ID('{MSSQL_TABLE}') IS NOT NULL DROP TABLE {MSSQL_TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {MSSQL_TABLE} (
+                id int PRIMARY KEY,
+                name nvarchar(100) NOT NULL,
+                quantity int NOT NULL,
+                is_deleted bit NOT NULL DEFAULT 0,
+                rv_column rowversion
+            )
+        """)
+        cursor.execute(f"CREATE INDEX ix_rv ON {MSSQL_TABLE} (rv_column)")
+        cursor.execute(f"ALTER TABLE {MSSQL_TABLE} ENABLE CHANGE_TRACKING")
+        cursor.execute(f"""
+            WITH n AS (
+                SELECT TOP (?) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+                FROM sys.all_objects a CROSS JOIN sys.all_objects b
+            )
+            INSERT INTO {MSSQL_TABLE} (id, name, quantity)
+            SELECT i, CONCAT('item ', i), i % 100 FROM n
+        """, rows)
+    finally:
+        conn.close()
+
+
+def change_mssql(dsn, changes):
+    import pyodbc
+    conn = pyodbc.connect(mssql_database_dsn(dsn), autocommit=True)
+    try:
+        cursor = conn.cursor()
+        for first in range(1, changes + 1, 1000):
+            cursor.execute(
+                f"UPDATE {MSSQL_TABLE} SET quantity = quantity + 1 WHERE id BETWEEN ? AND ?",
+                first, min(first + 999, changes)
+            )
+    finally:
+        conn.close()
+
+
+def teardown_mssql(dsn):
+    import pyodbc
+    conn = pyodbc.connect(mssql_database_dsn(dsn), autocommit=True)
+    try:
+        conn.cursor().execute(f"IF OBJECT_ID('{MSSQL_TABLE}') IS NOT NULL DROP TABLE {MSSQL_TABLE}")
+    finally:
+        conn.close()
+
+
+def count_decodes(source):
+    """Wrap the WAL decode of a PostgreSQL source to count the scans of the slot"""
+    decode = source._decoded_transactions
+    source.decodes = 0
+
+    def counted(*args):
+        source.decodes += 1
+        return decode(*args)
+
+    source._decoded_transactions = counted
+
+
+def measure(name, detector, table, since, until):
+    """Full pass over the change batches, with a key lookup per batch like the cloud pass"""
+    detected = 0
+    started = time.perf_counter()
+    for batch in detector.detect_change_batches(table, since, ['id'], None, until):
+        detected += len(batch)
+        detector.fetch_changes_for_keys(table, since, ['id'], [c.primary_key for c in batch], until)
+    seconds = time.perf_counter() - started
+
+    decodes = f"   {detector.decodes} WAL decodes" if hasattr(detector, 'decodes') else ""
+    print(f"{name:>16}: {detected:>9,} changes in {seconds:7.2f}s{decodes}")
+
+
+def bench_postgres(dsn, args):
+    setup_postgres(dsn, args.rows)
+    try:
+        polling = ChangeDetector(dsn, 'postgresql', 'local', args.batch_size)
+        native = PostgresLogicalReplicationSource(dsn, 'local', args.batch_size, SLOT_NAME)
+        count_decodes(native)
+        since = {'polling': polling.get_high_watermark(PG_TABLE), 'native': native.get_high_watermark(PG_TABLE)}
+
+        change_postgres(dsn, args.changes)
+        measure("pg polling", polling, PG_TABLE, since['polling'], polling.get_high_watermark(PG_TABLE))
+        measure("pg wal2json", native, PG_TABLE, since['native'], native.get_high_watermark(PG_TABLE))
+    finally:
+        teardown_postgres(dsn)
+
+
+def bench_mssql(dsn, args):
+    setup_mssql(dsn, args.rows)
+    database_dsn = mssql_database_dsn(dsn)
+    try:
+        polling = ChangeDetector(database_dsn, 'mssql', 'local', args.batch_size)
+        native = MSSQLChangeTrackingSource(database_dsn, 'local', args.batch_size)
+        since = {'polling': polling.get_high_watermark(MSSQL_TABLE), 'native': native.get_high_watermark(MSSQL_TABLE)}
+
+        change_mssql(dsn, args.changes)
+        measure("mssql polling", polling, MSSQL_TABLE, since['polling'], polling.get_high_watermark(MSSQL_TABLE))
+        measure("mssql tracking", native, MSSQL_TABLE, since['native'], native.get_high_watermark(MSSQL_TABLE))
+    finally:
+        teardown_mssql(dsn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pg-dsn', help='libpq connection string; needs wal_level=logical and wal2json')
+    parser.add_argument('--mssql-dsn', help='ODBC connection string without DATABASE')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--changes', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    if not args.pg_dsn and not args.mssql_dsn:
+        parser.error("give --pg-dsn and/or --mssql-dsn")
+
+    print(f"{args.changes:,} of {args.rows:,} rows changed")
+    if args.pg_dsn:
+        bench_postgres(args.pg_dsn, args)
+    if args.mssql_dsn:
+        bench_mssql(args.mssql_dsn, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Event ingestion benchmark
+Compares one INSERT per event with the buffered COPY group commit of services.event_ingest
+
+Creates a scratch tenant schema with an events table in a local
+PostgreSQL, drives it with concurrent simulated devices and drops it again.
+Every device sends its next event as soon as the previous one is
+acknowledged; latency is measured from submit to commit.
+
+Usage (needs benchmarks/requirements.txt):
+    python -m benchmarks.bench_ingest --dsn postgresql://postgres@localhost/postgres --events 200000 --devices 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import asyncpg
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.event_ingest import EventIngestor, IngestQueueFull
+
+TENANT_EVENTS_SQL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'infra', 'postgres', 'tenant_events.sql'
+)
+
+TENANT = 'bench_ingest'
+SCHEMA = f'tenant_{TENANT}'
+
+
+async def create_schema(dsn, notify):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+        await conn.execute(f"""
+            CREATE TABLE {SCHEMA}.events (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                device_id VARCHAR(255) NOT NULL,
+                event_type VARCHAR(100) NOT NULL,
+                payload JSONB NOT NULL,
+                timestamp TIMESTAMPTZ DEFAULT NOW(),
+                processed BOOLEAN DEFAULT false,
+                processed_at TIMESTAMPTZ,
+                error_message TEXT,
+                retry_count INTEGER DEFAULT 0,
+                seq BIGINT GENERATED ALWAYS AS IDENTITY UNIQUE
+            )
+        """)
+        await conn.execute(f"CREATE INDEX ON {SCHEMA}.events (device_id, timestamp DESC)")
+        await conn.execute(f"CREATE INDEX ON {SCHEMA}.events (timestamp DESC)")
+        if notify == 'row':
+            # The per-row trigger of earlier versions of infra/postgres/tenant_events.sql
+            await conn.execute(f"""
+                CREATE FUNCTION {SCHEMA}.notify_event() RETURNS TRIGGER AS $$
+                BEGIN
+                    PERFORM pg_notify('{SCHEMA}_events', json_build_object(
+                        'id', NEW.id, 'device_id', NEW.device_id, 'event_type', NEW.event_type,
+                        'timestamp', NEW.timestamp, 'payload', NEW.payload
+                    )::text);
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            await conn.execute(f"""
+                CREATE TRIGGER event_notify AFTER INSERT ON {SCHEMA}.events
+                FOR EACH ROW EXECUTE FUNCTION {SCHEMA}.notify_event()
+            """)
+        elif notify == 'statement':
+            # The statement-level trigger of infra/postgres/tenant_events.sql
+            sql = open(TENANT_EVENTS_SQL).read()
+            function = sql[sql.index('CREATE OR REPLACE FUNCTION tenant_:tenant_name.notify_events()'):]
+            function = function[:function.index('LANGUAGE plpgsql;') + len('LANGUAGE plpgsql')]
+            await conn.execute(function.replace('tenant_:tenant_name', SCHEMA))
+            await conn.execute(f"""
+                CREATE TRIGGER event_notify AFTER INSERT ON {SCHEMA}.events
+                REFERENCING NEW TABLE AS inserted
+                FOR EACH STATEMENT EXECUTE FUNCTION {SCHEMA}.notify_events()
+            """)
+    finally:
+        await conn.close()
+
+
+async def drop_schema(dsn):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    finally:
+        await conn.close()
+
+
+def payload(device, sequence):
+    return {"temperature": 20 + sequence % 10, "humidity": 40 + device % 20, "sequence": sequence}
+
+
+async def drive(send, events, devices):
+    """Closed loop: `devices` senders share `events` sends; returns (seconds, latencies, rejected)"""
+    latencies = []
+    rejected = 0
+    remaining = [events]
+
+    async def device(number):
+        nonlocal rejected
+        sequence = 0
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            sequence += 1
+            started = time.perf_counter()
+            while True:
+                try:
+                    await send(f"device-{number:05d}", payload(number, sequence))
+                    break
+                except IngestQueueFull as e:
+                    rejected += 1
+                    await asyncio.sleep(min(e.retry_after, 0.05))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(device(i) for i in range(devices)))
+    return time.perf_counter() - started, np.array(latencies), rejected
+
+
+async def bench_naive(dsn, events, devices, connections):
+    pool = await asyncpg.create_pool(dsn, min_size=connections, max_size=connections)
+    sql = f"INSERT INTO {SCHEMA}.events (device_id, event_type, payload) VALUES ($1, $2, $3)"
+
+    async def send(device_id, data):
+        async with pool.acquire() as conn:
+            await conn.execute(sql, device_id, "reading", json.dumps(data))
+
+    try:
+        return await drive(send, events, devices)
+    finally:
+        await pool.close()
+
+
+async def bench_pipeline(dsn, events, devices, args):
+    ingestor = EventIngestor(
+        dsn, queue_size=args.queue_size, batch_size=args.batch_size,
+        flush_ms=args.flush_ms, writers=args.writers
+    )
+    await ingestor.start()
+
+    async def send(device_id, data):
+        _, done = ingestor.submit(TENANT, device_id, "reading", data)
+        await done
+
+    try:
+        return await drive(send, events, devices)
+    finally:
+        await ingestor.stop()
+
+
+def report(name, seconds, latencies, rejected):
+    print(
+        f"{name:>10}: {len(latencies) / seconds:>10,.0f} events/s   "
+        f"p50 {np.percentile(latencies, 50) * 1000:7.1f} ms   "
+        f"p99 {np.percentile(latencies, 99) * 1000:7.1f} ms   "
+        f"429s {rejected}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default='postgresql://postgres@localhost/postgres')
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--devices', type=int, default=1000, help='concurrent senders')
+    parser.add_argument('--connections', type=int, default=20, help='pool size of the per-event INSERT baseline')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--flush-ms', type=int, default=20)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=50000)
+    parser.add_argument(
+        '--notify', choices=('row', 'statement'),
+        help='install a NOTIFY trigger: per-row with the whole event, or per-statement with seq ranges'
+    )
+    parser.add_argument('--skip-naive', action='store_true')
+    args = parser.parse_args()
+
+    print(f"{args.events:,} events from {args.devices:,} devices")
+    try:
+        if not args.skip_naive:
+            await create_schema(args.dsn, args.notify)
+            report("insert", *await bench_naive(args.dsn, args.events, args.devices, args.connections))
+        await create_schema(args.dsn, args.notify)
+        report("copy", *await bench_pipeline(args.dsn, args.events, args.devices, args))
+    finally:
+        await drop_schema(args.dsn)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Schema introspection benchmark
+Compares per-table information_schema introspection with the pg_catalog bulk query
+
+Creates a scratch schema with generated tables in a local PostgreSQL,
+introspects it both ways and drops it again.
+
+Usage:
+    python -m benchmarks.bench_introspection --dsn "dbname=postgres user=postgres" --tables 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.postgres_introspector import PostgreSQLIntrospector
+
+SCHEMA = 'bench_introspection'
+
+
+def create_schema(dsn, count):
+    """`count` tables of 12 columns: serial key, FK to the previous table, two indexes"""
+    with psycopg2.connect(dsn) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+            for i in range(count):
+                parent = f"REFERENCES {SCHEMA}.t_{i - 1:05d} (id)" if i else ""
+                cursor.execute(f"""
+                    CREATE TABLE {SCHEMA}.t_{i:05d} (
+                        id serial PRIMARY KEY,
+                        parent_id integer {parent},
+                        code varchar(32) NOT NULL UNIQUE,
+                        name varchar(200),
+                        description text,
+                        amount numeric(18, 2),
+                        quantity integer,
+                        is_active boolean DEFAULT true,
+                        created_at timestamp DEFAULT now(),
+                        updated_at timestamp,
+                        attributes jsonb,
+                        tags text[]
+                    )
+                """)
+                cursor.execute(f"CREATE INDEX ON {SCHEMA}.t_{i:05d} (parent_id, created_at)")
+            cursor.execute("ANALYZE")
+
+
+def drop_schema(dsn):
+    with psycopg2.connect(dsn) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+def measure(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.2f}s  {count / elapsed:10,.0f} tables/sec")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default='dbname=postgres', help='libpq connection string')
+    parser.add_argument('--tables', type=int, default=2000, help='Number of generated tables')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated schema')
+    args = parser.parse_args()
+
+    print(f"Creating {args.tables:,} tables in schema {SCHEMA}...")
+    create_schema(args.dsn, args.tables)
+    introspector = PostgreSQLIntrospector(args.dsn)
+
+    try:
+        per_table = measure(
+            "per table (information_schema)", args.tables,
+            lambda: introspector.get_all_tables_info(SCHEMA, bulk=False)
+        )
+        bulk = measure(
+            "bulk (pg_catalog)", args.tables,
+            lambda: introspector.get_all_tables_info(SCHEMA)
+        )
+
+        assert [t.name for t in per_table] == [t.name for t in bulk], "table lists differ"
+        for old, new in zip(per_table, bulk):
+            assert old.primary_keys == new.primary_keys, f"{old.name}: primary keys differ"
+            assert old.columns == new.columns, f"{old.name}: columns differ"
+        print(
+            f"  -> {len(bulk):,} tables, identical columns and keys; "
+            f"{sum(len(t.foreign_keys) for t in bulk):,} foreign keys, "
+            f"{sum(len(t.indexes) for t in bulk):,} indexes"
+        )
+    finally:
+        if not args.keep:
+            drop_schema(args.dsn)
+
+
+if __name__ == '__main__':
+    main()
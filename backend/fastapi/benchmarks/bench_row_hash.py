@@ -0,0 +1,87 @@
+"""
+Row hashing benchmark
+Compares the legacy str()+SHA-256 row hash with the canonical blake2b hashing
+
+Usage:
+    python -m benchmarks.bench_row_hash --rows 1000000
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.row_hash import hash_row, hash_rows
+
+COLUMNS = [
+    'customer_id', 'name', 'email', 'balance', 'credit_limit',
+    'is_active', 'created_at', 'city', 'notes', 'score'
+]
+
+
+def legacy_hash(data):
+    """Hash as computed by ChangeDetector.calculate_hash before canonical hashing"""
+    sorted_data = {k: data[k] for k in sorted(data.keys())}
+    return hashlib.sha256(str(sorted_data).encode()).hexdigest()
+
+
+def generate_rows(count, seed=42):
+    """Synthetic customers table"""
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1)
+    cities = ['Istanbul', 'Ankara', 'Izmir', 'Erbil', 'Baghdad']
+    rows = []
+    for i in range(count):
+        rows.append((
+            i,
+            f"Customer {i}",
+            f"customer{i}@example.com",
+            Decimal(rng.randint(0, 10_000_000)) / 100,
+            rng.random() * 50000,
+            rng.random() < 0.9,
+            base + timedelta(seconds=rng.randint(0, 30_000_000)),
+            rng.choice(cities),
+            None if rng.random() < 0.5 else "VIP",
+            rng.randint(0, 1000),
+        ))
+    return rows
+
+
+def measure(label, count, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f}s  {count / elapsed:12,.0f} rows/sec")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} synthetic rows...")
+    rows = generate_rows(args.rows)
+    dicts = [dict(zip(COLUMNS, row)) for row in rows]
+
+    legacy = measure("legacy sha256(str(dict))", args.rows, lambda: [legacy_hash(d) for d in dicts])
+    per_row = measure("hash_row (canonical)", args.rows, lambda: [hash_row(d) for d in dicts])
+
+    def paged():
+        for i in range(0, len(rows), args.page_size):
+            hash_rows(COLUMNS, rows[i:i + args.page_size])
+
+    batch = measure(f"hash_rows (page={args.page_size})", args.rows, paged)
+
+    print(f"\nSpeedup vs legacy: hash_row {legacy / per_row:.2f}x, hash_rows {legacy / batch:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
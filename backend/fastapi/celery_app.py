@@ -7,7 +7,7 @@ celery_app = Celery(
     "berqenas_tasks",
     broker=REDIS_URL,
     backend=REDIS_URL,
-    include=["services.bidirectional_sync"]
+    include=["services.bidirectional_sync", "services.sync_tasks"]
 )
 
 celery_app.conf.update(
@@ -16,6 +16,12 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    beat_schedule={
+        "dispatch-due-syncs": {
+            "task": "services.sync_tasks.dispatch_due_syncs",
+            "schedule": 60.0,
+        },
+    },
 )
 
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+#!/bin/sh
+# Start each container with an empty metrics directory of its own: sample
+# files of processes from before a restart would otherwise be exported forever.
+# Replicas of a service share the service's directory on the volume, so each
+# container writes to a subdirectory named after its hostname; process IDs of
+# different containers never meet and a restart only clears its own files.
+set -e
+
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    PROMETHEUS_MULTIPROC_DIR="$PROMETHEUS_MULTIPROC_DIR/${HOSTNAME:-$(hostname)}"
+    export PROMETHEUS_MULTIPROC_DIR
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+exec "$@"
@@ -6,7 +6,7 @@ FastAPI Backend - Main Application
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 import time
 import logging
@@ -33,6 +33,12 @@ async def lifespan(app: FastAPI):
     logger.info("✅ Database tables created/verified.")
     yield
     # Shutdown: Close connections, cleanup
+    from services.connection_pool import close_all_pools
+    from services.event_hub import stop_hub
+    from services.event_ingest import stop_ingestor
+    await stop_hub()
+    await stop_ingestor()  # Writes the events still queued
+    close_all_pools()
     logger.info("👋 Berqenas Platform shutting down...")
 
 
@@ -56,6 +62,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Continuation token, total count and query warnings of list endpoints
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Query-Warning"],
 )
 
 # GZip Middleware
@@ -96,6 +104,15 @@ async def health_check():
     }
 
 
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["System"], include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (sync throughput, latency and lag from all workers)"""
+    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    from services.sync_metrics import metrics_registry
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
 # Root endpoint
 @app.get("/", tags=["System"])
 async def root():
@@ -121,6 +138,8 @@ app.include_router(autogen_api.router, prefix="/api/v1/autogen", tags=["Auto-API
 app.include_router(remote_sync_api.router, prefix="/api/v1/sync", tags=["Remote Database Sync"])
 from routers import dashboard_api
 app.include_router(dashboard_api.router, prefix="/api/v1/dashboard", tags=["Dashboard Stats"])
+from routers import data_api
+app.include_router(data_api.router, prefix="/api/v1/data", tags=["Data API"])
 
 
 if __name__ == "__main__":
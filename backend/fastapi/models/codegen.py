@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy.orm import relationship
+from database import Base
+from datetime import datetime
+
+
+class CodegenJob(Base):
+    __tablename__ = "codegen_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    database = Column(String, nullable=False, index=True)  # Database name, as in /autogen/status/{database}
+    database_key = Column(String, nullable=False)
+    output_dir = Column(String, nullable=False)
+    status = Column(String, default="pending")  # pending, introspecting, generating, completed, failed
+    total_tables = Column(Integer, nullable=True)
+    completed_tables = Column(Integer, default=0)
+    failed_tables = Column(Integer, default=0)
+    files_written = Column(Integer, default=0)  # Files whose content changed
+    files_unchanged = Column(Integer, default=0)
+    introspection_seconds = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    error_message = Column(Text, nullable=True)
+
+    tables = relationship("CodegenJobTable", back_populates="job", cascade="all, delete-orphan")
+
+
+class CodegenJobTable(Base):
+    __tablename__ = "codegen_job_tables"
+
+    job_id = Column(Integer, ForeignKey("codegen_jobs.id"), primary_key=True)
+    table_name = Column(String, primary_key=True)
+    status = Column(String, nullable=False)  # written, unchanged, skipped (schema unchanged), failed
+    files_written = Column(Integer, default=0)
+    seconds = Column(Float, nullable=True)
+    error_message = Column(Text, nullable=True)
+    completed_at = Column(DateTime, default=datetime.utcnow)
+
+    job = relationship("CodegenJob", back_populates="tables")
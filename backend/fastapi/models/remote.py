@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -20,6 +20,15 @@ class RemoteDatabase(Base):
     password = Column(String, nullable=False)  # Should be encrypted in real app
     schema = Column(String, default="public")
     
+    # Sync Settings (existing databases: infra/postgres/remote_sync_migration.sql)
+    sync_interval_minutes = Column(Integer, nullable=True)  # None = manual sync only
+    sync_tables = Column(Text, nullable=True)  # JSON list, None = all tables
+    conflict_strategy = Column(String, default="latest_wins")
+    max_sync_connections = Column(Integer, default=4)  # Concurrent table syncs against this remote
+    change_source = Column(String, default="polling")  # polling, native (Change Tracking / logical replication)
+    sync_fetch_batch_size = Column(Integer, nullable=True)  # Learned by adaptive batching; None = default
+    sync_apply_batch_size = Column(Integer, nullable=True)
+    
     # Status
     api_enabled = Column(Boolean, default=False)
     public_endpoint = Column(String, nullable=True)
@@ -66,3 +75,31 @@ class SyncLog(Base) :
     level = Column(String, default="info")  # info, warning, error
     message = Column(String, nullable=False)
     timestamp = Column(DateTime, server_default=func.now())
+
+
+class SyncCheckpoint(Base):
+    __tablename__ = "sync_checkpoints"
+    __table_args__ = (UniqueConstraint("remote_db_id", "table_name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    remote_db_id = Column(Integer, ForeignKey("remote_databases.id"), nullable=False)
+    table_name = Column(String, nullable=False)
+    cloud_watermark = Column(Text, nullable=True)  # JSON: updated_at high watermark
+    local_watermark = Column(Text, nullable=True)  # JSON: updated_at or rowversion high watermark
+    cloud_position = Column(Text, nullable=True)  # JSON keyset position of an unfinished run
+    local_position = Column(Text, nullable=True)
+    last_job_id = Column(Integer, ForeignKey("sync_jobs.id"), nullable=True)
+    echoes_suppressed = Column(Integer, default=0)  # Rows dropped because we wrote them ourselves
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SyncRowHash(Base):
+    __tablename__ = "sync_row_hashes"
+
+    # Hash of each row's content as of the last time both sides agreed on it
+    remote_db_id = Column(Integer, ForeignKey("remote_databases.id"), primary_key=True)
+    table_name = Column(String, primary_key=True)
+    primary_key_value = Column(String, primary_key=True)
+    row_hash = Column(String(16), nullable=False)
+    written_to = Column(String, nullable=True)  # 'cloud'/'local' side the sync wrote this version to
+    job_id = Column(Integer, nullable=True)
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy.orm import relationship
+from database import Base
+from datetime import datetime
+
+
+class SchemaSnapshot(Base):
+    __tablename__ = "schema_snapshots"
+    __table_args__ = (UniqueConstraint("database_key", "schema_name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    database_key = Column(String, nullable=False)  # e.g. mssql://user@server/database, no password
+    schema_name = Column(String, nullable=False)
+    fingerprint = Column(String(64), nullable=True)  # SHA-256 over all table versions
+    checked_at = Column(DateTime, default=datetime.utcnow)
+
+    tables = relationship("SchemaTableSnapshot", back_populates="snapshot", cascade="all, delete-orphan")
+
+
+class SchemaTableSnapshot(Base):
+    __tablename__ = "schema_table_snapshots"
+
+    snapshot_id = Column(Integer, ForeignKey("schema_snapshots.id"), primary_key=True)
+    table_name = Column(String, primary_key=True)
+    version = Column(String, nullable=False)  # Introspector.get_table_versions value
+    table_info = Column(Text, nullable=False)  # JSON: dataclasses.asdict(TableInfo)
+    generated_version = Column(String, nullable=True)  # Version the generated API files were written for
+    generated_dir = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    snapshot = relationship("SchemaSnapshot", back_populates="tables")
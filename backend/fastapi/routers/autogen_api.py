@@ -4,11 +4,21 @@ Endpoint for generating APIs from MSSQL tables
 """
 
 from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
+from sqlalchemy.orm import Session
+import hashlib
 import logging
 
+from database import get_db, SessionLocal
 from services.auto_api_generator import generate_api_for_database, MSSQLIntrospector
+from services.schema_cache import SchemaCache, database_key
+from services.dynamic_crud import engine as crud_engine
+from services.model_factory import model_factory
+from services.connection_pool import get_pool, run_blocking, DEFAULT_MAX_CONNECTIONS
+from services.codegen_jobs import JobProgress, create_job, latest_job, job_status
+from models.tenant import Tenant
+from models.user import User
 
 from services.auth import get_current_active_user
 
@@ -36,14 +46,116 @@ class GenerateAPIRequest(BaseModel):
     connection: DatabaseConnection
     tables: Optional[List[str]] = None  # If None, generate for all tables
     output_dir: str = "./generated_api"
+    # Connections the generated routers may open to the database
+    max_connections: int = Field(default=DEFAULT_MAX_CONNECTIONS, ge=1, le=1000)
+
+
+class MountRequest(BaseModel):
+    name: str  # Served under /api/v1/data/{name}/{table}
+    connection: DatabaseConnection
+    tables: Optional[List[str]] = None  # If None, mount all tables
+    # The tenant's max_connections sizes the pool when given, else max_connections
+    tenant: Optional[str] = None
+    max_connections: int = Field(default=DEFAULT_MAX_CONNECTIONS, ge=1, le=1000)
+
+
+def _run_cached_generation(
+    key: str,
+    connection_string: str,
+    schema: str,
+    output_dir: str,
+    job_id: int,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS
+):
+    """
+    Generate with a schema cache on a session of its own (runs after the
+    request), recording progress on the job
+    """
+    db = SessionLocal()
+    progress = JobProgress(db, job_id)
+    try:
+        cache = SchemaCache(db, key, MSSQLIntrospector(connection_string), schema)
+        tables = generate_api_for_database(
+            connection_string, schema, output_dir, cache=cache, progress=progress, max_connections=max_connections
+        )
+        progress.finish()
+        crud_engine.apply_schema(key, schema, tables)
+        return tables
+    except Exception as e:
+        logger.error(f"API generation job {job_id} failed: {e}")
+        db.rollback()
+        progress.finish(error=str(e))
+        raise
+    finally:
+        db.close()
+
+
+def _mount(
+    db: Session,
+    name: str,
+    key: str,
+    connection_string: str,
+    schema: str,
+    tables: Optional[List[str]] = None,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    owner: Optional[str] = None,
+    tenant: Optional[str] = None
+):
+    """
+    Mount a database on the dynamic CRUD engine from its cached schema
+
+    Mounts of the same connection string share one pool, sized by the
+    tenant's max_connections if a tenant is given. Raises LookupError for
+    an unknown tenant and PermissionError if name belongs to a tenant or
+    to another user's mount.
+    """
+    if db.query(Tenant).filter(Tenant.name == name).first() is not None:
+        raise PermissionError(f"'{name}' is reserved for a tenant")
+    if tenant is not None:
+        tenant_row = db.query(Tenant).filter(Tenant.name == tenant).first()
+        if tenant_row is None:
+            raise LookupError(f"Tenant '{tenant}' not found")
+        max_connections = tenant_row.max_connections or DEFAULT_MAX_CONNECTIONS
+    crud_engine.check_owner(name, owner)
+    introspector = MSSQLIntrospector(connection_string)
+    cache = SchemaCache(db, key, introspector, schema)
+    target = hashlib.sha256(connection_string.encode()).hexdigest()
+    pool_key = f"{key}#{target[:16]}"
+    mount = crud_engine.mount(
+        name,
+        "mssql",
+        get_pool(pool_key, introspector.get_connection, max_connections, target=target),
+        cache.tables(),
+        cache_key=key,
+        schema=schema,
+        table_filter=tables,
+        owner=owner,
+        pool_key=pool_key
+    )
+    return {
+        "success": True,
+        "mount": name,
+        "table_count": len(mount.tables),
+        "reintrospected_tables": len(cache.reintrospected),
+        # Tables without a primary key cannot be updated or paged safely
+        "skipped_tables": mount.skipped,
+        "base_path": f"/api/v1/data/{name}"
+    }
 
 
 @router.post("/introspect")
-async def introspect_database(connection: DatabaseConnection):
+async def introspect_database(
+    connection: DatabaseConnection,
+    refresh: bool = False,
+    db: Session = Depends(get_db)
+):
     """
     Introspect MSSQL database and return table information
     
-    This endpoint analyzes the database structure without generating APIs
+    This endpoint analyzes the database structure without generating APIs.
+    Results are cached; only tables whose definition changed are
+    re-introspected. refresh=true checks for changes even within the
+    cache window.
     """
     try:
         connection_string = (
@@ -54,8 +166,15 @@ async def introspect_database(connection: DatabaseConnection):
             f"PWD={connection.password}"
         )
         
-        introspector = MSSQLIntrospector(connection_string)
-        tables_info = introspector.get_all_tables_info(connection.schema)
+        cache = SchemaCache(
+            db,
+            database_key("mssql", connection.server, connection.database, connection.username),
+            MSSQLIntrospector(connection_string),
+            connection.schema
+        )
+        # Introspection runs blocking pyodbc queries; keep them off the event loop
+        tables_info = await run_blocking(cache.tables, refresh=refresh)
+        crud_engine.apply_schema(cache.key, cache.schema, tables_info)
         
         result = []
         for table in tables_info:
@@ -71,6 +190,7 @@ async def introspect_database(connection: DatabaseConnection):
             "database": connection.database,
             "schema": connection.schema,
             "table_count": len(result),
+            "reintrospected_tables": len(cache.reintrospected),
             "tables": result
         }
         
@@ -83,7 +203,11 @@ async def introspect_database(connection: DatabaseConnection):
 
 
 @router.post("/generate")
-async def generate_api(request: GenerateAPIRequest, background_tasks: BackgroundTasks):
+async def generate_api(
+    request: GenerateAPIRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     """
     Generate complete CRUD API for MSSQL database tables
     
@@ -93,6 +217,8 @@ async def generate_api(request: GenerateAPIRequest, background_tasks: Background
     3. Generate FastAPI routers with CRUD operations
     4. Create main router file
     
+    Progress is reported by /status/{database}.
+    
     Example:
     ```json
     {
@@ -118,12 +244,20 @@ async def generate_api(request: GenerateAPIRequest, background_tasks: Background
         
         logger.info(f"Generating API for database: {request.connection.database}")
         
+        key = database_key(
+            "mssql", request.connection.server, request.connection.database, request.connection.username
+        )
+        job_id = create_job(db, request.connection.database, key, request.output_dir).id
+        
         # Generate API (run in background for large databases)
         def generate_task():
-            tables = generate_api_for_database(
+            tables = _run_cached_generation(
+                key,
                 connection_string,
                 request.connection.schema,
-                request.output_dir
+                request.output_dir,
+                job_id,
+                request.max_connections
             )
             logger.info(f"API generation complete: {len(tables)} tables processed")
         
@@ -132,6 +266,7 @@ async def generate_api(request: GenerateAPIRequest, background_tasks: Background
         return {
             "success": True,
             "message": "API generation started",
+            "job_id": job_id,
             "database": request.connection.database,
             "output_dir": request.output_dir,
             "status": "processing"
@@ -145,19 +280,100 @@ async def generate_api(request: GenerateAPIRequest, background_tasks: Background
         )
 
 
-@router.get("/status/{database}")
-async def get_generation_status(database: str):
-    """Get API generation status"""
-    # TODO: Implement status tracking
+@router.post("/mount")
+async def mount_database(
+    request: MountRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Serve CRUD for a database's tables without generating files
+    
+    Routes are built in-process from the cached schema and are live at
+    once under /api/v1/data/{name}/{table}. Mounting again, or a schema
+    change picked up by /introspect, swaps them in place. A name belongs
+    to the user who mounted it; tenant names cannot be used (409).
+    """
+    connection = request.connection
+    try:
+        connection_string = (
+            f"DRIVER={{{connection.driver}}};"
+            f"SERVER={connection.server};"
+            f"DATABASE={connection.database};"
+            f"UID={connection.username};"
+            f"PWD={connection.password}"
+        )
+        key = database_key("mssql", connection.server, connection.database, connection.username)
+        return await run_blocking(
+            _mount, db, request.name, key, connection_string, connection.schema,
+            request.tables, request.max_connections, current_user.username, request.tenant
+        )
+        
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to mount database {connection.database}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to mount database: {str(e)}"
+        )
+
+
+@router.get("/mounts")
+async def list_mounts():
+    """List mounted databases"""
     return {
-        "database": database,
-        "status": "completed",
-        "message": "API generation completed successfully"
+        "mounts": [
+            {
+                "name": mount.name,
+                "database_type": mount.dialect.name,
+                "owner": mount.owner,
+                "table_count": len(mount.tables),
+                "pool": mount.pool.stats()
+            }
+            for mount in crud_engine.mounts.values()
+        ],
+        "model_cache": model_factory.stats()
     }
 
 
+@router.delete("/mount/{name}")
+async def unmount_database(name: str, current_user: User = Depends(get_current_active_user)):
+    """Stop serving a mounted database; only the user who mounted it may"""
+    try:
+        unmounted = crud_engine.unmount(name, current_user.username)
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    if not unmounted:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Nothing is mounted under '{name}'")
+    return {"success": True, "message": f"{name} unmounted"}
+
+
+@router.get("/status/{database}")
+async def get_generation_status(database: str, tables: bool = False, db: Session = Depends(get_db)):
+    """
+    Get the status of the latest API generation for a database
+    
+    Reports the phase, tables done out of total, files rewritten and
+    timings; tables=true adds the result of every table.
+    """
+    job = latest_job(db, database)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No API generation found for database {database}"
+        )
+    return job_status(job, include_tables=tables)
+
+
 @router.post("/tenant/{tenant_name}/generate")
-async def generate_api_for_tenant(tenant_name: str, background_tasks: BackgroundTasks):
+async def generate_api_for_tenant(
+    tenant_name: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     """
     Generate API for a specific tenant's database
     
@@ -177,6 +393,14 @@ async def generate_api_for_tenant(tenant_name: str, background_tasks: Background
     try:
         logger.info(f"Generating API for tenant: {tenant_name}")
         
+        # The generated routers' pool is sized by the tenant's max_connections
+        tenant = db.query(Tenant).filter(Tenant.name == tenant_name).first()
+        if tenant is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Tenant {tenant_name} not found"
+            )
+        
         # TODO: Get tenant database connection from database
         # For now, use mock data
         # In production, query: SELECT * FROM tenants WHERE name = tenant_name
@@ -207,12 +431,20 @@ async def generate_api_for_tenant(tenant_name: str, background_tasks: Background
         
         output_dir = f"./generated_api/tenant_{tenant_name}"
         
+        key = database_key(
+            "mssql", tenant_info["server"], tenant_info["database_name"], tenant_info["username"]
+        )
+        job_id = create_job(db, tenant_info["database_name"], key, output_dir).id
+        
         # Generate API in background
         def generate_task():
-            tables = generate_api_for_database(
+            tables = _run_cached_generation(
+                key,
                 connection_string,
                 "dbo",
-                output_dir
+                output_dir,
+                job_id,
+                tenant.max_connections or DEFAULT_MAX_CONNECTIONS
             )
             logger.info(f"API generation complete for tenant {tenant_name}: {len(tables)} tables processed")
         
@@ -221,6 +453,7 @@ async def generate_api_for_tenant(tenant_name: str, background_tasks: Background
         return {
             "success": True,
             "message": f"API generation started for tenant: {tenant_name}",
+            "job_id": job_id,
             "tenant": tenant_name,
             "database": tenant_info["database_name"],
             "output_dir": output_dir,
@@ -238,11 +471,12 @@ async def generate_api_for_tenant(tenant_name: str, background_tasks: Background
 
 
 @router.get("/tenant/{tenant_name}/tables")
-async def get_tenant_tables(tenant_name: str):
+async def get_tenant_tables(tenant_name: str, refresh: bool = False, db: Session = Depends(get_db)):
     """
     Get list of tables in tenant's database
     
-    Useful for previewing what APIs will be generated
+    Useful for previewing what APIs will be generated. Served from the
+    schema cache like /introspect.
     """
     try:
         # TODO: Get tenant database connection
@@ -261,8 +495,14 @@ async def get_tenant_tables(tenant_name: str):
             f"PWD={tenant_info['password']}"
         )
         
-        introspector = MSSQLIntrospector(connection_string)
-        tables_info = introspector.get_all_tables_info("dbo")
+        cache = SchemaCache(
+            db,
+            database_key("mssql", tenant_info["server"], tenant_info["database_name"], tenant_info["username"]),
+            MSSQLIntrospector(connection_string),
+            "dbo"
+        )
+        tables_info = await run_blocking(cache.tables, refresh=refresh)
+        crud_engine.apply_schema(cache.key, cache.schema, tables_info)
         
         result = []
         for table in tables_info:
@@ -287,6 +527,7 @@ async def get_tenant_tables(tenant_name: str):
             "tenant": tenant_name,
             "database": tenant_info["database_name"],
             "table_count": len(result),
+            "reintrospected_tables": len(cache.reintrospected),
             "tables": result
         }
         
@@ -0,0 +1,225 @@
+"""
+Data API
+CRUD on the tables of mounted databases, served by the dynamic CRUD engine
+"""
+
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Any, List, Optional
+from pydantic import ValidationError
+import logging
+
+from services.dynamic_crud import engine
+from services.crud_query import QuerySpec
+from services.connection_pool import PoolTimeout
+from services.bulk_write import BatchTooLarge, parse_items
+from services.auth import get_current_active_user
+from models.user import User
+
+
+def _check_mount_owner(mount: str, current_user: User = Depends(get_current_active_user)):
+    """A mount's rows are served only to the user who mounted it"""
+    try:
+        engine.check_owner(mount, current_user.username)
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+
+# Every route is under /{mount}, so the owner check covers all of them
+router = APIRouter(dependencies=[Depends(_check_mount_owner)])
+logger = logging.getLogger(__name__)
+
+
+def _not_found(e: LookupError):
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+def _bad_request(e: ValueError):
+    if isinstance(e, ValidationError):
+        # Field-level errors, as FastAPI reports them for declared bodies
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.errors(include_url=False))
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _busy(e: PoolTimeout):
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+
+@router.get("/{mount}/{table}")
+async def list_rows(
+    mount: str,
+    table: str,
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    fields: Optional[str] = None,
+    filters: Optional[List[str]] = Query(None, alias="filter"),
+    sort: Optional[str] = None,
+    count: bool = False
+):
+    """
+    List rows of a table, ordered by primary key
+    
+    Pages are keyset based: pass the X-Next-Cursor header of a response as
+    `cursor` to get the next page; there is no header on the last page.
+    `skip` (offset paging) still works but gets slower with depth.
+    
+    Queries run on the server:
+    - fields=a,b returns only those columns
+    - filter=column:op:value, repeatable; op is eq, ne, lt, lte, gt, gte,
+      in (comma-separated values) or prefix (text columns)
+    - sort=-created_at,id (a leading - sorts descending)
+    - count=true sets X-Total-Count to the number of matching rows
+    On large tables, filters and sorts that no index can serve are
+    rejected (or, if so configured, run with an X-Query-Warning header).
+    
+    format=ndjson streams every row after `cursor` (or the whole table)
+    as newline-delimited JSON, for exports.
+    """
+    try:
+        spec = QuerySpec.parse(fields, filters, sort, count)
+        if format == "ndjson":
+            rows = engine.stream_rows(mount, table, cursor, spec)
+            return StreamingResponse(rows, media_type="application/x-ndjson")
+        if spec:
+            page = await engine.query_page(mount, table, spec, limit, cursor, skip)
+            if page.next_cursor:
+                response.headers["X-Next-Cursor"] = page.next_cursor
+            if page.total is not None:
+                response.headers["X-Total-Count"] = str(page.total)
+            if page.warnings:
+                response.headers["X-Query-Warning"] = "; ".join(page.warnings)
+            return page.rows
+        if skip is not None and not cursor:
+            return await engine.list_rows(mount, table, skip, limit)
+        
+        rows, next_cursor = await engine.list_page(mount, table, limit, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+    except LookupError as e:
+        raise _not_found(e)
+    except PoolTimeout as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise _bad_request(e)
+
+
+async def _bulk_items(request: Request) -> List[Any]:
+    try:
+        return parse_items(await request.body(), request.headers.get("content-type", ""))
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except ValueError as e:
+        raise _bad_request(e)
+
+
+async def _bulk(operation, mount: str, table: str, request: Request, atomic: bool):
+    items = await _bulk_items(request)
+    try:
+        result = await operation(mount, table, items, atomic)
+    except LookupError as e:
+        raise _not_found(e)
+    except PoolTimeout as e:
+        raise _busy(e)
+    if result["errors"] and atomic:
+        return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=result)
+    return result
+
+
+@router.get("/{mount}/{table}/_schema")
+async def table_schema(mount: str, table: str):
+    """
+    JSON Schemas of a table's models: read (rows), create and update
+    (request bodies) and partial (rows of a fields= projection)
+    """
+    try:
+        _, compiled = engine.table(mount, table)
+    except LookupError as e:
+        raise _not_found(e)
+    models = compiled.models
+    return {
+        "fingerprint": models.fingerprint,
+        "read": models.read.model_json_schema(by_alias=True),
+        "create": models.create.model_json_schema(by_alias=True),
+        "update": models.update.model_json_schema(by_alias=True),
+        "partial": models.partial.model_json_schema(by_alias=True),
+    }
+
+
+# Bulk routes are declared before /{item_id} so that "bulk" is not taken
+# for an item id. Bodies are a JSON array or NDJSON
+# (Content-Type: application/x-ndjson); with atomic=false the valid rows
+# are committed and the failing ones reported.
+
+@router.post("/{mount}/{table}/bulk")
+async def bulk_create(mount: str, table: str, request: Request, atomic: bool = True):
+    """Insert many rows in one transaction; reports errors by row index"""
+    return await _bulk(engine.bulk_create, mount, table, request, atomic)
+
+
+@router.put("/{mount}/{table}/bulk")
+async def bulk_update(mount: str, table: str, request: Request, atomic: bool = True):
+    """Update many rows in one transaction; each row carries its key columns"""
+    return await _bulk(engine.bulk_update, mount, table, request, atomic)
+
+
+@router.delete("/{mount}/{table}/bulk")
+async def bulk_delete(mount: str, table: str, request: Request, atomic: bool = True):
+    """Delete many rows by key (objects with the key columns, or bare values for single-key tables)"""
+    return await _bulk(engine.bulk_delete, mount, table, request, atomic)
+
+
+@router.get("/{mount}/{table}/{item_id}")
+async def get_row(mount: str, table: str, item_id: str):
+    """Get a row by primary key (comma-separated values for composite keys)"""
+    try:
+        return await engine.get_row(mount, table, item_id)
+    except LookupError as e:
+        raise _not_found(e)
+    except PoolTimeout as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise _bad_request(e)
+
+
+@router.post("/{mount}/{table}", status_code=status.HTTP_201_CREATED)
+async def create_row(mount: str, table: str, item: Dict[str, Any] = Body(...)):
+    """Insert a row and return it as stored"""
+    try:
+        return await engine.create_row(mount, table, item)
+    except LookupError as e:
+        raise _not_found(e)
+    except PoolTimeout as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise _bad_request(e)
+
+
+@router.put("/{mount}/{table}/{item_id}")
+async def update_row(mount: str, table: str, item_id: str, item: Dict[str, Any] = Body(...)):
+    """Update the given columns of a row and return it"""
+    try:
+        return await engine.update_row(mount, table, item_id, item)
+    except LookupError as e:
+        raise _not_found(e)
+    except PoolTimeout as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise _bad_request(e)
+
+
+@router.delete("/{mount}/{table}/{item_id}")
+async def delete_row(mount: str, table: str, item_id: str):
+    """Delete a row"""
+    try:
+        await engine.delete_row(mount, table, item_id)
+    except LookupError as e:
+        raise _not_found(e)
+    except PoolTimeout as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise _bad_request(e)
+    return {"success": True, "message": f"{table} deleted"}
@@ -3,9 +3,11 @@ Realtime Events API
 Handles device event ingestion and real-time streaming
 """
 
-from fastapi import APIRouter, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Depends
+from fastapi import APIRouter, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Depends, Request, Response
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 import logging
 import json
 
@@ -16,34 +18,55 @@ from models.schemas import (
 )
 
 from services.auth import get_current_active_user
+from services.bulk_write import BatchTooLarge
+from services.event_hub import get_hub
+from services.event_ingest import (
+    ingest, ingest_batch, parse_upload,
+    IngestQueueFull, IngestUnavailable, UnsupportedUploadFormat
+)
 
 router = APIRouter(dependencies=[Depends(get_current_active_user)])
 logger = logging.getLogger(__name__)
 
 
 @router.post("/{tenant}/event", response_model=SuccessResponse, status_code=status.HTTP_201_CREATED)
-async def ingest_event(tenant: str, event: RealtimeEvent):
+async def ingest_event(tenant: str, event: RealtimeEvent, response: Response, wait: bool = True):
     """
     Ingest real-time event from device
     
+    Events are buffered and written in batches with COPY (group commit).
+    By default the response is sent once the event's batch has committed
+    (201); wait=false answers as soon as the event is queued (202). When
+    the queue is full the answer is 429 with a Retry-After header.
+    
     Rate limits:
     - 10 events per second per device
     - 500 events per minute per device
     - 10,000 events per hour per device
     """
     try:
-        logger.info(f"Ingesting event for tenant {tenant}: {event.event_type} from {event.device_id}")
-        
         # TODO: Validate device token
         # TODO: Check rate limits
-        # TODO: Insert into tenant_X.events table
-        # TODO: Trigger NOTIFY
+        
+        event_id = await ingest(tenant, event.device_id, event.event_type, event.payload, wait)
+        if not wait:
+            response.status_code = status.HTTP_202_ACCEPTED
         
         return SuccessResponse(
-            message="Event ingested successfully",
-            data={"event_id": "evt_123"}
+            message="Event ingested successfully" if wait else "Event queued",
+            data={"event_id": event_id}
         )
         
+    except IngestQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except IngestUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to ingest event: {e}")
         raise HTTPException(
@@ -52,6 +75,60 @@ async def ingest_event(tenant: str, event: RealtimeEvent):
         )
 
 
+@router.post("/{tenant}/events/batch", response_model=SuccessResponse, status_code=status.HTTP_201_CREATED)
+async def ingest_event_batch(tenant: str, request: Request, response: Response, wait: bool = True):
+    """
+    Ingest a batch of events, e.g. readings a device buffered offline
+    
+    The body is a JSON array, NDJSON (application/x-ndjson) or a
+    MessagePack array (application/msgpack) of events with device_id,
+    event_type, payload and optionally timestamp (when the reading was
+    taken; ISO 8601 or epoch seconds). Valid events are written together
+    in one COPY; data.results has one entry per event, in order: {"id"}
+    if accepted, {"error"} if not. 422 if no event is valid; 202 instead
+    of 201 with wait=false.
+    """
+    try:
+        items = parse_upload(await request.body(), request.headers.get("content-type", ""))
+        if not items:
+            raise ValueError("No events in upload")
+        
+        result = await ingest_batch(tenant, items, wait)
+        if not result["accepted"]:
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content=SuccessResponse(success=False, message="No valid events", data=result).model_dump()
+            )
+        if not wait:
+            response.status_code = status.HTTP_202_ACCEPTED
+        
+        return SuccessResponse(
+            message=f"{result['accepted']} events {'ingested' if wait else 'queued'}, {result['rejected']} rejected",
+            data=result
+        )
+        
+    except IngestQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except IngestUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except UnsupportedUploadFormat as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to ingest event batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.get("/{tenant}/events", response_model=List[RealtimeEventResponse])
 async def query_events(
     tenant: str,
@@ -89,35 +166,82 @@ async def query_events(
 
 
 @router.websocket("/{tenant}/stream")
-async def event_stream(websocket: WebSocket, tenant: str, device_id: Optional[str] = None):
+async def event_stream(
+    websocket: WebSocket,
+    tenant: str,
+    device_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    overflow: str = Query("drop_oldest", pattern="^(drop_oldest|disconnect)$"),
+    last_event_id: Optional[str] = None
+):
     """
     WebSocket endpoint for real-time event streaming
     
     Clients can:
     - Subscribe to all events for a tenant
-    - Filter by device_id
+    - Filter by device_id and/or event_type (comma-separated lists)
     - Receive events in real-time via PostgreSQL LISTEN/NOTIFY
+    
+    Messages are {"stream_id": ..., "event": {...}}. With
+    REALTIME_FANOUT=redis events reach sockets on every API process and
+    carry a stream_id; reconnect with last_event_id=<stream_id> to first
+    receive the events missed since.
+    
+    All sockets of a tenant share one LISTEN connection.
+    A client that falls REALTIME_QUEUE_SIZE events behind loses the
+    oldest ones (overflow=drop_oldest) or is disconnected with code 1013
+    (overflow=disconnect).
     """
     await websocket.accept()
-    logger.info(f"WebSocket connected for tenant {tenant}, device: {device_id}")
+    logger.info(f"WebSocket connected for tenant {tenant}, device: {device_id}, type: {event_type}")
     
+    hub = get_hub()
     try:
         # TODO: Authenticate WebSocket connection
-        # TODO: Subscribe to PostgreSQL NOTIFY channel
-        # TODO: Stream events to client
-        
+        subscription = await hub.subscribe(
+            tenant, device_id, event_type, overflow=overflow, last_event_id=last_event_id
+        )
+    except ValueError as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+    except Exception as e:
+        logger.error(f"WebSocket subscribe failed: {e}")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
+    
+    async def send():
         while True:
-            # Keep connection alive and stream events
-            data = await websocket.receive_text()
-            
-            # Echo for now (replace with actual event streaming)
-            await websocket.send_text(f"Echo: {data}")
-            
-    except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected for tenant {tenant}")
+            text = await subscription.get()
+            if text is None:
+                return
+            await websocket.send_text(text)
+    
+    async def receive():
+        # Client messages are ignored; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+    
+    sender = asyncio.create_task(send())
+    receiver = asyncio.create_task(receive())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        errors = {task: task.exception() for task in done}
+        if sender in done and errors[sender] is None:
+            # Subscription closed: too slow, or the server is stopping
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER if subscription.overflowed else status.WS_1001_GOING_AWAY,
+                reason=subscription.closed_reason or ""
+            )
+        for error in errors.values():
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.error(f"WebSocket error: {error}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        await websocket.close()
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        hub.unsubscribe(subscription)
+        logger.info(f"WebSocket disconnected for tenant {tenant}")
 
 
 @router.post("/{tenant}/device/register", response_model=DeviceResponse, status_code=status.HTTP_201_CREATED)
@@ -3,7 +3,7 @@ Remote Database Sync API
 Connects to on-premise databases via WireGuard and syncs data to Berqenas Cloud
 """
 
-from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -11,6 +11,8 @@ import logging
 
 from database import get_db, engine, Base
 from models.remote import RemoteDatabase, SyncJob
+from services.bidirectional_sync import SyncScheduler
+from services.change_sources import CHANGE_SOURCES
 from pydantic import BaseModel
 
 # Create tables if not exist
@@ -33,6 +35,7 @@ class RemoteDatabaseCreate(BaseModel):
     username: str
     password: str
     schema: str = "public"
+    change_source: str = "polling"  # polling, native
 
 class RemoteDatabaseResponse(BaseModel):
     id: int
@@ -55,6 +58,9 @@ async def register_remote_database(
     db: Session = Depends(get_db)
 ):
     """Register a remote on-premise database"""
+    if config.change_source not in CHANGE_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Invalid change source. Choose from: {list(CHANGE_SOURCES)}")
+
     try:
         # Check if exists
         existing = db.query(RemoteDatabase).filter(RemoteDatabase.name == config.name).first()
@@ -70,7 +76,8 @@ async def register_remote_database(
             database_name=config.database_name,
             username=config.username,
             password=config.password,  # In prod: Encrypt this!
-            schema=config.schema
+            schema=config.schema,
+            change_source=config.change_source
         )
         db.add(new_db)
         db.commit()
@@ -93,64 +100,34 @@ async def list_remote_databases(db: Session = Depends(get_db)):
 @router.post("/remote-db/{db_id}/sync")
 async def sync_remote_database(
     db_id: int, 
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    """Trigger sync for a remote database"""
+    """Trigger sync for a remote database (runs as per-table Celery tasks)"""
     remote_db = db.query(RemoteDatabase).filter(RemoteDatabase.id == db_id).first()
     if not remote_db:
         raise HTTPException(status_code=404, detail="Database not found")
 
-    # Create Sync Job record
-    job = SyncJob(remote_db_id=db_id, status="running")
-    db.add(job)
-    db.commit()
+    result = SyncScheduler().run_sync_now(db_id, db)
+    
+    return {"message": "Sync started", "job_id": result["job_id"]}
 
-    def sync_task(job_id: int):
-        from services.bidirectional_sync import BiDirectionalSync
-        from models.remote import SyncLog
-        
-        db = SessionLocal()
-        try:
-            # Get job and remote db
-            j = db.query(SyncJob).filter(SyncJob.id == job_id).first()
-            if not j: return
-            
-            remote_db = db.query(RemoteDatabase).filter(RemoteDatabase.id == j.remote_db_id).first()
-            if not remote_db: return
-
-            # log starting
-            db.add(SyncLog(job_id=job_id, level="info", message="Starting real bi-directional sync engine"))
-            db.commit()
-            
-            # RUN REAL SYNC
-            syncer = BiDirectionalSync(remote_db)
-            results = syncer.sync_all()
-            
-            # Update job status
-            j.status = "completed"
-            j.completed_at = datetime.utcnow()
-            j.records_synced = results.get("total_synced", 0)
-            
-            # Update DB last sync
-            remote_db.last_sync = datetime.utcnow()
-            
-            db.add(SyncLog(job_id=job_id, level="info", message=f"Sync completed. Synced {j.records_synced} records."))
-            db.commit()
-            
-        except Exception as e:
-            j = db.query(SyncJob).filter(SyncJob.id == job_id).first()
-            if j:
-                j.status = "failed"
-                j.error_message = str(e)
-                db.add(SyncLog(job_id=job_id, level="error", message=f"Sync failed: {e}"))
-                db.commit()
-        finally:
-            db.close()
-
-    background_tasks.add_task(sync_task, job.id)
+
+@router.get("/remote-db/jobs/{job_id}")
+async def get_sync_job(job_id: int, db: Session = Depends(get_db)):
+    """Get sync job status and progress"""
+    job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
     
-    return {"message": "Sync started", "job_id": job.id}
+    return {
+        "job_id": job.id,
+        "remote_db_id": job.remote_db_id,
+        "status": job.status,
+        "records_synced": job.records_synced,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at,
+        "error_message": job.error_message
+    }
 
 
 @router.post("/remote-db/{db_id}/generate-api")
@@ -0,0 +1,75 @@
+"""
+Adaptive Batch Sizing
+Grows and shrinks sync batches to fit the link to each remote (fibre to 4G over WireGuard)
+"""
+
+from typing import Optional
+
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 50_000
+
+# A batch should take about this long: long enough to amortize the round
+# trip, short enough to stay clear of statement and idle timeouts
+MIN_TARGET_SECONDS = 1.0
+MAX_TARGET_SECONDS = 10.0
+# Target batch time in round trips; high-latency links get bigger batches
+ROUND_TRIPS_PER_BATCH = 20
+
+# Weight of the newest throughput sample
+SMOOTHING = 0.3
+# Largest growth factor per batch; shrinking is not limited
+MAX_GROWTH = 2.0
+
+
+class AdaptiveBatchSizer:
+    """
+    Batch size controller for one direction of a sync link
+
+    After every batch the observed throughput (rows/second, smoothed)
+    sets the next size so a batch takes about `target_seconds`. A failed
+    batch halves the size.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = MIN_BATCH_SIZE,
+        maximum: int = MAX_BATCH_SIZE,
+        target_seconds: float = MIN_TARGET_SECONDS
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.size = self._clamp(initial)
+        self.rate: Optional[float] = None
+
+    def _clamp(self, size: float) -> int:
+        return max(self.minimum, min(self.maximum, int(size)))
+
+    def set_round_trip(self, rtt_seconds: float):
+        """Derive the target batch time from the link's round-trip time"""
+        self.target_seconds = min(MAX_TARGET_SECONDS, max(MIN_TARGET_SECONDS, rtt_seconds * ROUND_TRIPS_PER_BATCH))
+
+    def observe(self, rows: int, seconds: float):
+        """Record a completed batch and pick the next size"""
+        if rows <= 0:
+            return
+
+        rate = rows / max(seconds, 1e-3)
+        self.rate = rate if self.rate is None else SMOOTHING * rate + (1 - SMOOTHING) * self.rate
+
+        if rows < self.size and seconds < self.target_seconds:
+            # A short final batch that was fast says nothing about capacity
+            return
+        # Size for the lower of the latest and the average throughput: a slow
+        # batch shrinks the next one at once, growth needs sustained speed
+        effective = min(rate, self.rate)
+        self.size = self._clamp(min(effective * self.target_seconds, self.size * MAX_GROWTH))
+
+    def failed(self) -> bool:
+        """Halve the size after a failed batch; False if it is already at the minimum"""
+        if self.size <= self.minimum:
+            return False
+        self.size = self._clamp(self.size // 2)
+        self.rate = None
+        return True
@@ -4,12 +4,20 @@ Analyzes MSSQL database tables and automatically generates CRUD APIs
 """
 
 import pyodbc
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field
 import logging
+import os
+
+from services.model_factory import SQL_TYPE_NAMES, model_fields, pascal_case, python_type_name
+from services.connection_pool import DEFAULT_MAX_CONNECTIONS
 
 logger = logging.getLogger(__name__)
 
+# Largest table list filtered in SQL (SQL Server allows 2,100 parameters);
+# longer lists are read in full and filtered in memory
+MAX_FILTER_TABLES = 1000
+
 
 @dataclass
 class ColumnInfo:
@@ -20,6 +28,26 @@ class ColumnInfo:
     max_length: Optional[int]
     is_primary_key: bool
     is_identity: bool
+    has_default: bool = False
+
+
+@dataclass
+class ForeignKeyInfo:
+    """Foreign key constraint information"""
+    name: str
+    columns: List[str]
+    referenced_schema: str
+    referenced_table: str
+    referenced_columns: List[str]
+
+
+@dataclass
+class IndexInfo:
+    """Index information (key columns in index order)"""
+    name: str
+    columns: List[str]
+    is_unique: bool
+    is_primary_key: bool
 
 
 @dataclass
@@ -29,6 +57,10 @@ class TableInfo:
     name: str
     columns: List[ColumnInfo]
     primary_keys: List[str]
+    foreign_keys: List[ForeignKeyInfo] = field(default_factory=list)
+    indexes: List[IndexInfo] = field(default_factory=list)
+    # Rows according to the partition metadata; None when not known
+    row_estimate: Optional[int] = None
 
 
 class MSSQLIntrospector:
@@ -66,7 +98,8 @@ class MSSQLIntrospector:
             c.IS_NULLABLE,
             c.CHARACTER_MAXIMUM_LENGTH,
             CASE WHEN pk.COLUMN_NAME IS NOT NULL THEN 1 ELSE 0 END as IS_PRIMARY_KEY,
-            COLUMNPROPERTY(OBJECT_ID(c.TABLE_SCHEMA + '.' + c.TABLE_NAME), c.COLUMN_NAME, 'IsIdentity') as IS_IDENTITY
+            COLUMNPROPERTY(OBJECT_ID(c.TABLE_SCHEMA + '.' + c.TABLE_NAME), c.COLUMN_NAME, 'IsIdentity') as IS_IDENTITY,
+            c.COLUMN_DEFAULT
         FROM INFORMATION_SCHEMA.COLUMNS c
         LEFT JOIN (
             SELECT ku.TABLE_SCHEMA, ku.TABLE_NAME, ku.COLUMN_NAME
@@ -95,7 +128,8 @@ class MSSQLIntrospector:
                     is_nullable=row.IS_NULLABLE == 'YES',
                     max_length=row.CHARACTER_MAXIMUM_LENGTH,
                     is_primary_key=bool(row.IS_PRIMARY_KEY),
-                    is_identity=bool(row.IS_IDENTITY)
+                    is_identity=bool(row.IS_IDENTITY),
+                    has_default=row.COLUMN_DEFAULT is not None
                 )
                 columns.append(col)
                 
@@ -109,43 +143,258 @@ class MSSQLIntrospector:
                 primary_keys=primary_keys
             )
     
-    def get_all_tables_info(self, schema: str = 'dbo') -> List[TableInfo]:
-        """Get information for all tables"""
+    def get_all_tables_info(self, schema: str = 'dbo', bulk: bool = True) -> List[TableInfo]:
+        """
+        Get information for all tables
+        
+        bulk reads the whole schema with a few catalog queries over one
+        connection; otherwise every table is introspected on its own
+        connection (no foreign keys or indexes).
+        """
+        if bulk:
+            return self.get_schema_info(schema)
         tables = self.get_tables(schema)
         return [self.get_table_info(table, schema) for table in tables]
+    
+    def get_schema_info(self, schema: str = 'dbo', tables: Optional[List[str]] = None) -> List[TableInfo]:
+        """Get columns, keys, foreign keys and indexes of all tables in schema, or only of `tables`"""
+        table_filter = ''
+        params = [schema]
+        if tables is not None and len(tables) <= MAX_FILTER_TABLES:
+            if not tables:
+                return []
+            table_filter = f"AND t.name IN ({', '.join('?' for _ in tables)})"
+            params += tables
+        
+        columns_query = f"""
+        SELECT
+            t.object_id,
+            t.name AS TABLE_NAME,
+            c.name AS COLUMN_NAME,
+            CASE WHEN ty.is_user_defined = 0 THEN ty.name ELSE TYPE_NAME(c.system_type_id) END AS DATA_TYPE,
+            c.is_nullable AS IS_NULLABLE,
+            c.max_length AS MAX_LENGTH,
+            CASE WHEN pk.column_id IS NOT NULL THEN 1 ELSE 0 END AS IS_PRIMARY_KEY,
+            c.is_identity AS IS_IDENTITY,
+            CASE WHEN c.default_object_id <> 0 THEN 1 ELSE 0 END AS HAS_DEFAULT
+        FROM sys.tables t
+        JOIN sys.columns c ON c.object_id = t.object_id
+        JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+        LEFT JOIN (
+            SELECT ic.object_id, ic.column_id
+            FROM sys.indexes i
+            JOIN sys.index_columns ic
+                ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+            WHERE i.is_primary_key = 1
+        ) pk ON pk.object_id = c.object_id AND pk.column_id = c.column_id
+        WHERE t.schema_id = SCHEMA_ID(?) {table_filter}
+        ORDER BY t.name, c.column_id
+        """
+        
+        foreign_keys_query = """
+        SELECT
+            fk.parent_object_id,
+            fk.name AS CONSTRAINT_NAME,
+            pc.name AS COLUMN_NAME,
+            OBJECT_SCHEMA_NAME(fk.referenced_object_id) AS REFERENCED_SCHEMA,
+            OBJECT_NAME(fk.referenced_object_id) AS REFERENCED_TABLE,
+            rc.name AS REFERENCED_COLUMN
+        FROM sys.foreign_keys fk
+        JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+        JOIN sys.columns pc
+            ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+        JOIN sys.columns rc
+            ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+        WHERE fk.schema_id = SCHEMA_ID(?)
+        ORDER BY fk.parent_object_id, fk.name, fkc.constraint_column_id
+        """
+        
+        indexes_query = f"""
+        SELECT
+            i.object_id,
+            i.name AS INDEX_NAME,
+            i.is_unique AS IS_UNIQUE,
+            i.is_primary_key AS IS_PRIMARY_KEY,
+            c.name AS COLUMN_NAME
+        FROM sys.indexes i
+        JOIN sys.tables t ON t.object_id = i.object_id
+        JOIN sys.index_columns ic
+            ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+        JOIN sys.columns c
+            ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        WHERE t.schema_id = SCHEMA_ID(?) {table_filter}
+            AND i.type > 0 AND i.is_hypothetical = 0 AND ic.is_included_column = 0
+        ORDER BY i.object_id, i.index_id, ic.key_ordinal
+        """
+        
+        # Heap or clustered index partitions hold every row once
+        row_estimates_query = f"""
+        SELECT t.object_id, SUM(p.rows) AS ROW_ESTIMATE
+        FROM sys.tables t
+        JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1)
+        WHERE t.schema_id = SCHEMA_ID(?) {table_filter}
+        GROUP BY t.object_id
+        """
+        
+        selected = set(tables) if tables is not None else None
+        by_id: Dict[int, TableInfo] = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(columns_query, *params)
+            for row in cursor.fetchall():
+                if selected is not None and row.TABLE_NAME not in selected:
+                    continue
+                table = by_id.get(row.object_id)
+                if table is None:
+                    table = by_id[row.object_id] = TableInfo(
+                        schema=schema,
+                        name=row.TABLE_NAME,
+                        columns=[],
+                        primary_keys=[]
+                    )
+                
+                col = ColumnInfo(
+                    name=row.COLUMN_NAME,
+                    data_type=row.DATA_TYPE,
+                    is_nullable=bool(row.IS_NULLABLE),
+                    max_length=self._character_length(row.DATA_TYPE, row.MAX_LENGTH),
+                    is_primary_key=bool(row.IS_PRIMARY_KEY),
+                    is_identity=bool(row.IS_IDENTITY),
+                    has_default=bool(row.HAS_DEFAULT)
+                )
+                table.columns.append(col)
+                
+                # Column order, as in get_table_info (sync key strings depend on it)
+                if col.is_primary_key:
+                    table.primary_keys.append(col.name)
+            
+            cursor.execute(foreign_keys_query, schema)
+            for row in cursor.fetchall():
+                table = by_id.get(row.parent_object_id)
+                if table is None:
+                    continue
+                fk = table.foreign_keys[-1] if table.foreign_keys else None
+                if fk is None or fk.name != row.CONSTRAINT_NAME:
+                    fk = ForeignKeyInfo(
+                        name=row.CONSTRAINT_NAME,
+                        columns=[],
+                        referenced_schema=row.REFERENCED_SCHEMA,
+                        referenced_table=row.REFERENCED_TABLE,
+                        referenced_columns=[]
+                    )
+                    table.foreign_keys.append(fk)
+                fk.columns.append(row.COLUMN_NAME)
+                fk.referenced_columns.append(row.REFERENCED_COLUMN)
+            
+            cursor.execute(indexes_query, *params)
+            for row in cursor.fetchall():
+                table = by_id.get(row.object_id)
+                if table is None:
+                    continue
+                index = table.indexes[-1] if table.indexes else None
+                if index is None or index.name != row.INDEX_NAME:
+                    index = IndexInfo(
+                        name=row.INDEX_NAME,
+                        columns=[],
+                        is_unique=bool(row.IS_UNIQUE),
+                        is_primary_key=bool(row.IS_PRIMARY_KEY)
+                    )
+                    table.indexes.append(index)
+                index.columns.append(row.COLUMN_NAME)
+            
+            cursor.execute(row_estimates_query, *params)
+            for row in cursor.fetchall():
+                table = by_id.get(row.object_id)
+                if table is not None:
+                    table.row_estimate = int(row.ROW_ESTIMATE)
+        
+        return list(by_id.values())
+    
+    def get_table_versions(self, schema: str = 'dbo') -> Dict[str, str]:
+        """
+        Cheap per-table definition version: the latest modify_date of the
+        table and its constraints, indexes and triggers
+        """
+        query = """
+        SELECT
+            t.name AS TABLE_NAME,
+            COUNT(o.object_id) AS OBJECT_COUNT,
+            MAX(CASE WHEN o.modify_date > t.modify_date THEN o.modify_date ELSE t.modify_date END) AS MODIFIED
+        FROM sys.tables t
+        LEFT JOIN sys.objects o ON o.parent_object_id = t.object_id
+        WHERE t.schema_id = SCHEMA_ID(?)
+        GROUP BY t.name
+        ORDER BY t.name
+        """
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, schema)
+            # The object count catches a dropped constraint whose drop left no newer date
+            return {
+                row.TABLE_NAME: f"{row.MODIFIED.isoformat()}/{row.OBJECT_COUNT}"
+                for row in cursor.fetchall()
+            }
+    
+    @staticmethod
+    def table_from_dict(data: Dict[str, Any]) -> TableInfo:
+        """Inverse of dataclasses.asdict(table_info)"""
+        return TableInfo(
+            schema=data['schema'],
+            name=data['name'],
+            columns=[ColumnInfo(**col) for col in data['columns']],
+            primary_keys=data['primary_keys'],
+            foreign_keys=[ForeignKeyInfo(**fk) for fk in data.get('foreign_keys', [])],
+            indexes=[IndexInfo(**index) for index in data.get('indexes', [])],
+            row_estimate=data.get('row_estimate')
+        )
+    
+    @staticmethod
+    def _character_length(data_type: str, max_length: int) -> Optional[int]:
+        """sys.columns.max_length (bytes) as INFORMATION_SCHEMA's CHARACTER_MAXIMUM_LENGTH"""
+        if data_type in ('char', 'varchar', 'binary', 'varbinary'):
+            return max_length
+        if data_type in ('nchar', 'nvarchar'):
+            return max_length if max_length == -1 else max_length // 2
+        if data_type in ('text', 'image'):
+            return 2147483647
+        if data_type == 'ntext':
+            return 1073741823
+        if data_type == 'xml':
+            return -1
+        return None
+    
+    def get_table_dependencies(self, schema: str = 'dbo') -> Dict[str, List[str]]:
+        """Get tables referenced by foreign keys of each table in schema"""
+        query = """
+        SELECT
+            OBJECT_NAME(fk.parent_object_id) AS TABLE_NAME,
+            OBJECT_NAME(fk.referenced_object_id) AS REFERENCED_TABLE
+        FROM sys.foreign_keys fk
+        WHERE OBJECT_SCHEMA_NAME(fk.parent_object_id) = ?
+        """
+        
+        dependencies: Dict[str, List[str]] = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, schema)
+            for row in cursor.fetchall():
+                dependencies.setdefault(row.TABLE_NAME, []).append(row.REFERENCED_TABLE)
+        
+        return dependencies
 
 
 class PydanticModelGenerator:
     """Generates Pydantic models from table info"""
     
-    TYPE_MAPPING = {
-        'int': 'int',
-        'bigint': 'int',
-        'smallint': 'int',
-        'tinyint': 'int',
-        'bit': 'bool',
-        'decimal': 'float',
-        'numeric': 'float',
-        'money': 'float',
-        'float': 'float',
-        'real': 'float',
-        'varchar': 'str',
-        'nvarchar': 'str',
-        'char': 'str',
-        'nchar': 'str',
-        'text': 'str',
-        'ntext': 'str',
-        'datetime': 'datetime',
-        'datetime2': 'datetime',
-        'date': 'date',
-        'time': 'time',
-        'uniqueidentifier': 'str',
-    }
+    # Same field rules as the in-process ModelFactory, rendered as source
+    TYPE_MAPPING = SQL_TYPE_NAMES
     
     @classmethod
     def get_python_type(cls, sql_type: str, is_nullable: bool) -> str:
         """Convert SQL type to Python type"""
-        python_type = cls.TYPE_MAPPING.get(sql_type.lower(), 'str')
+        python_type = python_type_name(sql_type)
         
         if is_nullable:
             return f'Optional[{python_type}]'
@@ -153,38 +402,49 @@ class PydanticModelGenerator:
     
     @classmethod
     def generate_model(cls, table_info: TableInfo, model_name: str = None) -> str:
-        """Generate Pydantic model code"""
+        """Generate Pydantic model code: {Model} (read), {Model}Create and {Model}Update"""
         if not model_name:
             model_name = cls._to_pascal_case(table_info.name)
         
-        imports = set(['from pydantic import BaseModel', 'from typing import Optional'])
-        
-        # Check if datetime types are used
-        if any(col.data_type in ['datetime', 'datetime2', 'date', 'time'] for col in table_info.columns):
-            imports.add('from datetime import datetime, date, time')
+        imports = [
+            'from pydantic import BaseModel, ConfigDict, Field',
+            'from typing import Any, Optional',
+            'from datetime import datetime, date, time',
+        ]
         
-        fields = []
-        for col in table_info.columns:
-            python_type = cls.get_python_type(col.data_type, col.is_nullable)
-            
-            # Skip identity columns in create model
-            if col.is_identity:
-                continue
+        classes = []
+        for class_name, kind in ((model_name, 'read'), (f'{model_name}Create', 'create'), (f'{model_name}Update', 'update')):
+            fields = []
+            for attribute, type_name, column, required, max_length in model_fields(table_info, kind):
+                annotation = type_name if required else f'Optional[{type_name}]'
+                options = []
+                if attribute != column:
+                    options.append(f'alias={column!r}')
+                if max_length is not None:
+                    options.append(f'max_length={max_length}')
+                if options:
+                    default = f" = Field({'...' if required else 'None'}, {', '.join(options)})"
+                else:
+                    default = '' if required else ' = None'
+                fields.append(f'    {attribute}: {annotation}{default}')
             
-            default = ' = None' if col.is_nullable else ''
-            fields.append(f'    {col.name}: {python_type}{default}')
-        
-        model_code = '\n'.join(imports) + '\n\n'
-        model_code += f'class {model_name}(BaseModel):\n'
-        model_code += '\n'.join(fields) if fields else '    pass'
-        model_code += '\n\n    class Config:\n        from_attributes = True\n'
+            # Request bodies may only name columns of the table
+            extra = 'ignore' if kind == 'read' else 'forbid'
+            class_code = f'class {class_name}(BaseModel):\n'
+            class_code += '\n'.join(fields) if fields else '    pass'
+            class_code += (
+                '\n\n    model_config = ConfigDict(\n'
+                '        from_attributes=True, populate_by_name=True, protected_namespaces=(), '
+                f'extra={extra!r}\n    )\n'
+            )
+            classes.append(class_code)
         
-        return model_code
+        return '\n'.join(imports) + '\n\n\n' + '\n\n'.join(classes)
     
     @staticmethod
     def _to_pascal_case(snake_str: str) -> str:
         """Convert snake_case to PascalCase"""
-        return ''.join(word.capitalize() for word in snake_str.split('_'))
+        return pascal_case(snake_str)
 
 
 class FastAPIRouterGenerator:
@@ -203,167 +463,477 @@ class FastAPIRouterGenerator:
 Auto-generated API for {table_name}
 """
 
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
+import base64
+import json
 import pyodbc
+from connection_pool import get_pool
+from pool_settings import MAX_CONNECTIONS
+from bulk_write import BatchTooLarge, MSSQL_SAVEPOINTS, execute_bulk, executemany_mssql, parse_items
 from models.{table_name}_models import {model_name}, {model_name}Create, {model_name}Update
 
 router = APIRouter()
 
 # Database connection (replace with your connection string)
 CONNECTION_STRING = "DRIVER={{ODBC Driver 17 for SQL Server}};SERVER=localhost;DATABASE=tenant_db;UID=user;PWD=password"
+MAX_PAGE_SIZE = 1000
+# Rows per chunk of an NDJSON export
+EXPORT_CHUNK_ROWS = 1000
 
 
-def get_connection():
-    return pyodbc.connect(CONNECTION_STRING)
+def db_pool():
+    """Connection pool; calls run in a bounded thread pool, off the event loop"""
+    return get_pool(CONNECTION_STRING, lambda: pyodbc.connect(CONNECTION_STRING), MAX_CONNECTIONS)
 
 
-@router.get("/{table_name}", response_model=List[{model_name}])
-async def list_{table_name}(skip: int = 0, limit: int = 100):
-    """Get all {table_name} records"""
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _encode_cursor(key) -> str:
+    """Opaque continuation token holding the last {pk_field} of a page"""
+    return base64.urlsafe_b64encode(json.dumps(key, default=_json_value).encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _rows(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+async def _bulk_items(request: Request) -> list:
+    """Rows of a bulk request: a JSON array, or NDJSON (Content-Type: application/x-ndjson)"""
+    try:
+        return parse_items(await request.body(), request.headers.get("content-type", ""))
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _run_bulk(statements: list, errors: list, atomic: bool, require_rows: bool = False):
+    # One transaction with fast_executemany; failing rows are reported by
+    # index, and with atomic nothing is written if any row fails.
+    # require_rows reports keys that matched no row as "not found"
+    if not (errors and atomic):
+        written, failed = await db_pool().run(
+            execute_bulk, statements, executemany_mssql, MSSQL_SAVEPOINTS, atomic, require_rows
+        )
+        errors = sorted(errors + failed, key=lambda e: e["index"])
+    else:
+        written = 0
+    result = {{"written": written, "errors": errors}}
+    if errors and atomic:
+        return JSONResponse(status_code=422, content=result)
+    return result
+
+
+def _page_{table_name}(conn, after, limit: int):
+    # Keyset paging: seeks to the last key instead of skipping rows
+    if after is None:
+        query = "SELECT TOP (?) * FROM {table_info.schema}.{table_name} ORDER BY {pk_field}"
+        params = [limit]
+    else:
+        query = "SELECT TOP (?) * FROM {table_info.schema}.{table_name} WHERE {pk_field} > ? ORDER BY {pk_field}"
+        params = [limit, after]
+    
+    cursor = conn.cursor()
+    cursor.execute(query, *params)
+    return _rows(cursor)
+
+
+def _export_{table_name}(conn, after):
+    if after is None:
+        query = "SELECT * FROM {table_info.schema}.{table_name} ORDER BY {pk_field}"
+        params = []
+    else:
+        query = "SELECT * FROM {table_info.schema}.{table_name} WHERE {pk_field} > ? ORDER BY {pk_field}"
+        params = [after]
+    
+    cursor = conn.cursor()
+    cursor.execute(query, *params)
+    columns = [column[0] for column in cursor.description]
+    
+    # Rows go out as they are fetched; the table is never held in memory
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            return
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=_json_value) + '\\n' for row in rows
+        ).encode()
+
+
+def _list_{table_name}(conn, skip: int, limit: int):
     query = "SELECT * FROM {table_info.schema}.{table_name} ORDER BY {pk_field} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, skip, limit)
-        
-        columns = [column[0] for column in cursor.description]
-        results = []
-        
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
-        
-        return results
+    cursor = conn.cursor()
+    cursor.execute(query, skip, limit)
+    
+    columns = [column[0] for column in cursor.description]
+    results = []
+    
+    for row in cursor.fetchall():
+        results.append(dict(zip(columns, row)))
+    
+    return results
 
 
-@router.get("/{table_name}/{{item_id}}", response_model={model_name})
-async def get_{table_name}(item_id: int):
-    """Get single {table_name} by ID"""
+def _get_{table_name}(conn, item_id: int):
     query = "SELECT * FROM {table_info.schema}.{table_name} WHERE {pk_field} = ?"
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, item_id)
-        
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="{table_name} not found")
-        
-        columns = [column[0] for column in cursor.description]
-        return dict(zip(columns, row))
+    cursor = conn.cursor()
+    cursor.execute(query, item_id)
+    
+    row = cursor.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="{table_name} not found")
+    
+    columns = [column[0] for column in cursor.description]
+    return dict(zip(columns, row))
 
 
-@router.post("/{table_name}", response_model={model_name}, status_code=status.HTTP_201_CREATED)
-async def create_{table_name}(item: {model_name}Create):
-    """Create new {table_name}"""
+def _create_{table_name}(conn, values: dict):
     # Build INSERT query dynamically
-    fields = [k for k, v in item.dict().items() if v is not None]
-    placeholders = ', '.join(['?' for _ in fields])
-    columns = ', '.join(fields)
+    placeholders = ', '.join(['?' for _ in values])
+    columns = ', '.join(values)
     
     query = f"INSERT INTO {table_info.schema}.{table_name} ({{columns}}) OUTPUT INSERTED.* VALUES ({{placeholders}})"
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, *[getattr(item, f) for f in fields])
-        
-        row = cursor.fetchone()
-        columns = [column[0] for column in cursor.description]
-        conn.commit()
-        
-        return dict(zip(columns, row))
+    cursor = conn.cursor()
+    cursor.execute(query, *values.values())
+    
+    row = cursor.fetchone()
+    columns = [column[0] for column in cursor.description]
+    conn.commit()
+    
+    return dict(zip(columns, row))
+
+
+def _update_{table_name}(conn, item_id: int, values: dict):
+    # Build UPDATE query dynamically
+    updates = [f"{{k}} = ?" for k in values]
+    
+    query = f"UPDATE {table_info.schema}.{table_name} SET {{', '.join(updates)}} OUTPUT INSERTED.* WHERE {pk_field} = ?"
+    
+    cursor = conn.cursor()
+    cursor.execute(query, *values.values(), item_id)
+    
+    row = cursor.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="{table_name} not found")
+    
+    columns = [column[0] for column in cursor.description]
+    conn.commit()
+    
+    return dict(zip(columns, row))
+
+
+def _delete_{table_name}(conn, item_id: int):
+    query = "DELETE FROM {table_info.schema}.{table_name} WHERE {pk_field} = ?"
+    
+    cursor = conn.cursor()
+    cursor.execute(query, item_id)
+    
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="{table_name} not found")
+    
+    conn.commit()
+
+
+@router.get("/{table_name}", response_model=List[{model_name}])
+async def list_{table_name}(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: Optional[int] = None
+):
+    """
+    Get {table_name} records in {pk_field} order
+    
+    Pass the X-Next-Cursor response header as `cursor` for the next page;
+    the last page has no header. `skip` (offset paging) gets slower with depth.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if skip is not None and not cursor:
+        return await db_pool().run(_list_{table_name}, skip, limit)
+    
+    after = _decode_cursor(cursor) if cursor else None
+    rows = await db_pool().run(_page_{table_name}, after, limit)
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1]["{pk_field}"])
+    return rows
+
+
+@router.get("/{table_name}/export")
+async def export_{table_name}(cursor: Optional[str] = None):
+    """Stream all {table_name} records (after `cursor` if given) as newline-delimited JSON"""
+    after = _decode_cursor(cursor) if cursor else None
+    return StreamingResponse(db_pool().stream(_export_{table_name}, after), media_type="application/x-ndjson")
+
+
+@router.post("/{table_name}/bulk")
+async def bulk_create_{table_name}(request: Request, atomic: bool = True):
+    """Create many {table_name} records from a JSON array or NDJSON in one transaction"""
+    statements, errors = [], []
+    for index, raw in enumerate(await _bulk_items(request)):
+        try:
+            item = {model_name}Create(**raw)
+        except (TypeError, ValueError) as e:
+            errors.append({{"index": index, "error": str(e)}})
+            continue
+        values = {{k: v for k, v in item.model_dump(by_alias=True).items() if v is not None}}
+        placeholders = ', '.join(['?' for _ in values])
+        query = f"INSERT INTO {table_info.schema}.{table_name} ({{', '.join(values)}}) VALUES ({{placeholders}})"
+        statements.append((index, query, list(values.values())))
+    return await _run_bulk(statements, errors, atomic)
+
+
+@router.put("/{table_name}/bulk")
+async def bulk_update_{table_name}(request: Request, atomic: bool = True):
+    """Update many {table_name} records in one transaction; each record carries its {pk_field}"""
+    statements, errors = [], []
+    for index, raw in enumerate(await _bulk_items(request)):
+        try:
+            if not isinstance(raw, dict) or "{pk_field}" not in raw:
+                raise ValueError("Record must be an object with {pk_field}")
+            fields = {{k: v for k, v in raw.items() if k != "{pk_field}"}}
+            values = {model_name}Update(**fields).model_dump(by_alias=True, exclude_unset=True)
+            if not values:
+                raise ValueError("No fields to update")
+        except (TypeError, ValueError) as e:
+            errors.append({{"index": index, "error": str(e)}})
+            continue
+        updates = ', '.join(f"{{k}} = ?" for k in values)
+        query = f"UPDATE {table_info.schema}.{table_name} SET {{updates}} WHERE {pk_field} = ?"
+        statements.append((index, query, list(values.values()) + [raw["{pk_field}"]]))
+    return await _run_bulk(statements, errors, atomic, require_rows=True)
+
+
+@router.delete("/{table_name}/bulk")
+async def bulk_delete_{table_name}(request: Request, atomic: bool = True):
+    """Delete many {table_name} records by {pk_field} (bare values or objects) in one transaction"""
+    query = "DELETE FROM {table_info.schema}.{table_name} WHERE {pk_field} = ?"
+    statements, errors = [], []
+    for index, raw in enumerate(await _bulk_items(request)):
+        key = raw.get("{pk_field}") if isinstance(raw, dict) else raw
+        if key is None or isinstance(key, (dict, list)):
+            errors.append({{"index": index, "error": "Expected a {pk_field} value"}})
+            continue
+        statements.append((index, query, [key]))
+    return await _run_bulk(statements, errors, atomic, require_rows=True)
+
+
+@router.get("/{table_name}/{{item_id}}", response_model={model_name})
+async def get_{table_name}(item_id: int):
+    """Get single {table_name} by ID"""
+    return await db_pool().run(_get_{table_name}, item_id)
+
+
+@router.post("/{table_name}", response_model={model_name}, status_code=status.HTTP_201_CREATED)
+async def create_{table_name}(item: {model_name}Create):
+    """Create new {table_name}"""
+    values = {{k: v for k, v in item.model_dump(by_alias=True).items() if v is not None}}
+    return await db_pool().run(_create_{table_name}, values)
 
 
 @router.put("/{table_name}/{{item_id}}", response_model={model_name})
 async def update_{table_name}(item_id: int, item: {model_name}Update):
     """Update {table_name}"""
-    # Build UPDATE query dynamically
-    updates = [f"{{k}} = ?" for k, v in item.dict(exclude_unset=True).items()]
+    values = item.model_dump(by_alias=True, exclude_unset=True)
     
-    if not updates:
+    if not values:
         raise HTTPException(status_code=400, detail="No fields to update")
     
-    query = f"UPDATE {table_info.schema}.{table_name} SET {{', '.join(updates)}} OUTPUT INSERTED.* WHERE {pk_field} = ?"
-    
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        values = list(item.dict(exclude_unset=True).values()) + [item_id]
-        cursor.execute(query, *values)
-        
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="{table_name} not found")
-        
-        columns = [column[0] for column in cursor.description]
-        conn.commit()
-        
-        return dict(zip(columns, row))
+    return await db_pool().run(_update_{table_name}, item_id, values)
 
 
 @router.delete("/{table_name}/{{item_id}}")
 async def delete_{table_name}(item_id: int):
     """Delete {table_name}"""
-    query = "DELETE FROM {table_info.schema}.{table_name} WHERE {pk_field} = ?"
+    await db_pool().run(_delete_{table_name}, item_id)
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, item_id)
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="{table_name} not found")
-        
-        conn.commit()
-        
-        return {{"success": True, "message": "{table_name} deleted"}}
+    return {{"success": True, "message": "{table_name} deleted"}}
 '''
         
         return router_code
 
 
-def generate_api_for_database(connection_string: str, schema: str = 'dbo', output_dir: str = './generated_api'):
+POOL_SETTINGS_TEMPLATE = '''"""
+Connection pool settings of the generated API
+"""
+
+# Open connections to the database, shared by every router using CONNECTION_STRING
+MAX_CONNECTIONS = {max_connections}
+'''
+
+
+def _write_if_changed(path: str, content: str) -> bool:
+    """
+    Write content unless the file already holds exactly it (by SHA-256)
+    
+    Unchanged files keep their mtime, so reloaders and build caches
+    downstream do not see a change. Returns whether the file was written.
+    """
+    import hashlib
+    import tempfile
+    
+    data = content.encode()
+    mode = 0o644
+    try:
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+            mode = os.stat(f.fileno()).st_mode & 0o777
+    except FileNotFoundError:
+        pass
+    
+    # Written to a file of its own next to the target and renamed over it,
+    # so a reader never sees half a file and concurrent generations into
+    # the same directory never share a temporary file
+    directory, name = os.path.split(path)
+    with tempfile.NamedTemporaryFile(dir=directory or '.', prefix=f'.{name}.', suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            f.write(data)
+            # NamedTemporaryFile creates 0600; keep the permissions of a normal file
+            os.chmod(tmp_path, mode)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def _generate_table_files(table: TableInfo, output_dir: str) -> Tuple[int, int]:
+    """Render and write the model and router files of one table; (written, unchanged)"""
+    model_name = PydanticModelGenerator._to_pascal_case(table.name)
+    files = {
+        f'{output_dir}/models/{table.name}_models.py': PydanticModelGenerator.generate_model(table, model_name),
+        f'{output_dir}/routers/{table.name}_router.py': FastAPIRouterGenerator.generate_router(table, model_name),
+    }
+    written = sum(_write_if_changed(path, code) for path, code in files.items())
+    return written, len(files) - written
+
+
+def generate_api_for_database(
+    connection_string: str,
+    schema: str = 'dbo',
+    output_dir: str = './generated_api',
+    cache=None,
+    progress=None,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS
+):
     """
     Main function to generate complete API for all tables in database
     
+    Tables are rendered one after another: rendering is pure Python string
+    work, which threads cannot run in parallel, and it takes milliseconds
+    per table. A file is only rewritten when its rendered content differs
+    from what is on disk.
+    
     Args:
         connection_string: MSSQL connection string
         schema: Database schema (default: dbo)
         output_dir: Output directory for generated files
+        cache: Optional SchemaCache of this schema; tables unchanged since
+            the last generation into output_dir are not rendered again
+        progress: Optional codegen_jobs.JobProgress, told about every
+            table as it completes
+        max_connections: Size of the connection pool the generated
+            routers share (the tenant's max_connections)
     """
-    import os
+    import time
     
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(f'{output_dir}/models', exist_ok=True)
     os.makedirs(f'{output_dir}/routers', exist_ok=True)
     
+    # Generated routers import their connection pool and bulk writer from here
+    for module in ('connection_pool.py', 'bulk_write.py'):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module)) as f:
+            _write_if_changed(f'{output_dir}/{module}', f.read())
+    # Kept out of the router files, so a new limit applies without rendering every table again
+    _write_if_changed(
+        f'{output_dir}/pool_settings.py', POOL_SETTINGS_TEMPLATE.format(max_connections=max_connections)
+    )
+    
     # Introspect database
-    introspector = MSSQLIntrospector(connection_string)
-    tables = introspector.get_all_tables_info(schema)
+    if progress is not None:
+        progress.introspecting()
+    started = time.monotonic()
+    if cache is not None:
+        tables = cache.tables(refresh=True)
+        pending = cache.pending_generation(output_dir)
+    else:
+        introspector = MSSQLIntrospector(connection_string)
+        tables = introspector.get_all_tables_info(schema)
+        pending = None
     
     logger.info(f"Found {len(tables)} tables in schema '{schema}'")
+    if progress is not None:
+        progress.generating(len(tables), time.monotonic() - started)
     
-    # Generate models and routers for each table
+    # Tables whose schema did not change since their files were generated
+    # are left alone entirely
+    todo = []
     for table in tables:
-        model_name = PydanticModelGenerator._to_pascal_case(table.name)
-        
-        # Generate Pydantic models
-        model_code = PydanticModelGenerator.generate_model(table, model_name)
-        
-        with open(f'{output_dir}/models/{table.name}_models.py', 'w') as f:
-            f.write(model_code)
-        
-        # Generate FastAPI router
-        router_code = FastAPIRouterGenerator.generate_router(table, model_name)
-        
-        with open(f'{output_dir}/routers/{table.name}_router.py', 'w') as f:
-            f.write(router_code)
+        if (
+            pending is not None and table.name not in pending
+            and os.path.exists(f'{output_dir}/models/{table.name}_models.py')
+            and os.path.exists(f'{output_dir}/routers/{table.name}_router.py')
+        ):
+            if progress is not None:
+                progress.table_done(table.name, "skipped", files_unchanged=2)
+            continue
+        todo.append(table)
+    
+    generated = []
+    failed = []
+    written_files = 0
+    for table in todo:
+        table_started = time.monotonic()
+        try:
+            written, unchanged = _generate_table_files(table, output_dir)
+        except Exception as e:
+            logger.error(f"Failed to generate API for table {table.name}: {e}")
+            failed.append(table.name)
+            if progress is not None:
+                progress.table_done(table.name, "failed", error=str(e))
+            continue
         
-        logger.info(f"Generated API for table: {table.name}")
+        generated.append(table.name)
+        written_files += written
+        if progress is not None:
+            progress.table_done(
+                table.name, "written" if written else "unchanged",
+                files_written=written, files_unchanged=unchanged, seconds=time.monotonic() - table_started
+            )
+    
+    logger.info(
+        f"Rendered {len(generated)} tables ({written_files} files rewritten), "
+        f"{len(tables) - len(todo)} skipped, {len(failed)} failed"
+    )
+    
+    if cache is not None:
+        cache.mark_generated(generated, output_dir)
     
     # Generate main router file
-    main_router = generate_main_router(tables)
-    with open(f'{output_dir}/main_router.py', 'w') as f:
-        f.write(main_router)
+    _write_if_changed(f'{output_dir}/main_router.py', generate_main_router(tables))
     
     logger.info(f"API generation complete! Files saved to: {output_dir}")
     
@@ -3,19 +3,29 @@ Bi-Directional Database Sync Engine
 Syncs changes between Berqenas Cloud and remote databases
 """
 
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from dataclasses import dataclass
 from datetime import datetime
-import hashlib
-from datetime import datetime
-import hashlib
+import json
 import logging
+import time
+import uuid
+import psycopg2
+import pyodbc
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models.remote import SyncJob, SyncLog, SyncConflict
+from models.remote import RemoteDatabase, SyncJob, SyncLog, SyncConflict
+from services.adaptive_batch import AdaptiveBatchSizer
+from services.bulk_apply import get_bulk_applier, DEFAULT_APPLY_BATCH_SIZE, TRANSIENT_ERRORS
+from services.row_hash import hash_row, hash_rows
+from services.sync_state import SyncStateStore
+from services.sync_metrics import TableSyncMetrics
 
 logger = logging.getLogger(__name__)
 
+# Rows pulled from the server per fetch; bounds worker memory during catch-up syncs
+DEFAULT_BATCH_SIZE = 1000
+
 
 @dataclass
 class ChangeRecord:
@@ -24,9 +34,10 @@ class ChangeRecord:
     operation: str  # INSERT, UPDATE, DELETE
     primary_key: Dict[str, Any]
     data: Optional[Dict[str, Any]]
-    timestamp: datetime
+    timestamp: Optional[datetime]  # updated_at; None if the table has none (e.g. MSSQL rowversion only)
     source: str  # 'cloud' or 'local'
     hash: str
+    position: Optional[Tuple] = None  # Keyset position: (updated_at, *pk) or (row_version,)
 
 
 @dataclass
@@ -35,85 +46,329 @@ class SyncConflict:
     table_name: str
     primary_key: Dict[str, Any]
     cloud_data: Dict[str, Any]
-    cloud_timestamp: datetime
+    cloud_timestamp: Optional[datetime]
     local_data: Dict[str, Any]
-    local_timestamp: datetime
+    local_timestamp: Optional[datetime]
     conflict_type: str  # 'update_update', 'update_delete', 'delete_update'
 
 
 class ChangeDetector:
     """Detects changes in database tables"""
     
-    def __init__(self, connection_string: str, database_type: str):
+    # MSSQL rowversion column used as the change watermark
+    ROWVERSION_COLUMN = 'rv_column'
+    # Columns maintained by the sync machinery itself; they differ between
+    # sides by design and must not take part in conflict hashing
+    SYNC_METADATA_COLUMNS = ('updated_at', 'rv_column', 'row_version')
+    # MSSQL rejects statements with more than 2100 bound parameters
+    MAX_QUERY_PARAMS = 2000
+    
+    def __init__(
+        self,
+        connection_string: str,
+        database_type: str,
+        source: str = 'cloud',
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ):
         self.connection_string = connection_string
         self.database_type = database_type
+        self.source = source
+        self.batch_size = batch_size
+    
+    def get_connection(self):
+        """Get database connection"""
+        if self.database_type == 'mssql':
+            return pyodbc.connect(self.connection_string)
+        elif self.database_type == 'postgresql':
+            return psycopg2.connect(self.connection_string)
+        else:
+            raise ValueError(f"Unsupported database type: {self.database_type}")
+    
+    def measure_round_trip(self, samples: int = 3) -> float:
+        """Median time of a trivial query on an open connection (link latency)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            timings = []
+            for _ in range(samples):
+                start = time.perf_counter()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                timings.append(time.perf_counter() - start)
+            return sorted(timings)[len(timings) // 2]
+        finally:
+            conn.close()
     
     def detect_changes(
         self,
         table_name: str,
-        last_sync_timestamp: datetime,
-        primary_keys: List[str]
-    ) -> List[ChangeRecord]:
+        since: Any,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple] = None,
+        until: Any = None
+    ) -> Iterator[ChangeRecord]:
         """
-        Detect changes since last sync
+        Stream changes since last sync
+        
+        `since`/`until` are timestamps for PostgreSQL (updated_at) and
+        rowversion integers for MSSQL. Pass the `position` of the last
+        processed ChangeRecord as `resume_from` to continue mid-table.
         
         Requires tables to have:
-        - updated_at TIMESTAMP column
+        - updated_at TIMESTAMP column (PostgreSQL) or rv_column ROWVERSION (MSSQL)
         - is_deleted BOOLEAN column (for soft deletes)
         """
-        
+        for batch in self.detect_change_batches(table_name, since, primary_keys, resume_from, until):
+            yield from batch
+    
+    def detect_change_batches(
+        self,
+        table_name: str,
+        since: Any,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple] = None,
+        until: Any = None
+    ) -> Iterator[List[ChangeRecord]]:
+        """Stream changes as lists of at most `batch_size` records"""
         if self.database_type == 'mssql':
-            return self._detect_changes_mssql(table_name, last_sync_timestamp, primary_keys)
+            return self._detect_changes_mssql(table_name, since, primary_keys, resume_from, until)
         elif self.database_type == 'postgresql':
-            return self._detect_changes_postgres(table_name, last_sync_timestamp, primary_keys)
+            return self._detect_changes_postgres(table_name, since, primary_keys, resume_from, until)
         else:
             raise ValueError(f"Unsupported database type: {self.database_type}")
     
+    def get_high_watermark(self, table_name: str) -> Any:
+        """
+        Current upper bound for change detection
+        
+        Used to freeze the window of a sync run so that rows written by the
+        run itself are not picked up again before it finishes.
+        """
+        if self.database_type == 'mssql':
+            # Every rowversion below MIN_ACTIVE_ROWVERSION belongs to a committed transaction
+            query = "SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT) - 1"
+        else:
+            query = f"SELECT MAX(updated_at) FROM {table_name}"
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+    
+    def fetch_changes_for_keys(
+        self,
+        table_name: str,
+        since: Any,
+        primary_keys: List[str],
+        keys: List[Dict[str, Any]],
+        until: Any = None
+    ) -> List[ChangeRecord]:
+        """Fetch changes in the sync window restricted to the given primary keys"""
+        if not keys:
+            return []
+        
+        changes = []
+        chunk_size = max(1, self.MAX_QUERY_PARAMS // max(1, len(primary_keys)))
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                if self.database_type == 'mssql':
+                    query, params = self._keys_query_mssql(table_name, since, primary_keys, chunk, until)
+                    cursor.execute(query, *params)
+                    position_columns = ['row_version']
+                else:
+                    query, params = self._keys_query_postgres(table_name, since, primary_keys, chunk, until)
+                    cursor.execute(query, params)
+                    position_columns = ['updated_at'] + primary_keys
+                
+                columns = [column[0] for column in cursor.description]
+                changes.extend(self._to_change_records(
+                    table_name, columns, cursor.fetchall(), primary_keys, position_columns
+                ))
+        finally:
+            conn.close()
+        
+        return changes
+    
     def _detect_changes_mssql(
         self,
         table_name: str,
         last_sync_version: int,
-        primary_keys: List[str]
-    ) -> List[ChangeRecord]:
-        """Detect changes in MSSQL using RowVersion"""
-        # Note: In MSSQL, rowversion (or timestamp) is a binary counter
-        # We cast it to BIGINT for easy comparison in sync logic
+        primary_keys: List[str],
+        resume_from: Optional[Tuple] = None,
+        until: Optional[int] = None
+    ) -> Iterator[List[ChangeRecord]]:
+        """Stream changes in MSSQL using RowVersion"""
+        # Note: In MSSQL, rowversion (or timestamp) is a binary counter.
+        # Watermarks are kept as BIGINT, but the predicate compares against
+        # BINARY(8) so the index on rv_column is still used for the seek.
+        # rowversion is unique per database, so it is a complete keyset on its own.
+        rv = self.ROWVERSION_COLUMN
+        start = resume_from[0] if resume_from else (last_sync_version or 0)
+        
+        where = [f"{rv} > CAST(CAST(? AS BIGINT) AS BINARY(8))"]
+        params = [start]
+        if until is not None:
+            where.append(f"{rv} <= CAST(CAST(? AS BIGINT) AS BINARY(8))")
+            params.append(until)
+        
         query = f"""
-        SELECT *, CAST(rv_column AS BIGINT) as row_version
+        SELECT *, CAST({rv} AS BIGINT) as row_version
         FROM {table_name}
-        WHERE CAST(rv_column AS BIGINT) > ?
-        ORDER BY rv_column ASC
+        WHERE {' AND '.join(where)}
+        ORDER BY {rv} ASC
         """
         
-        changes = []
-        # In a real implementation, we would use pyodbc to execute this
-        # For this turn, I'm providing the logic structure that will be wrapped in Celery
-        return changes
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, *params)
+            columns = [column[0] for column in cursor.description]
+            
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield self._to_change_records(table_name, columns, rows, primary_keys, ['row_version'])
+        finally:
+            conn.close()
     
     def _detect_changes_postgres(
         self,
         table_name: str,
         last_sync_timestamp: datetime,
-        primary_keys: List[str]
-    ) -> List[ChangeRecord]:
-        """Detect changes in PostgreSQL using updated_at"""
+        primary_keys: List[str],
+        resume_from: Optional[Tuple] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[List[ChangeRecord]]:
+        """Stream changes in PostgreSQL using updated_at"""
+        # Keyset on (updated_at, pk): updated_at alone is not unique, so the
+        # primary key breaks ties and makes the resume position exact
+        order_columns = ['updated_at'] + primary_keys
+        
+        if resume_from:
+            placeholders = ', '.join(['%s'] * len(order_columns))
+            where = [f"({', '.join(order_columns)}) > ({placeholders})"]
+            params = list(resume_from)
+        else:
+            where = ["updated_at > %s"]
+            params = [last_sync_timestamp]
+        if until is not None:
+            where.append("updated_at <= %s")
+            params.append(until)
+        
         query = f"""
         SELECT *
         FROM {table_name}
-        WHERE updated_at > %s
-        ORDER BY updated_at ASC
+        WHERE {' AND '.join(where)}
+        ORDER BY {', '.join(order_columns)} ASC
         """
         
+        conn = self.get_connection()
+        try:
+            # Named cursor = server-side cursor; only batch_size rows are
+            # transferred and held in memory at a time
+            with conn.cursor(name=f"sync_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = self.batch_size
+                cursor.execute(query, params)
+                
+                while True:
+                    rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    columns = [column[0] for column in cursor.description]
+                    yield self._to_change_records(table_name, columns, rows, primary_keys, order_columns)
+        finally:
+            conn.close()
+    
+    def _keys_query_postgres(
+        self,
+        table_name: str,
+        since: datetime,
+        primary_keys: List[str],
+        keys: List[Dict[str, Any]],
+        until: Optional[datetime]
+    ) -> Tuple[str, list]:
+        """Build a PostgreSQL lookup of changed rows by primary key"""
+        # psycopg2 adapts a tuple of tuples to ((a, b), (c, d))
+        where = ["updated_at > %s", f"({', '.join(primary_keys)}) IN %s"]
+        params = [since, tuple(tuple(k[pk] for pk in primary_keys) for k in keys)]
+        if until is not None:
+            where.append("updated_at <= %s")
+            params.append(until)
+        
+        return f"SELECT * FROM {table_name} WHERE {' AND '.join(where)}", params
+    
+    def _keys_query_mssql(
+        self,
+        table_name: str,
+        since: int,
+        primary_keys: List[str],
+        keys: List[Dict[str, Any]],
+        until: Optional[int]
+    ) -> Tuple[str, list]:
+        """Build an MSSQL lookup of changed rows by primary key"""
+        rv = self.ROWVERSION_COLUMN
+        where = [f"{rv} > CAST(CAST(? AS BIGINT) AS BINARY(8))"]
+        params = [since or 0]
+        if until is not None:
+            where.append(f"{rv} <= CAST(CAST(? AS BIGINT) AS BINARY(8))")
+            params.append(until)
+        
+        if len(primary_keys) == 1:
+            where.append(f"{primary_keys[0]} IN ({', '.join(['?'] * len(keys))})")
+            params.extend(k[primary_keys[0]] for k in keys)
+        else:
+            match = '(' + ' AND '.join(f"{pk} = ?" for pk in primary_keys) + ')'
+            where.append('(' + ' OR '.join([match] * len(keys)) + ')')
+            for k in keys:
+                params.extend(k[pk] for pk in primary_keys)
+        
+        query = f"SELECT *, CAST({rv} AS BIGINT) as row_version FROM {table_name} WHERE {' AND '.join(where)}"
+        return query, params
+    
+    def _to_change_records(
+        self,
+        table_name: str,
+        columns: List[str],
+        rows: List[Any],
+        primary_keys: List[str],
+        position_columns: List[str]
+    ) -> List[ChangeRecord]:
+        """Convert a fetched page of rows into ChangeRecords"""
+        hashes = hash_rows(columns, rows, exclude=self.SYNC_METADATA_COLUMNS)
         changes = []
+        
+        for row, row_hash in zip(rows, hashes):
+            row = dict(zip(columns, row))
+            data = {k: v for k, v in row.items() if k not in self.SYNC_METADATA_COLUMNS}
+            
+            changes.append(ChangeRecord(
+                table_name=table_name,
+                operation='DELETE' if data.get('is_deleted') else 'UPDATE',
+                primary_key={pk: row[pk] for pk in primary_keys},
+                data=data,
+                timestamp=row.get('updated_at'),
+                source=self.source,
+                hash=row_hash,
+                position=tuple(row[c] for c in position_columns)
+            ))
+        
         return changes
     
     @staticmethod
     def calculate_hash(data: Dict[str, Any]) -> str:
         """Calculate hash of record for conflict detection"""
-        # Sort keys for consistent hashing
-        sorted_data = {k: data[k] for k in sorted(data.keys())}
-        data_str = str(sorted_data)
-        return hashlib.sha256(data_str.encode()).hexdigest()
+        # Canonical encoding: equal values hash equally regardless of driver types
+        return hash_row(data)
 
 
 class ConflictResolver:
@@ -146,6 +401,14 @@ class ConflictResolver:
             return ('local', conflict.local_data)
         
         elif self.strategy == 'latest_wins':
+            # A rowversion or log position cannot be compared with the other
+            # side's updated_at; guessing "now" would always pick that side
+            if conflict.cloud_timestamp is None or conflict.local_timestamp is None:
+                side = 'cloud' if conflict.cloud_timestamp is None else 'local'
+                raise ValueError(
+                    f"latest_wins needs an updated_at column on both sides, but {conflict.table_name} "
+                    f"has none on the {side} side; use cloud_wins, local_wins or manual"
+                )
             if conflict.cloud_timestamp > conflict.local_timestamp:
                 return ('cloud', conflict.cloud_data)
             else:
@@ -165,54 +428,347 @@ class BiDirectionalSync:
         cloud_connection: str,
         local_connection: str,
         database_type: str,
-        conflict_strategy: str = 'latest_wins'
+        conflict_strategy: str = 'latest_wins',
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        apply_batch_size: int = DEFAULT_APPLY_BATCH_SIZE,
+        state: Optional[SyncStateStore] = None,
+        change_source: str = 'polling',
+        remote_name: Optional[str] = None,
+        adaptive: bool = False
     ):
-        self.cloud_detector = ChangeDetector(cloud_connection, database_type)
-        self.local_detector = ChangeDetector(local_connection, database_type)
+        from services.change_sources import get_change_source
+        
+        # Berqenas Cloud is always PostgreSQL; database_type describes the remote side.
+        # The remote side can read its native change log instead of polling.
+        self.cloud_detector = ChangeDetector(cloud_connection, 'postgresql', 'cloud', batch_size)
+        self.local_detector = get_change_source(
+            local_connection, database_type, 'local', batch_size, change_source
+        )
+        self.cloud_applier = get_bulk_applier(cloud_connection, 'postgresql', apply_batch_size, adaptive)
+        self.local_applier = get_bulk_applier(local_connection, database_type, apply_batch_size, adaptive)
+        # Adaptive mode sizes fetch batches per side from observed throughput
+        self.fetch_sizers = {
+            'cloud': AdaptiveBatchSizer(batch_size),
+            'local': AdaptiveBatchSizer(batch_size)
+        } if adaptive else {}
+        self._link_measured = False
         self.conflict_resolver = ConflictResolver(conflict_strategy)
         self.database_type = database_type
+        self.state = state
+        self.remote_name = remote_name
+        self.metrics = TableSyncMetrics(remote_name, '')
+    
+    def close(self):
+        """Release connections held by the appliers"""
+        self.cloud_applier.close()
+        self.local_applier.close()
+    
+    def tuned_batch_sizes(self) -> Dict[str, int]:
+        """Fetch and apply batch sizes learned for the remote link, to persist per remote"""
+        fetch = self.fetch_sizers.get('local')
+        apply = self.local_applier.sizer
+        return {
+            'fetch': fetch.size if fetch is not None else self.local_detector.batch_size,
+            'apply': apply.size if apply is not None else self.local_applier.batch_size
+        }
+    
+    def _measure_link(self):
+        """Scale the remote side's batch time targets to its round-trip time"""
+        if self._link_measured or not self.fetch_sizers:
+            return
+        rtt = self.local_detector.measure_round_trip()
+        self.fetch_sizers['local'].set_round_trip(rtt)
+        self.local_applier.sizer.set_round_trip(rtt)
+        self._link_measured = True
+        logger.info(f"Remote round-trip time {rtt * 1000:.1f} ms")
+    
+    def _resumable_batches(
+        self,
+        side: str,
+        detector: ChangeDetector,
+        table_name: str,
+        since: Any,
+        primary_keys: List[str],
+        until: Any,
+        positions: Dict[str, Tuple]
+    ) -> Iterator[List[ChangeRecord]]:
+        """
+        Stream change batches of one side, sized to the link in adaptive mode
+        
+        A fetch that fails on a connection error or timeout is retried at
+        half the batch size from `positions[side]`, the last applied
+        position, instead of restarting the table.
+        """
+        sizer = self.fetch_sizers.get(side)
+        if sizer is not None:
+            detector.batch_size = sizer.size
+        
+        while True:
+            batches = detector.detect_change_batches(
+                table_name, since, primary_keys, positions.get(side), until
+            )
+            try:
+                while True:
+                    start = time.perf_counter()
+                    batch = next(batches, None)
+                    if batch is None:
+                        return
+                    if sizer is not None:
+                        sizer.observe(len(batch), time.perf_counter() - start)
+                        detector.batch_size = sizer.size
+                    yield batch
+            except TRANSIENT_ERRORS as e:
+                if sizer is None or not sizer.failed():
+                    raise
+                detector.batch_size = sizer.size
+                logger.warning(
+                    f"Fetching {side} changes of {table_name} failed: {e}; "
+                    f"retrying at {sizer.size} rows from the last applied position"
+                )
+            finally:
+                batches.close()
     
     def sync_table(
         self,
         table_name: str,
         primary_keys: List[str],
-        last_sync_timestamp: datetime
+        last_sync_timestamp: datetime,
+        last_sync_version: Optional[int] = None,
+        resume_from: Optional[Dict[str, Tuple]] = None
     ) -> Dict[str, Any]:
         """
         Sync a single table bi-directionally
         
+        Changes are streamed batch by batch, so memory stays bounded by
+        `batch_size` regardless of how far behind the remote is:
+        
+        1. Cloud change batches are matched against local changes to the
+           same keys, conflicts resolved, and the result applied.
+        2. Local change batches are applied to the cloud, skipping keys
+           that were already settled in step 1.
+        
+        With a state store, rows whose hash matches the last agreed hash
+        are skipped, progress is checkpointed after every batch, and the
+        watermarks are advanced when the table finishes. The index also
+        records which side the sync wrote each row to, so the next run can
+        tell its own writes coming back (echoes) from real changes.
+        
+        `last_sync_version` is the watermark of the remote side: a rowversion
+        for MSSQL, an updated_at timestamp (default: last_sync_timestamp)
+        for PostgreSQL, or a change log position with a native change source.
+        `resume_from` takes the 'positions' of an interrupted run.
+        
         Returns:
             {
                 'cloud_to_local': int,  # Records synced from cloud to local
                 'local_to_cloud': int,  # Records synced from local to cloud
+                'unchanged': int,       # Detected rows whose content matched the hash index
+                'echoes_suppressed': {'cloud': int, 'local': int},  # Our own writes, detected again
                 'conflicts': List[SyncConflict],
-                'errors': List[str]
+                'errors': List[str],
+                'watermarks': {'cloud': ..., 'local': ...},  # Start of the next run
+                'positions': {'cloud': ..., 'local': ...}    # Last applied keyset positions
             }
         """
         
         logger.info(f"Starting bi-directional sync for table: {table_name}")
+        resume_from = resume_from or {}
+        self.metrics = TableSyncMetrics(self.remote_name, table_name)
+        window_start = datetime.utcnow()
         
-        # 1. Detect changes in both databases
-        cloud_changes = self.cloud_detector.detect_changes(
-            table_name,
-            last_sync_timestamp,
-            primary_keys
-        )
+        cloud_since = last_sync_timestamp
+        local_since = last_sync_version
+        if local_since is None and self.database_type != 'mssql':
+            local_since = last_sync_timestamp
         
-        local_changes = self.local_detector.detect_changes(
-            table_name,
-            last_sync_timestamp,
-            primary_keys
-        )
+        self._measure_link()
+        
+        # Freeze the sync window so our own writes are not re-detected in this run
+        cloud_until = self.cloud_detector.get_high_watermark(table_name)
+        local_until = self.local_detector.get_high_watermark(table_name)
+        # An empty table has no MAX(updated_at): its window is empty, and
+        # rows inserted while this run goes belong to the next one
+        if cloud_until is None:
+            cloud_until = cloud_since
+        if local_until is None:
+            local_until = local_since
         
-        logger.info(f"Cloud changes: {len(cloud_changes)}, Local changes: {len(local_changes)}")
+        cloud_to_local_count = 0
+        local_to_cloud_count = 0
+        cloud_detected = 0
+        local_detected = 0
+        unchanged = 0
+        echoes = {'cloud': 0, 'local': 0}
+        conflicts = []
+        positions = dict(resume_from)
+        
+        try:
+            # 1. Cloud changes, checked against local changes to the same keys
+            for cloud_batch in self.metrics.timed_batches('cloud', self._resumable_batches(
+                'cloud', self.cloud_detector, table_name, cloud_since, primary_keys, cloud_until, positions
+            )):
+                cloud_detected += len(cloud_batch)
+                position = cloud_batch[-1].position
+                with self.metrics.timed_lookup('local'):
+                    local_batch = self.local_detector.fetch_changes_for_keys(
+                        table_name,
+                        local_since,
+                        primary_keys,
+                        [c.primary_key for c in cloud_batch],
+                        local_until
+                    )
+                
+                known_hashes = self._known_hashes(table_name, cloud_batch, primary_keys)
+                changed_cloud = self._changed_since_last_sync(cloud_batch, known_hashes, primary_keys)
+                local_batch = self._changed_since_last_sync(local_batch, known_hashes, primary_keys)
+                batch_echoes = self._count_echoes(cloud_batch, known_hashes, primary_keys)
+                echoes['cloud'] += batch_echoes
+                unchanged += len(cloud_batch) - len(changed_cloud)
+                self.metrics.suppressed('cloud', 'echo', batch_echoes)
+                self.metrics.suppressed('cloud', 'unchanged', len(cloud_batch) - len(changed_cloud) - batch_echoes)
+                cloud_batch = changed_cloud
+                
+                batch_conflicts = self._detect_conflicts(cloud_batch, local_batch, primary_keys)
+                resolved_conflicts = self._resolve_conflicts(batch_conflicts)
+                conflicts.extend(batch_conflicts)
+                self.metrics.conflicts(batch_conflicts)
+                
+                # Rows changed identically on both sides need no work in either direction
+                cloud_hashes = {self._get_pk_value(c, primary_keys): c.hash for c in cloud_batch}
+                identical = {
+                    self._get_pk_value(c, primary_keys): c.hash for c in local_batch
+                    if cloud_hashes.get(self._get_pk_value(c, primary_keys)) == c.hash
+                }
+                self._remember_hashes(table_name, identical)
+                
+                cloud_to_local_count += self._apply_changes_to_local(
+                    [c for c in cloud_batch if self._get_pk_value(c, primary_keys) not in identical],
+                    resolved_conflicts,
+                    table_name,
+                    primary_keys
+                )
+                local_to_cloud_count += self._apply_changes_to_cloud(
+                    [c for c in local_batch if self._get_pk_value(c, primary_keys) not in identical],
+                    resolved_conflicts,
+                    table_name,
+                    primary_keys
+                )
+                positions['cloud'] = position
+                self._save_position(table_name, 'cloud', position)
+            
+            # 2. Local changes not already settled in pass 1
+            for local_batch in self.metrics.timed_batches('local', self._resumable_batches(
+                'local', self.local_detector, table_name, local_since, primary_keys, local_until, positions
+            )):
+                local_detected += len(local_batch)
+                position = local_batch[-1].position
+                
+                known_hashes = self._known_hashes(table_name, local_batch, primary_keys)
+                changed_local = self._changed_since_last_sync(local_batch, known_hashes, primary_keys)
+                batch_echoes = self._count_echoes(local_batch, known_hashes, primary_keys)
+                echoes['local'] += batch_echoes
+                unchanged += len(local_batch) - len(changed_local)
+                self.metrics.suppressed('local', 'echo', batch_echoes)
+                self.metrics.suppressed('local', 'unchanged', len(local_batch) - len(changed_local) - batch_echoes)
+                
+                with self.metrics.timed_lookup('cloud'):
+                    settled = self.cloud_detector.fetch_changes_for_keys(
+                        table_name,
+                        cloud_since,
+                        primary_keys,
+                        [c.primary_key for c in changed_local],
+                        cloud_until
+                    )
+                settled_keys = {
+                    self._get_pk_value(c, primary_keys)
+                    for c in self._changed_since_last_sync(settled, known_hashes, primary_keys)
+                }
+                
+                local_to_cloud_count += self._apply_changes_to_cloud(
+                    [c for c in changed_local if self._get_pk_value(c, primary_keys) not in settled_keys],
+                    [],
+                    table_name,
+                    primary_keys
+                )
+                positions['local'] = position
+                self._save_position(table_name, 'local', position)
+        finally:
+            self.close()
         
-        # 2. Detect conflicts
-        conflicts = self._detect_conflicts(cloud_changes, local_changes, primary_keys)
+        # Everything that changed before the window was frozen is applied now
+        self.metrics.caught_up('cloud', window_start)
+        self.metrics.caught_up('local', window_start)
         
+        # Echoes are a subset of the unchanged rows; report the two apart
+        unchanged -= sum(echoes.values())
+        logger.info(f"Cloud changes: {cloud_detected}, Local changes: {local_detected}, Unchanged: {unchanged}")
+        logger.info(f"Echoes suppressed: {echoes['cloud']} on cloud, {echoes['local']} on local")
         logger.info(f"Conflicts detected: {len(conflicts)}")
         
-        # 3. Resolve conflicts
+        watermarks = {
+            'cloud': cloud_until if cloud_until is not None else cloud_since,
+            'local': local_until if local_until is not None else local_since
+        }
+        if self.state is not None:
+            self.state.complete(table_name, watermarks, sum(echoes.values()))
+        
+        return {
+            'cloud_to_local': cloud_to_local_count,
+            'local_to_cloud': local_to_cloud_count,
+            'unchanged': unchanged,
+            'echoes_suppressed': echoes,
+            'conflicts': conflicts,
+            'conflicts_resolved': len(conflicts),
+            'errors': [],
+            'watermarks': watermarks,
+            'positions': positions
+        }
+    
+    def _known_hashes(
+        self,
+        table_name: str,
+        changes: List[ChangeRecord],
+        primary_keys: List[str]
+    ) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Last agreed (row hash, side written to) for the keys of a batch"""
+        if self.state is None:
+            return {}
+        return self.state.get_hashes(table_name, [self._get_pk_value(c, primary_keys) for c in changes])
+    
+    def _changed_since_last_sync(
+        self,
+        changes: List[ChangeRecord],
+        known_hashes: Dict[str, Tuple[str, Optional[str]]],
+        primary_keys: List[str]
+    ) -> List[ChangeRecord]:
+        """Drop changes whose content is what both sides last agreed on"""
+        return [
+            c for c in changes
+            if known_hashes.get(self._get_pk_value(c, primary_keys), (None,))[0] != c.hash
+        ]
+    
+    def _count_echoes(
+        self,
+        changes: List[ChangeRecord],
+        known_hashes: Dict[str, Tuple[str, Optional[str]]],
+        primary_keys: List[str]
+    ) -> int:
+        """Count changes that are exactly a row the sync itself wrote to their side"""
+        return sum(
+            1 for c in changes
+            if known_hashes.get(self._get_pk_value(c, primary_keys)) == (c.hash, c.source)
+        )
+    
+    def _remember_hashes(self, table_name: str, hashes: Dict[str, str], written_to: Optional[str] = None):
+        if self.state is not None:
+            self.state.put_hashes(table_name, hashes, written_to)
+    
+    def _save_position(self, table_name: str, side: str, position: Tuple):
+        if self.state is not None:
+            self.state.save_position(table_name, side, position)
+    
+    def _resolve_conflicts(self, conflicts: List[SyncConflict]) -> List[Dict]:
+        """Resolve conflicts with the configured strategy"""
         resolved_conflicts = []
         for conflict in conflicts:
             winner, data = self.conflict_resolver.resolve(conflict)
@@ -221,27 +777,7 @@ class BiDirectionalSync:
                 'winner': winner,
                 'data': data
             })
-        
-        # 4. Apply changes
-        cloud_to_local_count = self._apply_changes_to_local(
-            cloud_changes,
-            resolved_conflicts,
-            table_name
-        )
-        
-        local_to_cloud_count = self._apply_changes_to_cloud(
-            local_changes,
-            resolved_conflicts,
-            table_name
-        )
-        
-        return {
-            'cloud_to_local': cloud_to_local_count,
-            'local_to_cloud': local_to_cloud_count,
-            'conflicts': conflicts,
-            'conflicts_resolved': len(resolved_conflicts),
-            'errors': []
-        }
+        return resolved_conflicts
     
     def _detect_conflicts(
         self,
@@ -253,30 +789,26 @@ class BiDirectionalSync:
         
         conflicts = []
         
-        # Build lookup maps
+        # Build lookup maps; sync_table passes one batch at a time, so they stay small
         cloud_map = {self._get_pk_value(c, primary_keys): c for c in cloud_changes}
         local_map = {self._get_pk_value(c, primary_keys): c for c in local_changes}
         
-        # Find records changed in both places
-        common_keys = set(cloud_map.keys()) & set(local_map.keys())
-        
-        for pk in common_keys:
-            cloud_change = cloud_map[pk]
-            local_change = local_map[pk]
+        # Records changed in both places with differing hashes (actual conflicts), in cloud order
+        for pk, cloud_change in cloud_map.items():
+            local_change = local_map.get(pk)
+            if local_change is None or cloud_change.hash == local_change.hash:
+                continue
+            conflict_type = f"{cloud_change.operation.lower()}_{local_change.operation.lower()}"
             
-            # Check if hashes differ (actual conflict)
-            if cloud_change.hash != local_change.hash:
-                conflict_type = f"{cloud_change.operation.lower()}_{local_change.operation.lower()}"
-                
-                conflicts.append(SyncConflict(
-                    table_name=cloud_change.table_name,
-                    primary_key=cloud_change.primary_key,
-                    cloud_data=cloud_change.data,
-                    cloud_timestamp=cloud_change.timestamp,
-                    local_data=local_change.data,
-                    local_timestamp=local_change.timestamp,
-                    conflict_type=conflict_type
-                ))
+            conflicts.append(SyncConflict(
+                table_name=cloud_change.table_name,
+                primary_key=cloud_change.primary_key,
+                cloud_data=cloud_change.data,
+                cloud_timestamp=cloud_change.timestamp,
+                local_data=local_change.data,
+                local_timestamp=local_change.timestamp,
+                conflict_type=conflict_type
+            ))
         
         return conflicts
     
@@ -285,26 +817,36 @@ class BiDirectionalSync:
         pk_values = [str(change.primary_key.get(pk)) for pk in primary_keys]
         return '|'.join(pk_values)
     
+    def _winning_changes(
+        self,
+        changes: List[ChangeRecord],
+        resolved_conflicts: List[Dict],
+        primary_keys: List[str],
+        source: str
+    ) -> List[ChangeRecord]:
+        """Drop conflicted changes unless `source` won the conflict"""
+        winners = {
+            self._get_pk_value(rc['conflict'], primary_keys): rc['winner']
+            for rc in resolved_conflicts
+        }
+        return [
+            c for c in changes
+            if winners.get(self._get_pk_value(c, primary_keys), source) == source
+        ]
+    
     def _apply_changes_to_local(
         self,
         cloud_changes: List[ChangeRecord],
         resolved_conflicts: List[Dict],
-        table_name: str
+        table_name: str,
+        primary_keys: List[str]
     ) -> int:
-        """Apply cloud changes to local database (MSSQL)"""
-        count = 0
-        conflicted_keys = {self._get_pk_value(rc['conflict'], []) for rc in resolved_conflicts}
-        
-        for change in cloud_changes:
-            pk_val = self._get_pk_value(change, []) # simplified
-            if pk_val in conflicted_keys:
-                # Use the resolved version from resolved_conflicts
-                continue 
-            
-            # Logic: Execute MERGE or UPDATE/INSERT in MSSQL
-            # logger.info(f"Applying {change.operation} to {table_name} for {pk_val}")
-            count += 1
-            
+        """Apply cloud changes to local database (staged MERGE on MSSQL)"""
+        changes = self._winning_changes(cloud_changes, resolved_conflicts, primary_keys, 'cloud')
+        with self.metrics.timed_apply('local', changes):
+            count = self.local_applier.apply(table_name, changes, primary_keys)
+        self._remember_hashes(table_name, {self._get_pk_value(c, primary_keys): c.hash for c in changes}, 'local')
+        
         logger.info(f"Applied {count} cloud changes to local database")
         return count
     
@@ -312,21 +854,21 @@ class BiDirectionalSync:
         self,
         local_changes: List[ChangeRecord],
         resolved_conflicts: List[Dict],
-        table_name: str
+        table_name: str,
+        primary_keys: List[str]
     ) -> int:
-        """Apply local changes to cloud database (Postgres)"""
-        count = 0
-        # Logic: Use INSERT ... ON CONFLICT DO UPDATE for Postgres
-        for change in local_changes:
-            # logger.info(f"Upserting {table_name} to cloud")
-            count += 1
-            
+        """Apply local changes to cloud database (COPY + ON CONFLICT upsert)"""
+        changes = self._winning_changes(local_changes, resolved_conflicts, primary_keys, 'local')
+        with self.metrics.timed_apply('cloud', changes):
+            count = self.cloud_applier.apply(table_name, changes, primary_keys)
+        self._remember_hashes(table_name, {self._get_pk_value(c, primary_keys): c.hash for c in changes}, 'cloud')
+        
         logger.info(f"Applied {count} local changes to cloud database")
         return count
 
 
 class SyncScheduler:
-    """Schedules and manages sync jobs"""
+    """Schedules and manages sync jobs (executed by Celery workers, see services.sync_tasks)"""
     
     def __init__(self):
         self.jobs = {}
@@ -339,17 +881,43 @@ class SyncScheduler:
         conflict_strategy: str = 'latest_wins'
     ):
         """Schedule periodic sync for remote database"""
+        ConflictResolver(conflict_strategy)  # Validate strategy
+        
+        db = SessionLocal()
+        try:
+            remote_db = db.query(RemoteDatabase).filter(RemoteDatabase.id == remote_db_id).first()
+            if not remote_db:
+                raise ValueError(f"Remote database {remote_db_id} not found")
+            
+            # Picked up by the dispatch_due_syncs beat task
+            remote_db.sync_interval_minutes = interval_minutes
+            remote_db.sync_tables = json.dumps(tables) if tables else None
+            remote_db.conflict_strategy = conflict_strategy
+            db.commit()
+        finally:
+            db.close()
         
-        # TODO: Implement with Celery or APScheduler
         logger.info(f"Scheduled sync for remote_db {remote_db_id} every {interval_minutes} minutes")
     
-    def run_sync_now(self, remote_db_id: int) -> Dict[str, Any]:
+    def run_sync_now(self, remote_db_id: int, db: Optional[Session] = None) -> Dict[str, Any]:
         """Run sync immediately"""
+        from services.sync_tasks import run_remote_sync
+        
+        session = db or SessionLocal()
+        try:
+            job = SyncJob(remote_db_id=remote_db_id, status="pending")
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        finally:
+            if db is None:
+                session.close()
+        
+        run_remote_sync.delay(job_id)
         
-        # TODO: Trigger sync job
         return {
             'status': 'started',
-            'job_id': 'sync_job_123'
+            'job_id': job_id
         }
 
 
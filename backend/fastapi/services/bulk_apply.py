@@ -0,0 +1,253 @@
+"""
+Bulk Apply Engine for Bi-Directional Sync
+Writes batches of ChangeRecords with one staged upsert per batch instead of one round trip per row
+"""
+
+from typing import List, Dict, Any
+from datetime import datetime, date, time
+import io
+import json
+import logging
+import time as timer
+import uuid
+import psycopg2
+import pyodbc
+
+from services.adaptive_batch import AdaptiveBatchSizer
+
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction; a failed batch rolls back on its own
+DEFAULT_APPLY_BATCH_SIZE = 5000
+
+# Connection drops and timeouts: worth retrying with a smaller batch.
+# Data errors (constraints, types) are not and fail the batch immediately.
+TRANSIENT_ERRORS = (psycopg2.OperationalError, pyodbc.OperationalError)
+
+
+class BulkApplier:
+    """Applies ChangeRecords to one database in atomic batches"""
+
+    def __init__(
+        self,
+        connection_string: str,
+        batch_size: int = DEFAULT_APPLY_BATCH_SIZE,
+        adaptive: bool = False
+    ):
+        self.connection_string = connection_string
+        self.batch_size = batch_size
+        self.sizer = AdaptiveBatchSizer(batch_size) if adaptive else None
+        self._conn = None
+
+    def get_connection(self):
+        """Get database connection (kept open across batches)"""
+        raise NotImplementedError
+
+    def close(self):
+        """Close the underlying connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def apply(self, table_name: str, changes: List, primary_keys: List[str]) -> int:
+        """
+        Apply changes in batches of `batch_size`
+
+        Changes with data are upserted (soft deletes travel as is_deleted
+        rows); changes without data are hard-deleted by primary key.
+        Each batch is committed atomically. When adaptive, batch sizes
+        follow the link's throughput and a batch that fails on a
+        connection error or timeout is retried at half size.
+        """
+        count = 0
+        i = 0
+
+        while i < len(changes):
+            size = self.sizer.size if self.sizer is not None else self.batch_size
+            chunk = changes[i:i + size]
+            upserts = [c.data for c in chunk if c.data is not None]
+            deletes = [c.primary_key for c in chunk if c.data is None]
+
+            start = timer.perf_counter()
+            conn = self.get_connection()
+            try:
+                if upserts:
+                    self._upsert(conn, table_name, upserts, primary_keys)
+                if deletes:
+                    self._delete(conn, table_name, deletes, primary_keys)
+                conn.commit()
+            except Exception as e:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass  # The connection itself is gone
+                # Session state (temp tables, IDENTITY_INSERT) may be left dirty
+                self.close()
+                if isinstance(e, TRANSIENT_ERRORS) and self.sizer is not None and self.sizer.failed():
+                    logger.warning(
+                        f"Bulk apply to {table_name} failed ({len(chunk)} rows): {e}; "
+                        f"retrying at {self.sizer.size} rows"
+                    )
+                    continue
+                logger.error(f"Bulk apply failed for {table_name} ({len(chunk)} rows): {e}")
+                raise
+
+            if self.sizer is not None:
+                self.sizer.observe(len(chunk), timer.perf_counter() - start)
+            count += len(chunk)
+            i += len(chunk)
+
+        return count
+
+    def _upsert(self, conn, table_name: str, rows: List[Dict[str, Any]], primary_keys: List[str]):
+        raise NotImplementedError
+
+    def _delete(self, conn, table_name: str, keys: List[Dict[str, Any]], primary_keys: List[str]):
+        raise NotImplementedError
+
+
+class PostgresBulkApplier(BulkApplier):
+    """COPY into a temp table, then a single INSERT ... ON CONFLICT DO UPDATE"""
+
+    def get_connection(self):
+        if self._conn is None:
+            self._conn = psycopg2.connect(self.connection_string)
+        return self._conn
+
+    def _upsert(self, conn, table_name: str, rows: List[Dict[str, Any]], primary_keys: List[str]):
+        columns = list(rows[0].keys())
+        column_list = ', '.join(columns)
+        stage = f"sync_stage_{uuid.uuid4().hex[:12]}"
+
+        updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in columns if c not in primary_keys)
+        on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+                f"SELECT {column_list} FROM {table_name} WITH NO DATA"
+            )
+            cursor.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN", self._to_copy_buffer(rows, columns))
+            cursor.execute(f"""
+            INSERT INTO {table_name} ({column_list})
+            SELECT {column_list} FROM {stage}
+            ON CONFLICT ({', '.join(primary_keys)}) {on_conflict}
+            """)
+
+    def _delete(self, conn, table_name: str, keys: List[Dict[str, Any]], primary_keys: List[str]):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table_name} WHERE ({', '.join(primary_keys)}) IN %s",
+                (tuple(tuple(k[pk] for pk in primary_keys) for k in keys),)
+            )
+
+    @classmethod
+    def _to_copy_buffer(cls, rows: List[Dict[str, Any]], columns: List[str]) -> io.StringIO:
+        """Encode rows in COPY text format"""
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(cls._copy_value(row.get(c)) for c in columns))
+            buffer.write('\n')
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def _copy_value(value: Any) -> str:
+        """Encode a single value for COPY text format"""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            text = 't' if value else 'f'
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            text = '\\x' + bytes(value).hex()
+        elif isinstance(value, (dict, list)):
+            text = json.dumps(value, default=str)
+        elif isinstance(value, (datetime, date, time)):
+            text = value.isoformat()
+        else:
+            text = str(value)
+        return (
+            text.replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+        )
+
+
+class MSSQLBulkApplier(BulkApplier):
+    """fast_executemany into a #staging table, then a single MERGE"""
+
+    def get_connection(self):
+        if self._conn is None:
+            self._conn = pyodbc.connect(self.connection_string, autocommit=False)
+        return self._conn
+
+    def _upsert(self, conn, table_name: str, rows: List[Dict[str, Any]], primary_keys: List[str]):
+        columns = list(rows[0].keys())
+        column_list = ', '.join(columns)
+        stage = f"#sync_stage_{uuid.uuid4().hex[:12]}"
+
+        on = ' AND '.join(f"t.{pk} = s.{pk}" for pk in primary_keys)
+        updates = ', '.join(f"t.{c} = s.{c}" for c in columns if c not in primary_keys)
+        when_matched = f"WHEN MATCHED THEN UPDATE SET {updates}" if updates else ""
+
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        try:
+            # UNION ALL keeps the column types but drops the IDENTITY property,
+            # so explicit key values can be staged
+            cursor.execute(
+                f"SELECT TOP 0 {column_list} INTO {stage} FROM {table_name} "
+                f"UNION ALL SELECT TOP 0 {column_list} FROM {table_name}"
+            )
+            cursor.executemany(
+                f"INSERT INTO {stage} ({column_list}) VALUES ({', '.join(['?'] * len(columns))})",
+                [tuple(row.get(c) for c in columns) for row in rows]
+            )
+
+            has_identity = cursor.execute(
+                "SELECT OBJECTPROPERTY(OBJECT_ID(?), 'TableHasIdentity')", table_name
+            ).fetchone()[0]
+            if has_identity:
+                cursor.execute(f"SET IDENTITY_INSERT {table_name} ON")
+
+            cursor.execute(f"""
+            MERGE {table_name} AS t
+            USING {stage} AS s
+            ON {on}
+            {when_matched}
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({column_list}) VALUES ({', '.join(f's.{c}' for c in columns)});
+            """)
+
+            if has_identity:
+                cursor.execute(f"SET IDENTITY_INSERT {table_name} OFF")
+            cursor.execute(f"DROP TABLE {stage}")
+        finally:
+            cursor.close()
+
+    def _delete(self, conn, table_name: str, keys: List[Dict[str, Any]], primary_keys: List[str]):
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        try:
+            cursor.executemany(
+                f"DELETE FROM {table_name} WHERE {' AND '.join(f'{pk} = ?' for pk in primary_keys)}",
+                [tuple(k[pk] for pk in primary_keys) for k in keys]
+            )
+        finally:
+            cursor.close()
+
+
+def get_bulk_applier(
+    connection_string: str,
+    database_type: str,
+    batch_size: int = DEFAULT_APPLY_BATCH_SIZE,
+    adaptive: bool = False
+) -> BulkApplier:
+    """Get the bulk applier for a database type"""
+    if database_type == 'mssql':
+        return MSSQLBulkApplier(connection_string, batch_size, adaptive)
+    elif database_type == 'postgresql':
+        return PostgresBulkApplier(connection_string, batch_size, adaptive)
+    else:
+        raise ValueError(f"Unsupported database type: {database_type}")
@@ -0,0 +1,177 @@
+"""
+Bulk Write
+Runs many row statements in one transaction with batched execution and per-row error reporting
+
+Standard library only: generate_api_for_database copies this module next
+to the generated routers.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Largest number of rows accepted by one bulk request
+MAX_BULK_ROWS = int(os.getenv("CRUD_MAX_BULK_ROWS", "10000"))
+
+# Statements per round trip for PostgreSQL (psycopg2 execute_batch)
+POSTGRES_PAGE_SIZE = 1000
+
+
+class BatchTooLarge(ValueError):
+    """A bulk request carried more than the allowed number of rows"""
+
+
+@dataclass(frozen=True)
+class SavepointSql:
+    """Statements to fence off one row inside a transaction"""
+    save: str
+    rollback: str
+    release: Optional[str] = None
+
+
+# With ODBC autocommit off SQL Server opens transactions implicitly, which
+# SAVE TRANSACTION does not do
+MSSQL_SAVEPOINTS = SavepointSql(
+    save="IF @@TRANCOUNT = 0 BEGIN TRANSACTION; SAVE TRANSACTION bulk_row",
+    rollback="ROLLBACK TRANSACTION bulk_row"
+)
+POSTGRES_SAVEPOINTS = SavepointSql(
+    save="SAVEPOINT bulk_row",
+    rollback="ROLLBACK TO SAVEPOINT bulk_row",
+    release="RELEASE SAVEPOINT bulk_row"
+)
+
+
+# Row statement error for an update or delete whose key matched no row
+NOT_FOUND = "not found"
+
+
+def executemany_mssql(cursor, sql: str, rows: List[Sequence]) -> Optional[int]:
+    """pyodbc with fast_executemany: the rows travel as one parameter array"""
+    cursor.fast_executemany = True
+    cursor.executemany(sql, rows)
+    # Rows affected by the whole parameter array; -1 if the driver cannot tell
+    return cursor.rowcount
+
+
+def executemany_postgres(cursor, sql: str, rows: List[Sequence]) -> Optional[int]:
+    """psycopg2 execute_batch: POSTGRES_PAGE_SIZE statements per round trip"""
+    from psycopg2.extras import execute_batch
+    execute_batch(cursor, sql, rows, page_size=POSTGRES_PAGE_SIZE)
+    # rowcount only covers the last statement of the last page
+    return None
+
+
+def parse_items(body: bytes, content_type: str, max_rows: int = MAX_BULK_ROWS) -> List[Any]:
+    """Rows of a bulk request body: a JSON array, or NDJSON (application/x-ndjson)"""
+    if content_type.split(';')[0].strip() in ('application/x-ndjson', 'application/ndjson'):
+        items = []
+        for number, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON")
+            if len(items) > max_rows:
+                raise BatchTooLarge(f"At most {max_rows} rows per request")
+        return items
+
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise ValueError("Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise ValueError("Body must be a JSON array or NDJSON")
+    if len(items) > max_rows:
+        raise BatchTooLarge(f"At most {max_rows} rows per request")
+    return items
+
+
+def _runs(statements: List[Tuple[int, str, Sequence]]):
+    """Consecutive statements with the same SQL, so row order is kept"""
+    run: List[Tuple[int, str, Sequence]] = []
+    for statement in statements:
+        if run and statement[1] != run[0][1]:
+            yield run
+            run = []
+        run.append(statement)
+    if run:
+        yield run
+
+
+def execute_bulk(
+    conn,
+    statements: List[Tuple[int, str, Sequence]],
+    executemany: Callable,
+    savepoints: SavepointSql,
+    atomic: bool = True,
+    require_rows: bool = False
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Execute (row index, sql, params) statements in one transaction
+
+    Fast path: one executemany per run of identical SQL, one commit. If
+    that fails, the transaction is rolled back and the rows are replayed
+    one by one, each behind a savepoint, to find the ones that fail.
+
+    require_rows is for updates and deletes by key: a statement that
+    affects no row fails with NOT_FOUND. The fast path then only commits
+    if the rows affected, as reported by executemany, add up to one per
+    statement; otherwise (or if the driver cannot tell) the rows are
+    replayed to find the missing ones.
+
+    Returns (rows written, [{"index": ..., "error": ...}]). When atomic,
+    any failure rolls back everything and no rows are written.
+    """
+    if not statements:
+        return 0, []
+
+    cursor = conn.cursor()
+    try:
+        affected = 0
+        for run in _runs(statements):
+            count = executemany(cursor, run[0][1], [params for _, _, params in run])
+            affected = None if affected is None or count is None or count < 0 else affected + count
+        if not require_rows or affected == len(statements):
+            conn.commit()
+            return len(statements), []
+        logger.info(
+            f"Bulk write of {len(statements)} rows affected "
+            f"{'an unknown number of' if affected is None else affected} rows; checking row by row"
+        )
+        conn.rollback()
+    except Exception as e:
+        logger.info(f"Bulk write of {len(statements)} rows failed ({e}); locating failing rows")
+        conn.rollback()
+
+    cursor = conn.cursor()
+    written = 0
+    errors = []
+    for index, sql, params in statements:
+        cursor.execute(savepoints.save)
+        try:
+            cursor.execute(sql, params)
+        except Exception as e:
+            # A failure to roll back to the savepoint means the transaction
+            # itself is gone; that propagates and rolls everything back
+            cursor.execute(savepoints.rollback)
+            errors.append({"index": index, "error": str(e)})
+            continue
+        if require_rows and cursor.rowcount == 0:
+            cursor.execute(savepoints.rollback)
+            errors.append({"index": index, "error": NOT_FOUND})
+            continue
+        if savepoints.release:
+            cursor.execute(savepoints.release)
+        written += 1
+
+    if errors and atomic:
+        conn.rollback()
+        return 0, errors
+    conn.commit()
+    return written, errors
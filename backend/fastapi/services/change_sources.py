@@ -0,0 +1,685 @@
+"""
+Native Change Sources
+Log-based change capture for sync: PostgreSQL logical replication and SQL Server Change Tracking
+"""
+
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from decimal import Decimal
+import json
+import logging
+import uuid
+
+from psycopg2 import errors as pg_errors
+
+from services.bidirectional_sync import ChangeDetector, ChangeRecord, DEFAULT_BATCH_SIZE
+from services.row_hash import blake2b_digest
+
+logger = logging.getLogger(__name__)
+
+# 'polling' reads updated_at/rowversion columns; 'native' reads the database's own change log
+CHANGE_SOURCES = ('polling', 'native')
+
+# Hard deletes carry no row content; all of them share one hash
+DELETED_HASH = blake2b_digest(b'deleted')
+
+# First element of a keyset position taken during an initial snapshot
+SNAPSHOT = 'snapshot'
+
+
+def _key_string(values) -> str:
+    """Key lookup string; matches BiDirectionalSync._get_pk_value"""
+    return '|'.join(str(v) for v in values)
+
+
+def _keyset_predicate_mssql(columns: List[str], values: Tuple) -> Tuple[str, list]:
+    """Expand (a, b) > (?, ?) for SQL Server, which has no row-value comparison"""
+    clauses = []
+    params = []
+    for i, column in enumerate(columns):
+        terms = [f"{c} = ?" for c in columns[:i]] + [f"{column} > ?"]
+        clauses.append('(' + ' AND '.join(terms) + ')')
+        params.extend(values[:i])
+        params.append(values[i])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def _keys_predicate_mssql(columns: List[str], keys: List[Tuple]) -> Tuple[str, list]:
+    """Match any of the given primary key tuples"""
+    if len(columns) == 1:
+        return f"{columns[0]} IN ({', '.join(['?'] * len(keys))})", [k[0] for k in keys]
+    match = '(' + ' AND '.join(f"{c} = ?" for c in columns) + ')'
+    return '(' + ' OR '.join([match] * len(keys)) + ')', [v for k in keys for v in k]
+
+
+def lsn_to_int(lsn: str) -> int:
+    """Convert a textual pg_lsn ('16/B374D848') to a comparable integer"""
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+class NativeChangeSource(ChangeDetector):
+    """
+    Base class for log-based change sources
+
+    Drop-in replacement for the polling ChangeDetector: same batches of
+    ChangeRecords, same watermark/position contract. Cost is proportional
+    to the number of changes instead of the table size, hard deletes are
+    captured, and customer tables need no updated_at/is_deleted columns.
+
+    When there is no usable log position (first run, a watermark left by
+    the polling detector, or a log that was truncated past the watermark)
+    the table is read once as a full snapshot.
+    """
+
+    def _log_since(self, table_name: str, since: Any) -> Any:
+        """Log position to read from, or None if a snapshot is needed"""
+        raise NotImplementedError
+
+    def detect_change_batches(
+        self,
+        table_name: str,
+        since: Any,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple] = None,
+        until: Any = None
+    ) -> Iterator[List[ChangeRecord]]:
+        if resume_from and resume_from[0] == SNAPSHOT:
+            yield from self._snapshot_batches(table_name, primary_keys, resume_from[1:])
+            return
+
+        log_since = self._log_since(table_name, since)
+        if log_since is None:
+            logger.info(f"No change log position for {table_name}, reading a full snapshot")
+            yield from self._snapshot_batches(table_name, primary_keys)
+            return
+
+        yield from self._log_batches(table_name, log_since, primary_keys, resume_from, until)
+
+    def fetch_changes_for_keys(
+        self,
+        table_name: str,
+        since: Any,
+        primary_keys: List[str],
+        keys: List[Dict[str, Any]],
+        until: Any = None
+    ) -> List[ChangeRecord]:
+        if not keys:
+            return []
+
+        key_tuples = [tuple(k[pk] for pk in primary_keys) for k in keys]
+        log_since = self._log_since(table_name, since)
+        if log_since is None:
+            # Without a log position every existing row counts as changed
+            return list(self._fetch_records(table_name, primary_keys, key_tuples).values())
+
+        return self._log_changes_for_keys(table_name, log_since, primary_keys, key_tuples, until)
+
+    def _log_batches(
+        self,
+        table_name: str,
+        log_since: Any,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple],
+        until: Any
+    ) -> Iterator[List[ChangeRecord]]:
+        raise NotImplementedError
+
+    def _log_changes_for_keys(
+        self,
+        table_name: str,
+        log_since: Any,
+        primary_keys: List[str],
+        keys: List[Tuple],
+        until: Any
+    ) -> List[ChangeRecord]:
+        raise NotImplementedError
+
+    def _snapshot_batches(
+        self,
+        table_name: str,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple] = None
+    ) -> Iterator[List[ChangeRecord]]:
+        """Stream the whole table in primary key order"""
+        conn = self.get_connection()
+        try:
+            if self.database_type == 'mssql':
+                cursor = conn.cursor()
+                if resume_from:
+                    predicate, params = _keyset_predicate_mssql(primary_keys, resume_from)
+                    where = f"WHERE {predicate}"
+                else:
+                    where, params = "", []
+                cursor.execute(
+                    f"SELECT * FROM {table_name} {where} ORDER BY {', '.join(primary_keys)}",
+                    *params
+                )
+            else:
+                cursor = conn.cursor(name=f"snapshot_{uuid.uuid4().hex}")
+                cursor.itersize = self.batch_size
+                if resume_from:
+                    placeholders = ', '.join(['%s'] * len(primary_keys))
+                    where = f"WHERE ({', '.join(primary_keys)}) > ({placeholders})"
+                    params = list(resume_from)
+                else:
+                    where, params = "", []
+                cursor.execute(
+                    f"SELECT * FROM {table_name} {where} ORDER BY {', '.join(primary_keys)}",
+                    params
+                )
+
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                columns = [column[0] for column in cursor.description]
+                batch = self._to_change_records(table_name, columns, rows, primary_keys, primary_keys)
+                for change in batch:
+                    change.position = (SNAPSHOT,) + change.position
+                yield batch
+            cursor.close()
+        finally:
+            conn.close()
+
+    def _fetch_records(
+        self,
+        table_name: str,
+        primary_keys: List[str],
+        keys: List[Tuple]
+    ) -> Dict[str, ChangeRecord]:
+        """Read the current rows for a list of primary key tuples, by key string"""
+        changes = {}
+        chunk_size = max(1, self.MAX_QUERY_PARAMS // max(1, len(primary_keys)))
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                if self.database_type == 'mssql':
+                    predicate, params = _keys_predicate_mssql(primary_keys, chunk)
+                    cursor.execute(f"SELECT * FROM {table_name} WHERE {predicate}", *params)
+                else:
+                    cursor.execute(
+                        f"SELECT * FROM {table_name} WHERE ({', '.join(primary_keys)}) IN %s",
+                        (tuple(chunk),)
+                    )
+                columns = [column[0] for column in cursor.description]
+                for change in self._to_change_records(table_name, columns, cursor.fetchall(), primary_keys, []):
+                    changes[_key_string(change.primary_key[pk] for pk in primary_keys)] = change
+        finally:
+            conn.close()
+
+        return changes
+
+    def _deleted_record(
+        self,
+        table_name: str,
+        primary_key: Dict[str, Any],
+        position: Tuple = ()
+    ) -> ChangeRecord:
+        """
+        ChangeRecord for a hard delete; appliers delete rows without data by key
+
+        The log does not say when the row was deleted, so the timestamp is
+        None and latest_wins refuses to guess instead of letting it win.
+        """
+        return ChangeRecord(
+            table_name=table_name,
+            operation='DELETE',
+            primary_key=primary_key,
+            data=None,
+            timestamp=None,
+            source=self.source,
+            hash=DELETED_HASH,
+            position=position
+        )
+
+
+class MSSQLChangeTrackingSource(NativeChangeSource):
+    """
+    SQL Server Change Tracking (CHANGETABLE)
+
+    Requires change tracking on the database and on each synced table:
+        ALTER DATABASE db SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 7 DAYS, AUTO_CLEANUP = ON)
+        ALTER TABLE t ENABLE CHANGE_TRACKING
+
+    Watermarks are {'ct_version': int}; positions are (version, *pk).
+    """
+
+    OPERATIONS = {'I': 'INSERT', 'U': 'UPDATE'}
+
+    def __init__(self, connection_string: str, source: str = 'local', batch_size: int = DEFAULT_BATCH_SIZE):
+        super().__init__(connection_string, 'mssql', source, batch_size)
+
+    def get_high_watermark(self, table_name: str) -> Dict[str, int]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sys.change_tracking_tables WHERE object_id = OBJECT_ID(?)", table_name)
+            if cursor.fetchone() is None:
+                raise ValueError(f"Change tracking is not enabled on table {table_name}")
+            cursor.execute("SELECT CHANGE_TRACKING_CURRENT_VERSION()")
+            return {'ct_version': cursor.fetchone()[0]}
+        finally:
+            conn.close()
+
+    def _log_since(self, table_name: str, since: Any) -> Optional[int]:
+        if not isinstance(since, dict) or 'ct_version' not in since:
+            return None
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID(?))", table_name)
+            min_valid = cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+        if min_valid is None or since['ct_version'] < min_valid:
+            # Retention cleanup removed changes we have not synced yet
+            logger.warning(f"Change tracking for {table_name} expired past version {since['ct_version']}")
+            return None
+        return since['ct_version']
+
+    def _changes_query(self, table_name: str, primary_keys: List[str]) -> str:
+        join = ' AND '.join(f"t.{pk} = ct.{pk}" for pk in primary_keys)
+        return f"""
+        SELECT ct.SYS_CHANGE_VERSION, ct.SYS_CHANGE_OPERATION, {', '.join(f'ct.{pk}' for pk in primary_keys)}, t.*
+        FROM CHANGETABLE(CHANGES {table_name}, ?) AS ct
+        LEFT JOIN {table_name} AS t ON {join}
+        """
+
+    def _log_batches(
+        self,
+        table_name: str,
+        log_since: int,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple],
+        until: Optional[Dict[str, int]]
+    ) -> Iterator[List[ChangeRecord]]:
+        # CHANGETABLE returns the latest change per key, so (version, pk) is a complete keyset
+        order_columns = ['ct.SYS_CHANGE_VERSION'] + [f"ct.{pk}" for pk in primary_keys]
+        where = []
+        params = [log_since]
+        if until is not None:
+            where.append("ct.SYS_CHANGE_VERSION <= ?")
+            params.append(until['ct_version'])
+        if resume_from:
+            predicate, keyset_params = _keyset_predicate_mssql(order_columns, resume_from)
+            where.append(predicate)
+            params.extend(keyset_params)
+
+        query = self._changes_query(table_name, primary_keys)
+        if where:
+            query += f"WHERE {' AND '.join(where)}\n"
+        query += f"ORDER BY {', '.join(order_columns)}"
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, *params)
+            columns = [column[0] for column in cursor.description]
+
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield self._to_tracked_records(table_name, columns, rows, primary_keys)
+        finally:
+            conn.close()
+
+    def _log_changes_for_keys(
+        self,
+        table_name: str,
+        log_since: int,
+        primary_keys: List[str],
+        keys: List[Tuple],
+        until: Optional[Dict[str, int]]
+    ) -> List[ChangeRecord]:
+        changes = []
+        chunk_size = max(1, self.MAX_QUERY_PARAMS // max(1, len(primary_keys)))
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            for i in range(0, len(keys), chunk_size):
+                predicate, key_params = _keys_predicate_mssql(
+                    [f"ct.{pk}" for pk in primary_keys], keys[i:i + chunk_size]
+                )
+                where = [predicate]
+                params = [log_since] + key_params
+                if until is not None:
+                    where.append("ct.SYS_CHANGE_VERSION <= ?")
+                    params.append(until['ct_version'])
+
+                cursor.execute(
+                    self._changes_query(table_name, primary_keys) + f"WHERE {' AND '.join(where)}",
+                    *params
+                )
+                columns = [column[0] for column in cursor.description]
+                changes.extend(self._to_tracked_records(table_name, columns, cursor.fetchall(), primary_keys))
+        finally:
+            conn.close()
+
+        return changes
+
+    def _to_tracked_records(
+        self,
+        table_name: str,
+        columns: List[str],
+        rows: List[Any],
+        primary_keys: List[str]
+    ) -> List[ChangeRecord]:
+        """Convert CHANGETABLE rows (version, operation, ct keys, t.*) into ChangeRecords"""
+        width = 2 + len(primary_keys)
+        table_columns = columns[width:]
+        present = width + table_columns.index(primary_keys[0])
+
+        live = [
+            i for i, row in enumerate(rows)
+            if row[1] != 'D' and row[present] is not None
+        ]
+        live_records = dict(zip(live, self._to_change_records(
+            table_name, table_columns, [rows[i][width:] for i in live], primary_keys, []
+        )))
+
+        changes = []
+        for i, row in enumerate(rows):
+            version, operation, key = row[0], row[1], tuple(row[2:width])
+            position = (version,) + key
+            if operation == 'D':
+                changes.append(self._deleted_record(table_name, dict(zip(primary_keys, key)), position))
+            elif i in live_records:
+                change = live_records[i]
+                if change.operation != 'DELETE':
+                    change.operation = self.OPERATIONS[operation]
+                change.position = position
+                changes.append(change)
+            # else: deleted after the window closed; the delete arrives with the next run
+
+        return changes
+
+
+class PostgresLogicalReplicationSource(NativeChangeSource):
+    """
+    PostgreSQL logical decoding through a wal2json replication slot
+
+    Requires wal_level = logical, the wal2json output plugin and a role
+    with the REPLICATION attribute; the slot is created on first use.
+    Decoded changes only identify rows (action + key). Row data is read
+    from the table, so values and hashes match the polling detector.
+
+    Watermarks are {'lsn': '16/B374D848'}; positions are (commit_lsn,).
+    Changes are peeked, not consumed: call advance_slot() once every
+    table has synced past a position so the server can recycle WAL.
+
+    All table tasks of a remote share the one slot, and only one backend
+    can use a logical slot at a time. Every slot access therefore holds
+    a session advisory lock on the remote, so tasks take turns.
+    """
+
+    DEFAULT_SLOT_NAME = 'berqenas_sync'
+    PLUGIN = 'wal2json'
+
+    def __init__(
+        self,
+        connection_string: str,
+        source: str = 'local',
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        slot_name: str = DEFAULT_SLOT_NAME
+    ):
+        super().__init__(connection_string, 'postgresql', source, batch_size)
+        self.slot_name = slot_name
+        # (table, since, until) -> {key string: (action, key, commit LSN...)}, see _window_index
+        self._window_indexes = {}
+
+    def _lock_slot(self, cursor):
+        """Wait for exclusive use of the slot; released when the connection closes"""
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (f"berqenas_sync_slot:{self.slot_name}",))
+
+    def get_high_watermark(self, table_name: str) -> Dict[str, str]:
+        conn = self.get_connection()
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            self._lock_slot(cursor)
+            cursor.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (self.slot_name,))
+            if cursor.fetchone() is None:
+                try:
+                    cursor.execute(
+                        "SELECT pg_create_logical_replication_slot(%s, %s)",
+                        (self.slot_name, self.PLUGIN)
+                    )
+                    logger.info(f"Created logical replication slot {self.slot_name}")
+                except pg_errors.DuplicateObject:
+                    pass  # Created by a process that does not take the lock
+            cursor.execute("SELECT pg_current_wal_lsn()::text")
+            return {'lsn': cursor.fetchone()[0]}
+        finally:
+            conn.close()
+
+    def advance_slot(self, lsn: str):
+        """Confirm everything up to `lsn` as synced, letting the server recycle that WAL"""
+        conn = self.get_connection()
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            self._lock_slot(cursor)
+            cursor.execute(
+                """
+                SELECT pg_replication_slot_advance(slot_name, %s::pg_lsn)
+                FROM pg_replication_slots
+                WHERE slot_name = %s AND confirmed_flush_lsn < %s::pg_lsn
+                """,
+                (lsn, self.slot_name, lsn)
+            )
+        finally:
+            conn.close()
+
+    def retained_wal_bytes(self) -> Optional[int]:
+        """WAL the server keeps for the slot: current LSN minus what was confirmed as synced"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), confirmed_flush_lsn)::bigint
+                FROM pg_replication_slots
+                WHERE slot_name = %s
+                """,
+                (self.slot_name,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row is not None else None
+        finally:
+            conn.close()
+
+    def _log_since(self, table_name: str, since: Any) -> Optional[int]:
+        if not isinstance(since, dict) or 'lsn' not in since:
+            return None
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT confirmed_flush_lsn::text FROM pg_replication_slots WHERE slot_name = %s",
+                (self.slot_name,)
+            )
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+
+        if row is None or lsn_to_int(row[0]) > lsn_to_int(since['lsn']):
+            # The slot was recreated or advanced past our watermark
+            logger.warning(f"Replication slot {self.slot_name} no longer covers {table_name} from {since['lsn']}")
+            return None
+        return lsn_to_int(since['lsn'])
+
+    def _decoded_transactions(
+        self,
+        table_name: str,
+        log_since: int,
+        primary_keys: List[str],
+        until: Optional[Dict[str, str]]
+    ) -> Iterator[Tuple[int, str, List[Tuple[str, Tuple]]]]:
+        """
+        Yield (commit_lsn, commit_lsn_text, [(action, key), ...]) per transaction
+
+        Transactions are windowed by commit LSN: a change's own LSN can be
+        older than the previous watermark if its transaction committed later.
+        """
+        add_tables = table_name if '.' in table_name else f"*.{table_name}"
+        query = """
+        SELECT lsn::text, data
+        FROM pg_logical_slot_peek_changes(
+            %s, %s::pg_lsn, NULL,
+            'format-version', '2', 'include-transaction', 'true', 'add-tables', %s
+        )
+        """
+
+        conn = self.get_connection()
+        try:
+            self._lock_slot(conn.cursor())
+            with conn.cursor(name=f"decode_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = self.batch_size
+                cursor.execute(query, (self.slot_name, until['lsn'] if until else None, add_tables))
+
+                changes = []
+                for lsn, data in cursor:
+                    message = json.loads(data, parse_float=Decimal)
+                    action = message.get('action')
+                    if action == 'B':
+                        changes = []
+                    elif action == 'C':
+                        commit_lsn = lsn_to_int(lsn)
+                        if changes and commit_lsn > log_since:
+                            yield commit_lsn, lsn, changes
+                        changes = []
+                    elif action in ('I', 'U', 'D'):
+                        # Deletes only carry the replica identity (the primary key)
+                        values = message['identity'] if action == 'D' else message['columns']
+                        values = {c['name']: c['value'] for c in values}
+                        changes.append((action, tuple(values[pk] for pk in primary_keys)))
+        finally:
+            conn.close()
+
+    def _log_batches(
+        self,
+        table_name: str,
+        log_since: int,
+        primary_keys: List[str],
+        resume_from: Optional[Tuple],
+        until: Optional[Dict[str, str]]
+    ) -> Iterator[List[ChangeRecord]]:
+        start = lsn_to_int(resume_from[0]) if resume_from else log_since
+        # Each key is emitted once, at the commit of its latest change; batches
+        # end on commit boundaries so the resume position is exact, and a
+        # single transaction larger than batch_size becomes one batch
+        index = self._window_index(table_name, log_since, primary_keys, until)
+        entries = [entry for entry in index.items() if entry[1][2] > start]
+        pending = {}
+        for i, (key_string, (action, key, commit_lsn, commit_lsn_text)) in enumerate(entries):
+            pending[key_string] = (action, key)
+            at_commit_end = i + 1 == len(entries) or entries[i + 1][1][2] != commit_lsn
+            if at_commit_end and len(pending) >= self.batch_size:
+                yield self._to_decoded_records(table_name, primary_keys, pending, (commit_lsn_text,))
+                pending = {}
+
+        if pending:
+            yield self._to_decoded_records(table_name, primary_keys, pending, (entries[-1][1][3],))
+
+    def _log_changes_for_keys(
+        self,
+        table_name: str,
+        log_since: int,
+        primary_keys: List[str],
+        keys: List[Tuple],
+        until: Optional[Dict[str, str]]
+    ) -> List[ChangeRecord]:
+        index = self._window_index(table_name, log_since, primary_keys, until)
+        matched = {}
+        for key in keys:
+            entry = index.get(_key_string(key))
+            if entry is not None:
+                # Look rows up with the caller's driver-typed key values
+                matched[_key_string(key)] = (entry[0], key)
+        return self._to_decoded_records(table_name, primary_keys, matched, ())
+
+    def _window_index(
+        self,
+        table_name: str,
+        log_since: int,
+        primary_keys: List[str],
+        until: Optional[Dict[str, str]]
+    ) -> Dict[str, Tuple[str, Tuple, int, str]]:
+        """
+        Latest (action, key, commit_lsn, commit_lsn_text) per changed key in the sync window
+
+        Decoding is a scan of the slot's WAL, so it is done once per window
+        and shared by the key lookups of the cloud pass and the change
+        batches of the local pass. Holds only keys, not row data.
+        """
+        cache_key = (table_name, log_since, until['lsn'] if until else None)
+        if cache_key not in self._window_indexes:
+            index = {}
+            for commit_lsn, commit_lsn_text, changes in self._decoded_transactions(
+                table_name, log_since, primary_keys, until
+            ):
+                for action, key in changes:
+                    key_string = _key_string(key)
+                    # Re-insert so the dict stays in order of each key's latest commit
+                    index.pop(key_string, None)
+                    index[key_string] = (action, key, commit_lsn, commit_lsn_text)
+            self._window_indexes = {cache_key: index}
+        return self._window_indexes[cache_key]
+
+    def _to_decoded_records(
+        self,
+        table_name: str,
+        primary_keys: List[str],
+        pending: Dict[str, Tuple[str, Tuple]],
+        position: Tuple
+    ) -> List[ChangeRecord]:
+        """Read the current rows for decoded keys and build ChangeRecords in log order"""
+        live_keys = [key for action, key in pending.values() if action != 'D']
+        live = self._fetch_records(table_name, primary_keys, live_keys) if live_keys else {}
+
+        changes = []
+        for key_string, (action, key) in pending.items():
+            if action == 'D':
+                changes.append(self._deleted_record(table_name, dict(zip(primary_keys, key)), position))
+            elif key_string in live:
+                change = live[key_string]
+                if change.operation != 'DELETE':
+                    change.operation = 'INSERT' if action == 'I' else 'UPDATE'
+                change.position = position
+                changes.append(change)
+            # else: deleted after the window closed; the delete arrives with the next run
+
+        return changes
+
+
+def get_change_source(
+    connection_string: str,
+    database_type: str,
+    source: str = 'local',
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    mode: str = 'polling',
+    slot_name: Optional[str] = None
+) -> ChangeDetector:
+    """Get the change detector for a database type and change source mode"""
+    if mode not in CHANGE_SOURCES:
+        raise ValueError(f"Invalid change source. Choose from: {list(CHANGE_SOURCES)}")
+
+    if mode == 'polling':
+        return ChangeDetector(connection_string, database_type, source, batch_size)
+    if database_type == 'mssql':
+        return MSSQLChangeTrackingSource(connection_string, source, batch_size)
+    elif database_type == 'postgresql':
+        return PostgresLogicalReplicationSource(
+            connection_string, source, batch_size,
+            slot_name or PostgresLogicalReplicationSource.DEFAULT_SLOT_NAME
+        )
+    else:
+        raise ValueError(f"Unsupported database type: {database_type}")
@@ -0,0 +1,134 @@
+"""
+Codegen Jobs
+Records progress and timings of API generation runs for /autogen/status
+"""
+
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import logging
+import time
+from sqlalchemy.orm import Session
+
+from models.codegen import CodegenJob, CodegenJobTable
+
+logger = logging.getLogger(__name__)
+
+# Progress is committed at most this often, not once per table
+COMMIT_INTERVAL_SECONDS = 1.0
+
+
+def create_job(db: Session, database: str, database_key: str, output_dir: str) -> CodegenJob:
+    job = CodegenJob(database=database, database_key=database_key, output_dir=output_dir)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def latest_job(db: Session, database: str) -> Optional[CodegenJob]:
+    return (
+        db.query(CodegenJob)
+        .filter(CodegenJob.database == database)
+        .order_by(CodegenJob.id.desc())
+        .first()
+    )
+
+
+class JobProgress:
+    """
+    Progress callbacks of generate_api_for_database, written to a CodegenJob
+
+    Called from the generating thread only; per-table results are
+    committed in batches.
+    """
+
+    def __init__(self, db: Session, job_id: int):
+        self.db = db
+        self.job = db.get(CodegenJob, job_id)
+        self._last_commit = time.monotonic()
+
+    def introspecting(self):
+        self.job.status = "introspecting"
+        self.job.started_at = datetime.utcnow()
+        self.db.commit()
+
+    def generating(self, table_count: int, introspection_seconds: float):
+        self.job.status = "generating"
+        self.job.total_tables = table_count
+        self.job.introspection_seconds = introspection_seconds
+        self.db.commit()
+
+    def table_done(
+        self,
+        table_name: str,
+        status: str,
+        files_written: int = 0,
+        files_unchanged: int = 0,
+        seconds: Optional[float] = None,
+        error: Optional[str] = None
+    ):
+        self.db.add(CodegenJobTable(
+            job_id=self.job.id,
+            table_name=table_name,
+            status=status,
+            files_written=files_written,
+            seconds=seconds,
+            error_message=error
+        ))
+        self.job.completed_tables += 1
+        self.job.files_written += files_written
+        self.job.files_unchanged += files_unchanged
+        if status == "failed":
+            self.job.failed_tables += 1
+
+        now = time.monotonic()
+        if now - self._last_commit >= COMMIT_INTERVAL_SECONDS:
+            self.db.commit()
+            self._last_commit = now
+
+    def finish(self, error: Optional[str] = None):
+        if error is None and self.job.failed_tables:
+            error = f"{self.job.failed_tables} tables failed to generate"
+        self.job.status = "failed" if error else "completed"
+        self.job.error_message = error
+        self.job.completed_at = datetime.utcnow()
+        self.db.commit()
+
+
+def job_status(job: CodegenJob, include_tables: bool = False) -> Dict[str, Any]:
+    """Status document of a job, with per-table results if asked for"""
+    end = job.completed_at or datetime.utcnow()
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else None
+    result: Dict[str, Any] = {
+        "job_id": job.id,
+        "database": job.database,
+        "output_dir": job.output_dir,
+        "status": job.status,
+        "total_tables": job.total_tables,
+        "completed_tables": job.completed_tables,
+        "failed_tables": job.failed_tables,
+        "files_written": job.files_written,
+        "files_unchanged": job.files_unchanged,
+        "progress": (
+            round(job.completed_tables / job.total_tables, 4) if job.total_tables else None
+        ),
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at,
+        "introspection_seconds": job.introspection_seconds,
+        "elapsed_seconds": elapsed,
+        "error": job.error_message,
+    }
+    if include_tables:
+        tables: List[CodegenJobTable] = sorted(job.tables, key=lambda t: t.table_name)
+        result["tables"] = [
+            {
+                "name": table.table_name,
+                "status": table.status,
+                "files_written": table.files_written,
+                "seconds": table.seconds,
+                "error": table.error_message
+            }
+            for table in tables
+        ]
+    return result
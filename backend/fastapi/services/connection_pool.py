@@ -0,0 +1,256 @@
+"""
+Connection Pool
+Per-database pools of blocking DB-API connections and the bounded thread pool their calls run in
+
+Standard library only: generate_api_for_database copies this module next
+to the generated routers.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Used when a tenant has no max_connections of its own
+DEFAULT_MAX_CONNECTIONS = 20
+ACQUIRE_TIMEOUT_SECONDS = 30.0
+# Idle connections are pinged before reuse after this long, closed after MAX_IDLE_SECONDS
+HEALTH_CHECK_AFTER_SECONDS = 30.0
+MAX_IDLE_SECONDS = 300.0
+HEALTH_CHECK_SQL = "SELECT 1"
+
+# Threads running blocking driver calls, shared by all pools
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="db")
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the acquire timeout"""
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """Run a blocking call in the database thread pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections to one database
+
+    At most max_size connections are open or in use at once. Connections
+    are reused newest first; one that sat idle longer than
+    health_check_after is pinged before it is handed out, and a
+    connection that fails the ping or errors on release is replaced.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = DEFAULT_MAX_CONNECTIONS,
+        acquire_timeout: float = ACQUIRE_TIMEOUT_SECONDS,
+        health_check_after: float = HEALTH_CHECK_AFTER_SECONDS,
+        max_idle: float = MAX_IDLE_SECONDS,
+        health_check_sql: str = HEALTH_CHECK_SQL
+    ):
+        self.connect = connect
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self.health_check_sql = health_check_sql
+
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[Tuple[Any, float]] = []  # (connection, released at), newest last
+        self._lock = threading.Lock()
+        self.closed = False
+        # What connect() connects to, as given to get_pool
+        self.target: Optional[str] = None
+
+    def _healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.health_check_sql)
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self.connect()
+
+            conn, released_at = item
+            idle = time.monotonic() - released_at
+            if idle > self.max_idle or (idle > self.health_check_after and not self._healthy(conn)):
+                self._close(conn)
+                continue
+            return conn
+
+    def _release(self, conn):
+        # End whatever transaction the caller left open; a connection that
+        # cannot even roll back is broken
+        try:
+            conn.rollback()
+        except Exception:
+            self._close(conn)
+            return
+
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            if self.closed:
+                expired.append(conn)
+            else:
+                self._idle.append((conn, now))
+            while self._idle and now - self._idle[0][1] > self.max_idle:
+                expired.append(self._idle.pop(0)[0])
+        for stale in expired:
+            self._close(stale)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the block"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeout(f"No free connection within {self.acquire_timeout:.0f}s (max {self.max_size})")
+        try:
+            conn = self._checkout()
+            try:
+                yield conn
+            finally:
+                self._release(conn)
+        finally:
+            self._slots.release()
+
+    def _run(self, fn: Callable, args: tuple):
+        with self.connection() as conn:
+            return fn(conn, *args)
+
+    @asynccontextmanager
+    async def _reserved(self):
+        # Waiting for a free connection happens on the event loop, so a busy
+        # pool does not tie up threads that other databases need
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_size)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No free connection within {self.acquire_timeout:.0f}s (max {self.max_size})")
+        try:
+            yield
+        finally:
+            self._async_slots.release()
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(connection, *args) in the database thread pool"""
+        async with self._reserved():
+            return await run_blocking(self._run, fn, args)
+
+    async def stream(self, fn: Callable, *args):
+        """
+        Async iterator over the generator fn(connection, *args)
+
+        The connection is held until the iterator is exhausted or closed
+        (e.g. the client went away); every item is produced in the
+        database thread pool.
+        """
+        async with self._reserved():
+            checkout = self.connection()
+            conn = await run_blocking(checkout.__enter__)
+            items = None
+            try:
+                items = fn(conn, *args)
+                while True:
+                    item = await run_blocking(next, items, _END)
+                    if item is _END:
+                        break
+                    yield item
+            finally:
+                await run_blocking(_finish_stream, items, checkout)
+
+    def close(self):
+        """Close idle connections; connections in use are closed when released"""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            idle = len(self._idle)
+        return {"max_size": self.max_size, "idle": idle}
+
+
+_END = object()
+
+
+def _finish_stream(items, checkout):
+    try:
+        if items is not None:
+            items.close()
+    finally:
+        checkout.__exit__(None, None, None)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    key: str,
+    connect: Callable[[], Any],
+    max_size: int = DEFAULT_MAX_CONNECTIONS,
+    target: Optional[str] = None
+) -> ConnectionPool:
+    """
+    Pool registered under key; replaced if max_size or target changed
+
+    target identifies what connect() connects to (e.g. a digest of the
+    connection string), so re-registering a key for another server,
+    database or login does not keep handing out the old connections.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.max_size == max(1, max_size) and pool.target == target:
+            return pool
+        if pool is not None:
+            pool.close()
+        pool = _pools[key] = ConnectionPool(connect, max_size)
+        pool.target = target
+    logger.info(f"Connection pool '{key}': max {pool.max_size} connections")
+    return pool
+
+
+def close_pool(key: str):
+    with _pools_lock:
+        pool = _pools.pop(key, None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,297 @@
+"""
+CRUD Query
+Projection, typed filters, sorting and counts for the dynamic CRUD engine, compiled to parameterized SQL
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Column types by how filter values are parsed (MSSQL and PostgreSQL names)
+INTEGER_TYPES = {'int', 'integer', 'bigint', 'smallint', 'tinyint'}
+DECIMAL_TYPES = {'decimal', 'numeric', 'money', 'smallmoney'}
+FLOAT_TYPES = {'float', 'real', 'double precision'}
+BOOLEAN_TYPES = {'bit', 'boolean'}
+DATE_TYPES = {'date'}
+DATETIME_TYPES = {
+    'datetime', 'datetime2', 'smalldatetime', 'datetimeoffset',
+    'timestamp without time zone', 'timestamp with time zone'
+}
+TIME_TYPES = {'time', 'time without time zone', 'time with time zone'}
+UUID_TYPES = {'uniqueidentifier', 'uuid'}
+TEXT_TYPES = {
+    'char', 'varchar', 'nchar', 'nvarchar', 'text', 'ntext',
+    'character', 'character varying', 'citext', 'name'
+}
+
+COMPARISONS = {'eq': '=', 'ne': '<>', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>='}
+FILTER_OPERATORS = set(COMPARISONS) | {'in', 'prefix'}
+# Operators an index on the column can serve
+SEEKABLE_OPERATORS = FILTER_OPERATORS - {'ne'}
+
+MAX_FILTERS = 16
+MAX_IN_VALUES = 100
+
+# Tables estimated at this many rows or more only accept filters and sorts
+# an index can serve; tables of unknown size count as large
+LARGE_TABLE_ROWS = int(os.getenv("CRUD_LARGE_TABLE_ROWS", "100000"))
+# 'reject' fails such queries with 400, 'warn' runs them and says so
+UNINDEXED_QUERIES = os.getenv("CRUD_UNINDEXED_QUERIES", "reject")
+
+
+class UnindexedQuery(ValueError):
+    """A filter or sort on a large table that no index can serve"""
+
+
+@dataclass
+class Filter:
+    """column:op:value from the query string; value is still text"""
+    column: str
+    op: str
+    value: str
+
+
+@dataclass
+class QuerySpec:
+    """What a client asked for beyond plain paging"""
+    fields: Optional[List[str]] = None
+    filters: List[Filter] = field(default_factory=list)
+    sort: List[Tuple[str, bool]] = field(default_factory=list)  # (column, descending)
+    count: bool = False
+
+    @classmethod
+    def parse(
+        cls,
+        fields: Optional[str] = None,
+        filters: Optional[List[str]] = None,
+        sort: Optional[str] = None,
+        count: bool = False
+    ) -> 'QuerySpec':
+        """
+        From query parameters:
+        fields=a,b  filter=col:op:value (repeatable)  sort=-created_at,id  count=true
+        """
+        spec = cls(count=count)
+        if fields:
+            spec.fields = [name.strip() for name in fields.split(',') if name.strip()]
+        for text in filters or []:
+            parts = text.split(':', 2)
+            if len(parts) != 3 or not parts[0]:
+                raise ValueError(f"Filter must be column:operator:value, got '{text}'")
+            spec.filters.append(Filter(parts[0], parts[1].lower(), parts[2]))
+        if len(spec.filters) > MAX_FILTERS:
+            raise ValueError(f"At most {MAX_FILTERS} filters per query")
+        if sort:
+            for name in sort.split(','):
+                name = name.strip()
+                if name:
+                    spec.sort.append((name.lstrip('-'), name.startswith('-')))
+        return spec
+
+    def __bool__(self) -> bool:
+        return bool(self.fields or self.filters or self.sort or self.count)
+
+
+def coerce_value(column, text: str) -> Any:
+    """Filter value as the Python type of the column, so it binds with the right SQL type"""
+    data_type = column.data_type.lower()
+    try:
+        if data_type in INTEGER_TYPES:
+            return int(text)
+        if data_type in DECIMAL_TYPES:
+            return Decimal(text)
+        if data_type in FLOAT_TYPES:
+            return float(text)
+        if data_type in BOOLEAN_TYPES:
+            lowered = text.lower()
+            if lowered not in ('true', 'false', '1', '0'):
+                raise ValueError(text)
+            return lowered in ('true', '1')
+        if data_type in DATE_TYPES:
+            return date.fromisoformat(text)
+        if data_type in DATETIME_TYPES:
+            return datetime.fromisoformat(text.replace('Z', '+00:00'))
+        if data_type in TIME_TYPES:
+            return time.fromisoformat(text)
+        if data_type in UUID_TYPES:
+            return str(uuid.UUID(text))
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"Invalid value for {column.name} ({column.data_type}): '{text}'")
+    return text
+
+
+def escape_like(text: str) -> str:
+    """Literal text for LIKE ... ESCAPE '\\' ([ is special on SQL Server)"""
+    for special in ('\\', '%', '_', '['):
+        text = text.replace(special, '\\' + special)
+    return text
+
+
+def keyset_predicate(keys: List[str], placeholder: str, op: str = '>') -> str:
+    """(k1, k2, ...) > (?, ?, ...) spelled out, which both databases can seek on"""
+    terms = []
+    for i, key in enumerate(keys):
+        equal = [f"{k} = {placeholder}" for k in keys[:i]]
+        terms.append('(' + ' AND '.join(equal + [f"{key} {op} {placeholder}"]) + ')')
+    return '(' + ' OR '.join(terms) + ')'
+
+
+def keyset_params(key: List[Any]) -> List[Any]:
+    params = []
+    for i in range(len(key)):
+        params.extend(key[:i + 1])
+    return params
+
+
+class CompiledQuery:
+    """
+    A QuerySpec compiled against one table (a dynamic_crud.CompiledTable)
+
+    Column names are checked against the table and quoted; every value is
+    a parameter. Rows are ordered by the requested sort followed by the
+    key columns, so the order is total. Keyset paging is used when all
+    order columns share one direction and are not nullable; otherwise
+    pages are offset based.
+    """
+
+    def __init__(
+        self,
+        table,
+        spec: QuerySpec,
+        unindexed: str = UNINDEXED_QUERIES,
+        large_table_rows: int = LARGE_TABLE_ROWS
+    ):
+        self.table = table
+        self.spec = spec
+        dialect = table.dialect
+        q = dialect.quote
+        p = dialect.placeholder
+
+        self.fields = None
+        if spec.fields:
+            self.fields = list(dict.fromkeys(spec.fields))
+            self._check_columns(self.fields)
+
+        conditions = []
+        self.where_params: List[Any] = []
+        for f in spec.filters:
+            self._check_columns([f.column])
+            column = table.columns[f.column]
+            if f.op not in FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator '{f.op}' (use {', '.join(sorted(FILTER_OPERATORS))})")
+            if f.op == 'in':
+                values = [coerce_value(column, v) for v in f.value.split(',')]
+                if len(values) > MAX_IN_VALUES:
+                    raise ValueError(f"At most {MAX_IN_VALUES} values per 'in' filter")
+                conditions.append(f"{q(f.column)} IN ({', '.join(p for _ in values)})")
+                self.where_params.extend(values)
+            elif f.op == 'prefix':
+                if column.data_type.lower() not in TEXT_TYPES:
+                    raise ValueError(f"'prefix' needs a text column; {f.column} is {column.data_type}")
+                conditions.append(f"{q(f.column)} LIKE {p} ESCAPE '\\'")
+                self.where_params.append(escape_like(f.value) + '%')
+            else:
+                conditions.append(f"{q(f.column)} {COMPARISONS[f.op]} {p}")
+                self.where_params.append(coerce_value(column, f.value))
+        self.where_sql = ' AND '.join(conditions)
+
+        self._check_columns([name for name, _ in spec.sort])
+        descending = spec.sort[0][1] if spec.sort else False
+        order = list(dict(spec.sort).items())
+        tie_break = descending if all(d == descending for _, d in order) else False
+        order += [(k, tie_break) for k in table.key_columns if k not in dict(order)]
+        self.order = order
+        self.order_columns = [name for name, _ in order]
+        self.order_sql = ', '.join(f"{q(name)}{' DESC' if desc else ''}" for name, desc in order)
+        self.signature = ','.join(('-' if desc else '') + name for name, desc in order)
+
+        self.keyset = len({desc for _, desc in order}) == 1 and all(
+            not table.columns[name].is_nullable or name in table.key_columns for name in self.order_columns
+        )
+        after = keyset_predicate([q(name) for name in self.order_columns], p, '<' if descending else '>')
+        self.after_sql = after if self.keyset else None
+
+        # Order columns are fetched too when projected away, for the cursor
+        if self.fields:
+            self.hidden = [name for name in self.order_columns if name not in self.fields]
+            self.select_sql = ', '.join(q(name) for name in self.fields + self.hidden)
+            self.stream_select_sql = ', '.join(q(name) for name in self.fields)
+        else:
+            self.hidden = []
+            self.select_sql = self.stream_select_sql = '*'
+
+        self.warnings = self._check_indexes(unindexed, large_table_rows)
+
+    def _check_columns(self, names: List[str]):
+        unknown = [name for name in names if name not in self.table.columns]
+        if unknown:
+            raise ValueError(f"Unknown columns for {self.table.info.name}: {', '.join(sorted(unknown))}")
+
+    def _check_indexes(self, unindexed: str, large_table_rows: int) -> List[str]:
+        info = self.table.info
+        rows = getattr(info, 'row_estimate', None)
+        if rows is not None and rows < large_table_rows:
+            return []
+
+        # A filter or sort can use an index that starts with its column
+        leading = {index.columns[0] for index in getattr(info, 'indexes', []) if index.columns}
+        leading.add(self.table.key_columns[0])
+        seekable = any(f.op in SEEKABLE_OPERATORS and f.column in leading for f in self.spec.filters)
+
+        problems = []
+        if self.spec.filters and not seekable:
+            problems.append(f"no filter on an indexed column ({', '.join(sorted(leading))})")
+        if self.spec.sort and not seekable and self.spec.sort[0][0] not in leading:
+            problems.append(f"sort on unindexed column {self.spec.sort[0][0]}")
+        if not problems:
+            return []
+
+        size = f"~{rows} rows" if rows is not None else "unknown size"
+        message = f"Query would scan {info.name} ({size}): {'; '.join(problems)}"
+        if unindexed == 'reject':
+            raise UnindexedQuery(message)
+        logger.warning(message)
+        return [message]
+
+    def _where(self, *conditions: Optional[str]) -> str:
+        parts = [c for c in (self.where_sql,) + conditions if c]
+        return f"WHERE {' AND '.join(parts)} " if parts else ''
+
+    def page(self, after: Optional[List[Any]], limit: int) -> Tuple[str, List[Any]]:
+        """Keyset page: the first `limit` rows after the order values `after`"""
+        dialect = self.table.dialect
+        sql = (
+            f"SELECT {self.select_sql} FROM {self.table.qualified} "
+            f"{self._where(self.after_sql if after is not None else None)}"
+            f"{dialect.first_rows(self.order_sql)}"
+        )
+        params = self.where_params + (keyset_params(after) if after is not None else [])
+        return sql, params + [limit]
+
+    def offset_page(self, skip: int, limit: int) -> Tuple[str, List[Any]]:
+        sql = (
+            f"SELECT {self.select_sql} FROM {self.table.qualified} "
+            f"{self._where()}{self.table.dialect.page(self.order_sql)}"
+        )
+        return sql, self.where_params + [skip, limit]
+
+    def stream(self, after: Optional[List[Any]]) -> Tuple[str, List[Any]]:
+        sql = (
+            f"SELECT {self.stream_select_sql} FROM {self.table.qualified} "
+            f"{self._where(self.after_sql if after is not None else None)}ORDER BY {self.order_sql}"
+        )
+        return sql, self.where_params + (keyset_params(after) if after is not None else [])
+
+    def count(self) -> Tuple[str, List[Any]]:
+        return f"SELECT COUNT(*) FROM {self.table.qualified} {self._where()}".rstrip(), list(self.where_params)
+
+    def strip_hidden(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.hidden:
+            return rows
+        return [{name: row[name] for name in self.fields} for row in rows]
@@ -0,0 +1,705 @@
+"""
+Dynamic CRUD Engine
+Serves CRUD for introspected tables in-process from precompiled SQL, without generated source files
+"""
+
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from decimal import Decimal
+import base64
+import json
+import logging
+import threading
+import uuid
+
+from services.connection_pool import ConnectionPool, close_pool
+from services.crud_query import INTEGER_TYPES, QuerySpec, CompiledQuery, keyset_predicate, keyset_params
+from services.model_factory import TableModels, model_factory, table_fingerprint
+from services.bulk_write import (
+    SavepointSql, MSSQL_SAVEPOINTS, POSTGRES_SAVEPOINTS,
+    executemany_mssql, executemany_postgres, execute_bulk
+)
+from services.sync_state import dump_state, load_state
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 1000
+
+# INSERT/UPDATE statements are compiled per set of columns written; this
+# bounds how many column sets are kept per table
+MAX_STATEMENTS_PER_TABLE = 64
+
+# Separator of the key values in an item id of a composite-key table
+KEY_SEPARATOR = ','
+
+# Rows fetched from the cursor per NDJSON chunk
+STREAM_CHUNK_ROWS = 1000
+
+
+class SqlDialect:
+    """Quoting, placeholders and clauses that differ between databases"""
+
+    name = None
+    placeholder = None
+    savepoints: SavepointSql = None
+
+    def quote(self, identifier: str) -> str:
+        raise NotImplementedError
+
+    def page(self, order_by: str) -> str:
+        """ORDER BY ... with (offset, limit) parameters"""
+        raise NotImplementedError
+
+    def first_rows(self, order_by: str) -> str:
+        """ORDER BY ... with a (limit) parameter"""
+        raise NotImplementedError
+
+    def stream_cursor(self, conn):
+        """Cursor that fetches rows from the server as they are consumed"""
+        return conn.cursor()
+
+    def executemany(self, cursor, sql: str, rows: List[List[Any]]) -> Optional[int]:
+        """
+        Run one statement for many parameter rows in as few round trips as
+        the driver allows; returns the rows affected, or None if unknown
+        """
+        cursor.executemany(sql, rows)
+        return cursor.rowcount
+
+    def insert(self, table: str, columns: List[str], returning: bool = True) -> str:
+        raise NotImplementedError
+
+    def update(self, table: str, columns: List[str], where: str, returning: bool = True) -> str:
+        raise NotImplementedError
+
+
+class MSSQLDialect(SqlDialect):
+    name = 'mssql'
+    placeholder = '?'
+    savepoints = MSSQL_SAVEPOINTS
+
+    def quote(self, identifier: str) -> str:
+        return '[' + identifier.replace(']', ']]') + ']'
+
+    def page(self, order_by: str) -> str:
+        return f"ORDER BY {order_by} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+    def first_rows(self, order_by: str) -> str:
+        return f"ORDER BY {order_by} OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+
+    def executemany(self, cursor, sql: str, rows: List[List[Any]]) -> Optional[int]:
+        return executemany_mssql(cursor, sql, rows)
+
+    def insert(self, table: str, columns: List[str], returning: bool = True) -> str:
+        output = " OUTPUT INSERTED.*" if returning else ""
+        if not columns:
+            return f"INSERT INTO {table}{output} DEFAULT VALUES"
+        placeholders = ', '.join('?' for _ in columns)
+        return f"INSERT INTO {table} ({', '.join(columns)}){output} VALUES ({placeholders})"
+
+    def update(self, table: str, columns: List[str], where: str, returning: bool = True) -> str:
+        assignments = ', '.join(f"{c} = ?" for c in columns)
+        output = " OUTPUT INSERTED.*" if returning else ""
+        return f"UPDATE {table} SET {assignments}{output} WHERE {where}"
+
+
+class PostgreSQLDialect(SqlDialect):
+    name = 'postgresql'
+    placeholder = '%s'
+    savepoints = POSTGRES_SAVEPOINTS
+
+    def quote(self, identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def page(self, order_by: str) -> str:
+        return f"ORDER BY {order_by} OFFSET %s LIMIT %s"
+
+    def first_rows(self, order_by: str) -> str:
+        return f"ORDER BY {order_by} LIMIT %s"
+
+    def stream_cursor(self, conn):
+        # psycopg2 buffers the whole result in a client-side cursor
+        cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.itersize = STREAM_CHUNK_ROWS
+        return cursor
+
+    def executemany(self, cursor, sql: str, rows: List[List[Any]]) -> Optional[int]:
+        return executemany_postgres(cursor, sql, rows)
+
+    def insert(self, table: str, columns: List[str], returning: bool = True) -> str:
+        suffix = " RETURNING *" if returning else ""
+        if not columns:
+            return f"INSERT INTO {table} DEFAULT VALUES{suffix}"
+        placeholders = ', '.join('%s' for _ in columns)
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}){suffix}"
+
+    def update(self, table: str, columns: List[str], where: str, returning: bool = True) -> str:
+        assignments = ', '.join(f"{c} = %s" for c in columns)
+        suffix = " RETURNING *" if returning else ""
+        return f"UPDATE {table} SET {assignments} WHERE {where}{suffix}"
+
+
+DIALECTS = {
+    'mssql': MSSQLDialect(),
+    'postgresql': PostgreSQLDialect(),
+}
+
+
+class CompiledTable:
+    """
+    CRUD statements of one table, compiled once from its TableInfo
+
+    Column names only ever come from the TableInfo, values only ever
+    travel as parameters.
+    """
+
+    def __init__(self, table_info, dialect: SqlDialect):
+        self.info = table_info
+        self.dialect = dialect
+        self.columns = {col.name: col for col in table_info.columns}
+        if not table_info.primary_keys:
+            # Any other column could match several rows in updates, deletes and keyset pages
+            raise ValueError(f"{table_info.name} has no primary key")
+        self.key_columns = table_info.primary_keys
+        self.writable = [col.name for col in table_info.columns if not col.is_identity]
+
+        q = dialect.quote
+        p = dialect.placeholder
+        self.qualified = f"{q(table_info.schema)}.{q(table_info.name)}"
+        key_order = ', '.join(q(k) for k in self.key_columns)
+        self.key_where = ' AND '.join(f"{q(k)} = {p}" for k in self.key_columns)
+
+        self.select_page_sql = f"SELECT * FROM {self.qualified} {dialect.page(key_order)}"
+        # Keyset pages: rows after the last key of the previous page
+        after = keyset_predicate([q(k) for k in self.key_columns], p)
+        self.first_page_sql = f"SELECT * FROM {self.qualified} {dialect.first_rows(key_order)}"
+        self.next_page_sql = f"SELECT * FROM {self.qualified} WHERE {after} {dialect.first_rows(key_order)}"
+        self.stream_sql = f"SELECT * FROM {self.qualified} ORDER BY {key_order}"
+        self.stream_after_sql = f"SELECT * FROM {self.qualified} WHERE {after} ORDER BY {key_order}"
+        self.select_one_sql = f"SELECT * FROM {self.qualified} WHERE {self.key_where}"
+        self.delete_sql = f"DELETE FROM {self.qualified} WHERE {self.key_where}"
+
+        self._statements: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def models(self) -> TableModels:
+        """Pydantic models of the table, built on first use and shared through the model factory"""
+        if self._fingerprint is None:
+            self._fingerprint = table_fingerprint(self.info)
+        return model_factory.models_for(self.info, self._fingerprint)
+
+    def _statement(self, kind: str, columns: Tuple[str, ...]) -> str:
+        key = (kind, columns)
+        sql = self._statements.get(key)
+        if sql is None:
+            quoted = [self.dialect.quote(c) for c in columns]
+            # Bulk statements run through executemany and return nothing
+            returning = not kind.startswith('bulk_')
+            if kind.endswith('insert'):
+                sql = self.dialect.insert(self.qualified, quoted, returning)
+            else:
+                sql = self.dialect.update(self.qualified, quoted, self.key_where, returning)
+            with self._lock:
+                if len(self._statements) >= MAX_STATEMENTS_PER_TABLE:
+                    self._statements.clear()
+                self._statements[key] = sql
+        return sql
+
+    def writable_values(self, item: Dict[str, Any], partial: bool = False) -> Tuple[Tuple[str, ...], List[Any]]:
+        """
+        Validated (columns, values) of a request body, in table column order
+
+        Values are checked and converted by the table's create model, or
+        its update model when partial (ValidationError is a ValueError).
+        """
+        unknown = [k for k in item if k not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown columns for {self.info.name}: {', '.join(sorted(unknown))}")
+        read_only = [k for k in item if k not in self.writable]
+        if read_only:
+            raise ValueError(f"Identity columns cannot be written: {', '.join(sorted(read_only))}")
+        models = self.models
+        values = models.dump((models.update if partial else models.create).model_validate(item))
+        columns = tuple(c for c in self.writable if c in values)
+        return columns, [values[c] for c in columns]
+
+    def insert_sql(self, columns: Tuple[str, ...]) -> str:
+        return self._statement('insert', columns)
+
+    def update_sql(self, columns: Tuple[str, ...]) -> str:
+        return self._statement('update', columns)
+
+    def bulk_insert_sql(self, columns: Tuple[str, ...]) -> str:
+        return self._statement('bulk_insert', columns)
+
+    def bulk_update_sql(self, columns: Tuple[str, ...]) -> str:
+        return self._statement('bulk_update', columns)
+
+    def split_key(self, item: Any) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        (key parameters, remaining fields) of a bulk update/delete row
+
+        The row is an object carrying every key column; for single-key
+        tables a bare key value is accepted as well.
+        """
+        if not isinstance(item, dict):
+            if len(self.key_columns) == 1 and isinstance(item, (int, str)):
+                return [item], {}
+            raise ValueError(f"Row must be an object with {', '.join(self.key_columns)}")
+        missing = [k for k in self.key_columns if k not in item]
+        if missing:
+            raise ValueError(f"Missing key columns: {', '.join(missing)}")
+        return [item[k] for k in self.key_columns], {k: v for k, v in item.items() if k not in self.key_columns}
+
+    def encode_cursor(self, row: Dict[str, Any], query: Optional[CompiledQuery] = None) -> str:
+        """Opaque continuation token: the order values (by default the key) of the last row of a page"""
+        if query is None:
+            state = {'t': self.info.name, 'k': [row[k] for k in self.key_columns]}
+        else:
+            state = {'t': self.info.name, 'k': [row[c] for c in query.order_columns], 'o': query.signature}
+        return base64.urlsafe_b64encode(dump_state(state).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token: str, query: Optional[CompiledQuery] = None) -> List[Any]:
+        """
+        Order values of a cursor; for the default order, as keyset
+        parameters for next_page_sql / stream_after_sql
+        """
+        try:
+            state = load_state(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+            table, key = state['t'], list(state['k'])
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("Invalid cursor")
+        columns = query.order_columns if query is not None else self.key_columns
+        if table != self.info.name or len(key) != len(columns):
+            raise ValueError("Cursor belongs to a different table")
+        if state.get('o') != (query.signature if query is not None else None):
+            raise ValueError("Cursor belongs to a different sort order")
+        return key if query is not None else keyset_params(key)
+
+    def key_values(self, item_id: str) -> List[Any]:
+        """Parameters for key_where from an item id ('5', or '3,17' for composite keys)"""
+        parts = item_id.split(KEY_SEPARATOR) if len(self.key_columns) > 1 else [item_id]
+        if len(parts) != len(self.key_columns):
+            raise ValueError(
+                f"{self.info.name} is keyed by {', '.join(self.key_columns)}; "
+                f"expected {len(self.key_columns)} comma-separated values"
+            )
+        values = []
+        for name, part in zip(self.key_columns, parts):
+            if self.columns[name].data_type.lower() in INTEGER_TYPES:
+                try:
+                    values.append(int(part))
+                except ValueError:
+                    raise ValueError(f"{name} must be an integer")
+            else:
+                values.append(part)
+        return values
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+@dataclass
+class Mount:
+    """Tables of one database served under a mount name"""
+    name: str
+    dialect: SqlDialect
+    pool: ConnectionPool
+    # Schema cache key and schema the tables come from; together they pick
+    # the introspection results that hot-swap this mount
+    cache_key: Optional[str] = None
+    schema: Optional[str] = None
+    table_filter: Optional[List[str]] = None
+    tables: Dict[str, CompiledTable] = field(default_factory=dict)
+    # Tables not served because they have no primary key
+    skipped: List[str] = field(default_factory=list)
+    # Username of whoever mounted it; only they may replace or remove it
+    owner: Optional[str] = None
+    # Registry key of the pool; mounts of the same database share the pool
+    pool_key: Optional[str] = None
+
+
+@dataclass
+class Page:
+    """One page of a list query"""
+    rows: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    warnings: List[str] = field(default_factory=list)
+
+
+def _rows(cursor) -> List[Dict[str, Any]]:
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _row(cursor) -> Optional[Dict[str, Any]]:
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+# Blocking halves of the CRUD operations; they run on a pooled connection
+# in the database thread pool
+
+def _select_page(conn, table: CompiledTable, skip: int, limit: int) -> List[Dict[str, Any]]:
+    cursor = conn.cursor()
+    cursor.execute(table.select_page_sql, (skip, limit))
+    return _rows(cursor)
+
+
+def _select_one(conn, table: CompiledTable, key: List[Any]) -> Optional[Dict[str, Any]]:
+    cursor = conn.cursor()
+    cursor.execute(table.select_one_sql, key)
+    return _row(cursor)
+
+
+def _select_keyset(conn, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return _rows(cursor)
+
+
+def _select_counted(conn, sql: str, params: List[Any], count: Optional[Tuple[str, List[Any]]]):
+    rows = _select_keyset(conn, sql, params)
+    if count is None:
+        return rows, None
+    cursor = conn.cursor()
+    cursor.execute(*count)
+    return rows, cursor.fetchone()[0]
+
+
+def _ndjson_chunks(conn, dialect: SqlDialect, sql: str, params: List[Any]):
+    cursor = dialect.stream_cursor(conn)
+    cursor.execute(sql, params)
+    columns = None
+    while True:
+        rows = cursor.fetchmany(STREAM_CHUNK_ROWS)
+        if not rows:
+            return
+        if columns is None:
+            columns = [column[0] for column in cursor.description]
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=_json_default) + '\n'
+            for row in rows
+        ).encode()
+
+
+def _write_returning(conn, sql: str, params: List[Any]) -> Optional[Dict[str, Any]]:
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    row = _row(cursor)
+    conn.commit()
+    return row
+
+
+def _delete(conn, table: CompiledTable, key: List[Any]) -> int:
+    cursor = conn.cursor()
+    cursor.execute(table.delete_sql, key)
+    deleted = cursor.rowcount
+    conn.commit()
+    return deleted
+
+
+class DynamicCrudEngine:
+    """
+    Registry of mounted databases and the CRUD operations on their tables
+
+    A mount's table map is replaced as a whole when its schema changes,
+    so requests always see either the old or the new set of statements.
+    """
+
+    def __init__(self):
+        self.mounts: Dict[str, Mount] = {}
+        self._lock = threading.Lock()
+
+    def mount(
+        self,
+        name: str,
+        database_type: str,
+        pool: ConnectionPool,
+        tables: List,
+        cache_key: Optional[str] = None,
+        schema: Optional[str] = None,
+        table_filter: Optional[List[str]] = None,
+        owner: Optional[str] = None,
+        pool_key: Optional[str] = None
+    ) -> Mount:
+        """
+        Serve `tables` (TableInfo) under `name`, replacing an existing mount
+
+        Other mounts registered with the same pool_key switch to `pool`,
+        which get_pool may have created in place of theirs.
+        Raises PermissionError if `name` is mounted by another owner.
+        """
+        dialect = DIALECTS.get(database_type)
+        if dialect is None:
+            raise ValueError(f"Unsupported database type: {database_type}")
+        self.check_owner(name, owner)
+        mount = Mount(name, dialect, pool, cache_key, schema, table_filter, owner=owner, pool_key=pool_key)
+        mount.tables = self._compile(mount, tables, {})
+        with self._lock:
+            self.check_owner(name, owner)
+            replaced = self.mounts.get(name)
+            self.mounts[name] = mount
+            if pool_key is not None:
+                for other in self.mounts.values():
+                    if other.pool_key == pool_key:
+                        other.pool = pool
+            self._close_unused_pool(replaced)
+        logger.info(f"Mounted {len(mount.tables)} tables under '{name}'")
+        return mount
+
+    def check_owner(self, name: str, owner: Optional[str]):
+        """Raise PermissionError if `name` is mounted by someone other than `owner`"""
+        existing = self.mounts.get(name)
+        if existing is not None and existing.owner != owner:
+            raise PermissionError(f"'{name}' is mounted by another user")
+
+    def unmount(self, name: str, owner: Optional[str] = None) -> bool:
+        """Stop serving `name`; its pool is closed once no mount uses it"""
+        with self._lock:
+            self.check_owner(name, owner)
+            mount = self.mounts.pop(name, None)
+            self._close_unused_pool(mount)
+        return mount is not None
+
+    def _close_unused_pool(self, mount: Optional[Mount]):
+        if mount is None or mount.pool_key is None:
+            return
+        if not any(other.pool_key == mount.pool_key for other in self.mounts.values()):
+            close_pool(mount.pool_key)
+
+    def apply_schema(self, cache_key: str, schema: str, tables: List):
+        """Hot-swap the tables of every mount backed by this schema of the cache key"""
+        for mount in list(self.mounts.values()):
+            if mount.cache_key != cache_key or mount.schema != schema:
+                continue
+            compiled = self._compile(mount, tables, mount.tables)
+            changed = len(compiled) != len(mount.tables) or any(
+                mount.tables.get(name) is not table for name, table in compiled.items()
+            )
+            if changed:
+                mount.tables = compiled
+                logger.info(f"Reloaded mount '{mount.name}': {len(compiled)} tables")
+
+    @staticmethod
+    def _compile(mount: Mount, tables: List, previous: Dict[str, CompiledTable]) -> Dict[str, CompiledTable]:
+        selected = set(mount.table_filter) if mount.table_filter else None
+        compiled = {}
+        skipped = []
+        for table in tables:
+            if not table.columns or (selected is not None and table.name not in selected):
+                continue
+            if not table.primary_keys:
+                skipped.append(table.name)
+                continue
+            existing = previous.get(table.name)
+            # Unchanged tables keep their compiled statements
+            compiled[table.name] = (
+                existing if existing is not None and existing.info == table
+                else CompiledTable(table, mount.dialect)
+            )
+        if skipped:
+            logger.warning(f"Mount '{mount.name}': not serving tables without a primary key: {', '.join(skipped)}")
+        mount.skipped = skipped
+        return compiled
+
+    def table(self, mount_name: str, table_name: str) -> Tuple[Mount, CompiledTable]:
+        mount = self.mounts.get(mount_name)
+        if mount is None:
+            raise LookupError(f"Nothing is mounted under '{mount_name}'")
+        table = mount.tables.get(table_name)
+        if table is None:
+            raise LookupError(f"Table '{table_name}' not found in '{mount_name}'")
+        return mount, table
+
+    async def list_rows(self, mount_name: str, table_name: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        mount, table = self.table(mount_name, table_name)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        return await mount.pool.run(_select_page, table, max(0, skip), limit)
+
+    async def list_page(
+        self,
+        mount_name: str,
+        table_name: str,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        A keyset page in primary key order
+
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        Unlike skip, every page costs the same however deep it is.
+        """
+        mount, table = self.table(mount_name, table_name)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if cursor:
+            rows = await mount.pool.run(_select_keyset, table.next_page_sql, table.decode_cursor(cursor) + [limit])
+        else:
+            rows = await mount.pool.run(_select_keyset, table.first_page_sql, [limit])
+        next_cursor = table.encode_cursor(rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    async def query_page(
+        self,
+        mount_name: str,
+        table_name: str,
+        spec: QuerySpec,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: Optional[int] = None
+    ) -> Page:
+        """
+        A page of rows matching spec (projection, filters, sort, count)
+
+        Keyset paged like list_page when the sort allows it; otherwise, or
+        when skip is given, offset paged without a next cursor.
+        """
+        mount, table = self.table(mount_name, table_name)
+        query = CompiledQuery(table, spec)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        count = query.count() if spec.count else None
+
+        keyset = query.keyset and (skip is None or bool(cursor))
+        if keyset:
+            after = table.decode_cursor(cursor, query) if cursor else None
+            sql, params = query.page(after, limit)
+        elif cursor:
+            raise ValueError("Cursors need a sort in one direction on non-nullable columns; use skip")
+        else:
+            sql, params = query.offset_page(max(0, skip or 0), limit)
+
+        rows, total = await mount.pool.run(_select_counted, sql, params, count)
+        next_cursor = table.encode_cursor(rows[-1], query) if keyset and len(rows) == limit else None
+        return Page(query.strip_hidden(rows), next_cursor, total, query.warnings)
+
+    def stream_rows(
+        self,
+        mount_name: str,
+        table_name: str,
+        cursor: Optional[str] = None,
+        spec: Optional[QuerySpec] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        NDJSON chunks of all rows in primary key order (or matching spec),
+        after cursor if given
+
+        Rows go from the database cursor to the client chunk by chunk; the
+        table is never held in memory. Lookup, query and cursor errors are
+        raised here, before anything is streamed.
+        """
+        mount, table = self.table(mount_name, table_name)
+        if spec:
+            query = CompiledQuery(table, spec)
+            if cursor and not query.keyset:
+                raise ValueError("Cursors need a sort in one direction on non-nullable columns")
+            sql, params = query.stream(table.decode_cursor(cursor, query) if cursor else None)
+        elif cursor:
+            sql, params = table.stream_after_sql, table.decode_cursor(cursor)
+        else:
+            sql, params = table.stream_sql, []
+        return mount.pool.stream(_ndjson_chunks, mount.dialect, sql, params)
+
+    async def get_row(self, mount_name: str, table_name: str, item_id: str) -> Dict[str, Any]:
+        mount, table = self.table(mount_name, table_name)
+        row = await mount.pool.run(_select_one, table, table.key_values(item_id))
+        if row is None:
+            raise LookupError(f"{table_name} not found")
+        return row
+
+    async def create_row(self, mount_name: str, table_name: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        mount, table = self.table(mount_name, table_name)
+        columns, values = table.writable_values(item)
+        return await mount.pool.run(_write_returning, table.insert_sql(columns), values)
+
+    async def update_row(self, mount_name: str, table_name: str, item_id: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        mount, table = self.table(mount_name, table_name)
+        columns, values = table.writable_values(item, partial=True)
+        if not columns:
+            raise ValueError("No fields to update")
+        row = await mount.pool.run(_write_returning, table.update_sql(columns), values + table.key_values(item_id))
+        if row is None:
+            raise LookupError(f"{table_name} not found")
+        return row
+
+    async def delete_row(self, mount_name: str, table_name: str, item_id: str):
+        mount, table = self.table(mount_name, table_name)
+        if await mount.pool.run(_delete, table, table.key_values(item_id)) == 0:
+            raise LookupError(f"{table_name} not found")
+
+    # Bulk operations validate every row up front, then run all valid rows
+    # in one transaction (see services.bulk_write.execute_bulk). Each
+    # returns {"written": n, "errors": [{"index": i, "error": ...}]}; when
+    # atomic, any error means nothing was written. An update or delete
+    # whose key matches no row is an error ("not found").
+
+    async def bulk_create(self, mount_name: str, table_name: str, items: List[Any], atomic: bool = True) -> Dict[str, Any]:
+        mount, table = self.table(mount_name, table_name)
+        statements, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Row must be an object")
+                columns, values = table.writable_values(item)
+                statements.append((index, table.bulk_insert_sql(columns), values))
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+        return await self._bulk(mount, statements, errors, atomic)
+
+    async def bulk_update(self, mount_name: str, table_name: str, items: List[Any], atomic: bool = True) -> Dict[str, Any]:
+        mount, table = self.table(mount_name, table_name)
+        statements, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                key, fields = table.split_key(item)
+                columns, values = table.writable_values(fields, partial=True)
+                if not columns:
+                    raise ValueError("No fields to update")
+                statements.append((index, table.bulk_update_sql(columns), values + key))
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+        return await self._bulk(mount, statements, errors, atomic, require_rows=True)
+
+    async def bulk_delete(self, mount_name: str, table_name: str, items: List[Any], atomic: bool = True) -> Dict[str, Any]:
+        mount, table = self.table(mount_name, table_name)
+        statements, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                key, _ = table.split_key(item)
+                statements.append((index, table.delete_sql, key))
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+        return await self._bulk(mount, statements, errors, atomic, require_rows=True)
+
+    @staticmethod
+    async def _bulk(
+        mount: Mount,
+        statements: List,
+        errors: List[Dict[str, Any]],
+        atomic: bool,
+        require_rows: bool = False
+    ) -> Dict[str, Any]:
+        if errors and atomic:
+            return {"written": 0, "errors": errors}
+        written, failed = await mount.pool.run(
+            execute_bulk, statements, mount.dialect.executemany, mount.dialect.savepoints, atomic, require_rows
+        )
+        return {"written": written, "errors": sorted(errors + failed, key=lambda e: e["index"])}
+
+
+# Process-wide engine used by the autogen and data routers
+engine = DynamicCrudEngine()
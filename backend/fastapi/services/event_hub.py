@@ -0,0 +1,472 @@
+"""
+Event Hub
+Fans out tenant event notifications (PostgreSQL LISTEN/NOTIFY) to realtime WebSocket subscribers
+"""
+
+from typing import Any, Callable, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+from collections import deque
+import asyncio
+import json
+import logging
+import os
+
+from services.event_ingest import EVENTS_DATABASE_URL, asyncpg_dsn, events_schema
+
+logger = logging.getLogger(__name__)
+
+# local: every process LISTENs for its own subscribers; redis: one
+# elected process per tenant LISTENs and relays through a Redis stream
+REALTIME_FANOUT = os.getenv("REALTIME_FANOUT", "local")
+
+# Notifications buffered per WebSocket before its overflow policy applies
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "1000"))
+# A tenant's LISTEN connection is closed this long after its last subscriber left
+CHANNEL_IDLE_SECONDS = 30.0
+# Reconnect backoff of a lost LISTEN connection
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+# Events of compact notifications, fetched by seq ranges; rendered as the
+# notifications of the per-row trigger were
+FETCH_EVENTS_SQL = """
+    SELECT json_build_object(
+        'id', e.id, 'device_id', e.device_id, 'event_type', e.event_type,
+        'timestamp', e.timestamp, 'payload', e.payload
+    )::text
+    FROM unnest($1::bigint[], $2::bigint[]) AS r(first_seq, last_seq)
+    JOIN {schema}.events e ON e.seq BETWEEN r.first_seq AND r.last_seq
+    ORDER BY e.seq
+"""
+# Ranges per fetch query
+FETCH_MAX_RANGES = 1000
+
+# What a full subscriber queue does with the next notification
+OVERFLOW_POLICIES = ('drop_oldest', 'disconnect')
+
+
+def events_channel(tenant: str) -> str:
+    """NOTIFY channel of infra/postgres/tenant_events.sql"""
+    return f"{events_schema(tenant)}_events"
+
+
+def _filter(values: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Comma-separated filter values; None matches everything"""
+    if not values:
+        return None
+    return frozenset(value.strip() for value in values.split(',') if value.strip()) or None
+
+
+class Subscription:
+    """
+    One WebSocket's view of a tenant channel
+
+    Notifications are queued as the text PostgreSQL sent, so the hub
+    parses each one once however many sockets receive it. The queue is
+    bounded: drop_oldest discards the oldest queued notification,
+    disconnect closes the subscription (the socket is then closed).
+    """
+
+    def __init__(
+        self,
+        tenant: str,
+        device_ids: Optional[FrozenSet[str]] = None,
+        event_types: Optional[FrozenSet[str]] = None,
+        queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+        overflow: str = 'drop_oldest'
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.tenant = tenant
+        self.device_ids = device_ids
+        self.event_types = event_types
+        self.overflow = overflow
+        self.queue: Deque[str] = deque(maxlen=max(1, queue_size))
+        self.dropped = 0
+        # Closed by the disconnect policy
+        self.overflowed = False
+        self.closed_reason: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_reason is not None
+
+    def offer(self, text: str):
+        if self.closed:
+            return
+        if len(self.queue) == self.queue.maxlen:
+            if self.overflow == 'disconnect':
+                self.overflowed = True
+                self.close("Subscriber too slow")
+                return
+            self.dropped += 1
+        self.queue.append(text)
+        self._ready.set()
+
+    def close(self, reason: str):
+        if not self.closed:
+            self.closed_reason = reason
+            self._ready.set()
+
+    def matches(self, device_id: Any, event_type: Any) -> bool:
+        return (
+            (self.device_ids is None or device_id in self.device_ids)
+            and (self.event_types is None or event_type in self.event_types)
+        )
+
+    def prepend(self, texts: List[str]):
+        """Queue replayed notifications ahead of the live ones, within the same bound"""
+        if self.closed or not texts:
+            return
+        combined = texts + list(self.queue)
+        overflow = len(combined) - self.queue.maxlen
+        if overflow > 0:
+            if self.overflow == 'disconnect':
+                self.overflowed = True
+                self.close("Subscriber too slow")
+                return
+            self.dropped += overflow
+        self.queue = deque(combined[max(0, overflow):], maxlen=self.queue.maxlen)
+        self._ready.set()
+
+    async def get(self) -> Optional[str]:
+        """The next notification; None once the subscription is closed"""
+        while not self.queue:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        if self.overflowed:
+            return None
+        return self.queue.popleft()
+
+
+def compact_ranges(payload: str) -> Optional[List[Tuple[int, int]]]:
+    """
+    (first seq, last seq) ranges of a compact notification, {"r": [[a, b], ...]};
+    None for a notification carrying a whole event (per-row trigger of
+    schemas created before the statement-level one)
+    """
+    if not payload.startswith('{"r":'):
+        return None
+    try:
+        return [(int(first), int(last)) for first, last in json.loads(payload)['r']]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class PostgresListener:
+    """
+    LISTEN connection to one tenant's events channel, reconnected with
+    backoff when lost
+
+    The statement-level trigger only names the inserted events.seq
+    ranges. Ranges arriving while a fetch runs are coalesced into the
+    next one; each fetch is a single query on the listening connection
+    that returns the events serialized by PostgreSQL, in seq order.
+    Ranges whose fetch was cut off by a lost connection stay pending and
+    are fetched once the connection is back.
+    """
+
+    def __init__(self, dsn: str, tenant: str, on_notify: Callable[[str], None]):
+        self.dsn = dsn
+        self.schema = events_schema(tenant)
+        self.channel = events_channel(tenant)
+        self.on_notify = on_notify
+        self.conn = None
+        self.fetch_sql = FETCH_EVENTS_SQL.format(schema=self.schema)
+        self.pending: List[Tuple[int, int]] = []
+        self._fetch_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        import asyncpg
+        conn = await asyncpg.connect(self.dsn)
+        await conn.add_listener(self.channel, self._notified)
+        conn.add_termination_listener(self._terminated)
+        self.conn = conn
+        logger.info(f"Listening on {self.channel}")
+
+    async def close(self):
+        self._closing = True
+        for task in (self._reconnect_task, self._fetch_task):
+            if task is not None:
+                task.cancel()
+        if self.conn is not None and not self.conn.is_closed():
+            await self.conn.close()
+        self.conn = None
+        logger.info(f"Stopped listening on {self.channel}")
+
+    def _notified(self, conn, pid, channel, payload: str):
+        ranges = compact_ranges(payload)
+        if ranges is None:
+            self.on_notify(payload)
+            return
+        self.pending.extend(ranges)
+        self._schedule_fetch()
+
+    def _schedule_fetch(self):
+        if self.pending and (self._fetch_task is None or self._fetch_task.done()):
+            self._fetch_task = asyncio.get_running_loop().create_task(self._fetch())
+
+    async def _fetch(self):
+        while self.pending and not self._closing:
+            conn = self.conn
+            if conn is None or conn.is_closed():
+                return  # Reconnecting; _reconnect fetches what is pending
+            ranges = self.pending[:FETCH_MAX_RANGES]
+            del self.pending[:FETCH_MAX_RANGES]
+            try:
+                rows = await conn.fetch(
+                    self.fetch_sql, [first for first, _ in ranges], [last for _, last in ranges]
+                )
+            except Exception as e:
+                if conn.is_closed():
+                    # Lost connection: retry these ranges first after reconnecting
+                    self.pending[:0] = ranges
+                    continue
+                logger.error(f"Fetching {len(ranges)} event ranges of {self.schema} failed: {e}")
+                continue
+            for row in rows:
+                self.on_notify(row[0])
+
+    def _terminated(self, conn):
+        if self._closing or conn is not self.conn:
+            return
+        logger.warning(f"LISTEN connection of {self.channel} lost, reconnecting")
+        self.conn = None
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = RECONNECT_MIN_SECONDS
+        while not self._closing:
+            try:
+                await self.start()
+                self._schedule_fetch()
+                return
+            except Exception as e:
+                logger.error(f"Reconnecting {self.channel} failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+
+def notification_keys(payload: str) -> Tuple[Any, Any]:
+    """(device_id, event_type) of a notification; ValueError if it is not an event object"""
+    try:
+        event = json.loads(payload)
+        return event.get('device_id'), event.get('event_type')
+    except (ValueError, AttributeError):
+        raise ValueError("Malformed notification")
+
+
+def stream_message(payload: str, stream_id: Optional[str] = None) -> str:
+    """
+    What a socket receives: {"stream_id": ..., "event": <notification>}
+
+    stream_id (Redis fan-out only) is what a reconnecting client passes
+    as last_event_id. Built by concatenation, the notification is not
+    re-serialized.
+    """
+    return f'{{"stream_id":{json.dumps(stream_id)},"event":{payload}}}'
+
+
+class TenantChannel:
+    """
+    The subscribers of one tenant in this process
+
+    Subscribers are indexed by device_id, so a notification is only
+    matched against sockets that asked for its device (or for all devices).
+    """
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.channel = events_channel(tenant)
+        self.by_device: Dict[str, Set[Subscription]] = {}
+        self.all_devices: Set[Subscription] = set()
+        self.subscriptions: Set[Subscription] = set()
+        self.notifications = 0
+        # The channel's own LISTEN connection (local fan-out only)
+        self.listener: Optional[PostgresListener] = None
+        self.idle_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self.subscriptions)
+
+    async def close(self):
+        self.cancel_idle()
+        for subscription in self.subscriptions:
+            subscription.close("Server shutting down")
+        if self.listener is not None:
+            await self.listener.close()
+            self.listener = None
+
+    def add(self, subscription: Subscription):
+        self.cancel_idle()
+        self.subscriptions.add(subscription)
+        if subscription.device_ids is None:
+            self.all_devices.add(subscription)
+        else:
+            for device_id in subscription.device_ids:
+                self.by_device.setdefault(device_id, set()).add(subscription)
+
+    def remove(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+        if subscription.device_ids is None:
+            self.all_devices.discard(subscription)
+        else:
+            for device_id in subscription.device_ids:
+                subs = self.by_device.get(device_id)
+                if subs is not None:
+                    subs.discard(subscription)
+                    if not subs:
+                        del self.by_device[device_id]
+
+    def cancel_idle(self):
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+
+    def matching(self, payload: str) -> List[Subscription]:
+        """Subscribers whose filters match a notification"""
+        try:
+            device_id, event_type = notification_keys(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed notification on {self.channel}")
+            return []
+        return [
+            subscription
+            for subscriptions in (self.all_devices, self.by_device.get(device_id, ()))
+            for subscription in subscriptions
+            if subscription.event_types is None or event_type in subscription.event_types
+        ]
+
+    def deliver(self, payload: str, stream_id: Optional[str] = None):
+        """Queue a notification for every subscriber whose filters match"""
+        self.notifications += 1
+        subscriptions = self.matching(payload)
+        if subscriptions:
+            text = stream_message(payload, stream_id)
+            for subscription in subscriptions:
+                subscription.offer(text)
+
+
+class EventHub:
+    """
+    One LISTEN per tenant with subscribers, shared by all of the
+    process's WebSockets
+
+    10k sockets on a handful of tenants cost a handful of database
+    connections instead of 10k. Channels are opened on the first
+    subscription and closed CHANNEL_IDLE_SECONDS after the last one left.
+
+    With a relay (REALTIME_FANOUT=redis) the process does not LISTEN
+    itself: one elected process per tenant does and publishes to a Redis
+    stream, which every process with subscribers reads; see
+    services.event_relay.
+    """
+
+    def __init__(self, dsn: str = EVENTS_DATABASE_URL, relay=None):
+        self.dsn = asyncpg_dsn(dsn)
+        self.relay = relay
+        self.channels: Dict[str, TenantChannel] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        if relay is not None:
+            relay.hub = self
+
+    async def subscribe(
+        self,
+        tenant: str,
+        device_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+        overflow: str = 'drop_oldest',
+        last_event_id: Optional[str] = None
+    ) -> Subscription:
+        """
+        Subscribe to a tenant's events; device_id and event_type take
+        comma-separated lists. last_event_id (Redis fan-out only) first
+        replays the tenant's events after that stream id.
+        """
+        subscription = Subscription(tenant, _filter(device_id), _filter(event_type), queue_size, overflow)
+        if last_event_id is not None and self.relay is None:
+            raise ValueError("last_event_id needs REALTIME_FANOUT=redis")
+        channel = self.channels.get(tenant)
+        if channel is None:
+            lock = self._locks.setdefault(tenant, asyncio.Lock())
+            async with lock:
+                channel = self.channels.get(tenant)
+                if channel is None:
+                    channel = TenantChannel(tenant)
+                    if self.relay is not None:
+                        await self.relay.follow(tenant)
+                    else:
+                        channel.listener = PostgresListener(self.dsn, tenant, channel.deliver)
+                        await channel.listener.start()
+                    self.channels[tenant] = channel
+        channel.add(subscription)
+        if last_event_id is not None:
+            await self.relay.replay(channel, subscription, last_event_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close("Unsubscribed")
+        channel = self.channels.get(subscription.tenant)
+        if channel is None:
+            return
+        channel.remove(subscription)
+        if not channel.subscriber_count:
+            channel.cancel_idle()
+            loop = asyncio.get_running_loop()
+            channel.idle_handle = loop.call_later(CHANNEL_IDLE_SECONDS, self._close_idle, channel)
+
+    def _close_idle(self, channel: TenantChannel):
+        if channel.subscriber_count or self.channels.get(channel.tenant) is not channel:
+            return
+        del self.channels[channel.tenant]
+        loop = asyncio.get_running_loop()
+        loop.create_task(channel.close())
+        if self.relay is not None:
+            loop.create_task(self.relay.unfollow(channel.tenant))
+
+    async def close(self):
+        channels, self.channels = list(self.channels.values()), {}
+        await asyncio.gather(*(channel.close() for channel in channels), return_exceptions=True)
+        if self.relay is not None:
+            await self.relay.close()
+
+    def stats(self) -> Dict[str, Any]:
+        result = {
+            "fanout": "redis" if self.relay is not None else "local",
+            "channels": len(self.channels),
+            "subscribers": sum(channel.subscriber_count for channel in self.channels.values()),
+            "notifications": {
+                tenant: channel.notifications for tenant, channel in self.channels.items()
+            }
+        }
+        if self.relay is not None:
+            result["leading"] = sorted(self.relay.leading)
+        return result
+
+
+_hub: Optional[EventHub] = None
+
+
+def get_hub() -> EventHub:
+    """The process-wide hub"""
+    global _hub
+    if _hub is None:
+        relay = None
+        if REALTIME_FANOUT == 'redis':
+            from services.event_relay import RedisRelay
+            relay = RedisRelay()
+        _hub = EventHub(relay=relay)
+    return _hub
+
+
+async def stop_hub():
+    global _hub
+    if _hub is not None:
+        hub, _hub = _hub, None
+        await hub.close()
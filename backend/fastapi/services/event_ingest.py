@@ -0,0 +1,402 @@
+"""
+Event Ingestion
+Buffers device events in a bounded in-process queue and group-commits them into tenant events tables with COPY
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+
+from services.bulk_write import BatchTooLarge, parse_items
+
+logger = logging.getLogger(__name__)
+
+# Tenant event tables live in the platform PostgreSQL, schema tenant_<name>
+EVENTS_DATABASE_URL = os.getenv("EVENTS_DATABASE_URL", os.getenv("DATABASE_URL", ""))
+
+# Events waiting to be written; beyond this, requests get 429
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "50000"))
+# A batch is written when it holds this many events or its oldest event
+# waited EVENT_FLUSH_MS, whichever comes first
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "5000"))
+EVENT_FLUSH_MS = int(os.getenv("EVENT_FLUSH_MS", "20"))
+# Concurrent batch writers, each with its own connection
+EVENT_WRITERS = int(os.getenv("EVENT_WRITERS", "2"))
+# How long a request waits for its batch to commit
+COMMIT_TIMEOUT_SECONDS = 30.0
+# Events per upload to /realtime/{tenant}/events/batch
+EVENT_UPLOAD_MAX = int(os.getenv("EVENT_UPLOAD_MAX", "10000"))
+
+EVENT_COLUMNS = ('id', 'device_id', 'event_type', 'payload', 'timestamp')
+# Column widths of tenant_<name>.events
+DEVICE_ID_MAX_LENGTH = 255
+EVENT_TYPE_MAX_LENGTH = 100
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+TENANT_NAME = re.compile(r'^[a-z0-9_]{1,50}$')
+
+
+class IngestQueueFull(Exception):
+    """The queue is full; retry after retry_after seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Event queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class IngestUnavailable(Exception):
+    """Events cannot be written (no events database, or the write failed)"""
+
+
+class UnsupportedUploadFormat(ValueError):
+    """The upload's content type cannot be read"""
+
+
+def events_schema(tenant: str) -> str:
+    if not TENANT_NAME.match(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant}")
+    return f"tenant_{tenant}"
+
+
+def asyncpg_dsn(url: str) -> str:
+    """postgresql+psycopg2://... (SQLAlchemy) as a plain postgresql:// DSN"""
+    return re.sub(r'^postgres(ql)?\+\w+://', 'postgresql://', url)
+
+
+@dataclass
+class PendingEvents:
+    """Events of one submit, written together in one COPY"""
+    schema: str
+    records: List[Tuple]
+    done: Optional[asyncio.Future] = None
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class EventIngestor:
+    """
+    Group commit of device events
+
+    submit() puts an event on a bounded queue and returns a future that
+    resolves when the batch holding the event has committed. Writers take
+    up to batch_size events at a time, waiting at most flush_ms after the
+    first one, and COPY them per tenant in one transaction each; a batch
+    costs one round trip per tenant instead of one per event.
+    """
+
+    def __init__(
+        self,
+        dsn: str = EVENTS_DATABASE_URL,
+        queue_size: int = EVENT_QUEUE_SIZE,
+        batch_size: int = EVENT_BATCH_SIZE,
+        flush_ms: int = EVENT_FLUSH_MS,
+        writers: int = EVENT_WRITERS
+    ):
+        self.dsn = asyncpg_dsn(dsn)
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_ms / 1000
+        self.writer_count = max(1, writers)
+        # Bounded by event count (self.capacity), not by queue entries
+        self.queue: 'asyncio.Queue[PendingEvents]' = asyncio.Queue()
+        self.capacity = max(1, queue_size)
+        self.queued = 0
+        self.pool = None
+        self._writers: List[asyncio.Task] = []
+        # Events written per second, smoothed; sizes Retry-After
+        self.rate = 0.0
+        self.written = 0
+        self.failed = 0
+
+    async def start(self):
+        if not self.dsn.startswith('postgresql://'):
+            raise IngestUnavailable("Event ingestion needs a PostgreSQL EVENTS_DATABASE_URL")
+        import asyncpg
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.writer_count)
+        self._writers = [asyncio.create_task(self._writer()) for _ in range(self.writer_count)]
+        logger.info(
+            f"Event ingestion started: {self.writer_count} writers, batches of "
+            f"{self.batch_size} or {self.flush_seconds * 1000:.0f} ms"
+        )
+
+    async def stop(self):
+        """Write what is queued, then stop the writers and close the pool"""
+        await self.queue.join()
+        for task in self._writers:
+            task.cancel()
+        await asyncio.gather(*self._writers, return_exceptions=True)
+        self._writers = []
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has drained at the recent write rate"""
+        if self.rate <= 0:
+            return 1
+        return max(1, math.ceil(self.queued / self.rate))
+
+    def submit(
+        self,
+        tenant: str,
+        device_id: str,
+        event_type: str,
+        payload: Dict[str, Any],
+        wait: bool = True
+    ) -> Tuple[str, Optional[asyncio.Future]]:
+        """
+        Queue an event; returns (event id, future resolved on commit)
+
+        The id and timestamp are assigned here, so they reflect arrival
+        order. With wait=False no future is created (fire and forget).
+        Raises IngestQueueFull instead of waiting for room.
+        """
+        event_id = uuid.uuid4()
+        record = (event_id, device_id, event_type, json.dumps(payload), datetime.now(timezone.utc))
+        return str(event_id), self.submit_records(tenant, [record], wait)
+
+    def submit_records(self, tenant: str, records: List[Tuple], wait: bool = True) -> Optional[asyncio.Future]:
+        """
+        Queue EVENT_COLUMNS records as one unit; they are written in the
+        same COPY and committed together. Returns the commit future (if wait).
+        """
+        schema = events_schema(tenant)
+        if len(records) > self.capacity:
+            raise ValueError(f"At most {self.capacity} events per submit")
+        if self.queued + len(records) > self.capacity:
+            raise IngestQueueFull(self.retry_after())
+        done = asyncio.get_running_loop().create_future() if wait else None
+        self.queue.put_nowait(PendingEvents(schema, records, done))
+        self.queued += len(records)
+        return done
+
+    async def _next_batch(self) -> List[PendingEvents]:
+        """Entries holding up to batch_size events (a single larger upload is not split)"""
+        batch = [await self.queue.get()]
+        size = len(batch[0].records)
+        deadline = batch[0].queued_at + self.flush_seconds
+        while size < self.batch_size:
+            try:
+                entry = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(entry)
+            size += len(entry.records)
+        self.queued -= size
+        return batch
+
+    async def _writer(self):
+        while True:
+            batch = await self._next_batch()
+            count = sum(len(entry.records) for entry in batch)
+            started = time.monotonic()
+            try:
+                await self._write(batch)
+            except Exception as e:
+                # No connection; the writer carries on with the next batch
+                logger.error(f"Failed to write {count} events: {e}")
+                self.failed += count
+                _resolve(batch, IngestUnavailable(f"Events could not be written: {e}"))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            seconds = max(time.monotonic() - started, 1e-6)
+            self.rate = count / seconds if self.rate == 0 else 0.8 * self.rate + 0.2 * count / seconds
+
+    async def _write(self, batch: List[PendingEvents]):
+        by_schema: Dict[str, List[PendingEvents]] = {}
+        for entry in batch:
+            by_schema.setdefault(entry.schema, []).append(entry)
+
+        async with self.pool.acquire() as conn:
+            # One transaction per tenant, so a broken tenant table does not
+            # fail the events of the others
+            for schema, entries in by_schema.items():
+                records = [record for entry in entries for record in entry.records]
+                try:
+                    async with conn.transaction():
+                        await conn.copy_records_to_table(
+                            'events',
+                            schema_name=schema,
+                            columns=EVENT_COLUMNS,
+                            records=records
+                        )
+                except Exception as e:
+                    logger.error(f"Failed to write {len(records)} events to {schema}.events: {e}")
+                    self.failed += len(records)
+                    _resolve(entries, IngestUnavailable(f"Events could not be written: {e}"))
+                    continue
+                self.written += len(records)
+                _resolve(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "capacity": self.capacity,
+            "written": self.written,
+            "failed": self.failed,
+            "events_per_second": round(self.rate, 1)
+        }
+
+
+def _resolve(entries: List[PendingEvents], error: Optional[Exception] = None):
+    for entry in entries:
+        if entry.done is None or entry.done.done():
+            continue
+        if error is None:
+            entry.done.set_result(None)
+        else:
+            entry.done.set_exception(error)
+
+
+_ingestor: Optional[EventIngestor] = None
+_ingestor_lock: Optional[asyncio.Lock] = None
+
+
+async def get_ingestor() -> EventIngestor:
+    """The process-wide ingestor, started on first use"""
+    global _ingestor, _ingestor_lock
+    if _ingestor is not None:
+        return _ingestor
+    if _ingestor_lock is None:
+        _ingestor_lock = asyncio.Lock()
+    async with _ingestor_lock:
+        if _ingestor is None:
+            ingestor = EventIngestor()
+            await ingestor.start()
+            _ingestor = ingestor
+    return _ingestor
+
+
+async def stop_ingestor():
+    global _ingestor
+    if _ingestor is not None:
+        ingestor, _ingestor = _ingestor, None
+        await ingestor.stop()
+
+
+async def ingest(
+    tenant: str,
+    device_id: str,
+    event_type: str,
+    payload: Dict[str, Any],
+    wait: bool = True
+) -> str:
+    """Queue one event and, if wait, return once it is committed; its id"""
+    ingestor = await get_ingestor()
+    event_id, done = ingestor.submit(tenant, device_id, event_type, payload, wait)
+    if done is not None:
+        try:
+            await asyncio.wait_for(done, COMMIT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise IngestUnavailable(f"Event not committed within {COMMIT_TIMEOUT_SECONDS:.0f}s")
+    return event_id
+
+
+def parse_upload(body: bytes, content_type: str, max_events: int = EVENT_UPLOAD_MAX) -> List[Any]:
+    """Events of a batch upload: a JSON array, NDJSON, or a MessagePack array"""
+    if content_type.split(';')[0].strip() not in MSGPACK_TYPES:
+        return parse_items(body, content_type, max_events)
+
+    try:
+        import msgpack
+    except ImportError:
+        raise UnsupportedUploadFormat("MessagePack uploads need the msgpack package")
+    try:
+        # timestamp=3: MessagePack timestamps arrive as aware datetimes
+        items = msgpack.unpackb(body, raw=False, timestamp=3)
+    except Exception:
+        raise ValueError("Body is not valid MessagePack")
+    if not isinstance(items, list):
+        raise ValueError("Body must be a MessagePack array of events")
+    if len(items) > max_events:
+        raise BatchTooLarge(f"At most {max_events} events per upload")
+    return items
+
+
+def _event_time(value: Any, received_at: datetime) -> datetime:
+    """When the device recorded the event: ISO 8601, epoch seconds or a datetime; default now"""
+    if value is None:
+        return received_at
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc)
+    elif isinstance(value, str):
+        moment = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    else:
+        raise ValueError("timestamp must be ISO 8601 or epoch seconds")
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def validate_events(items: List[Any]) -> Tuple[List[Tuple], List[Dict[str, Any]]]:
+    """
+    COPY records of the valid events and one result per item, in order:
+    {"id": ...} if accepted, {"error": ...} if not
+
+    Plain checks in one loop rather than a Pydantic model per event; the
+    rules are those of RealtimeEvent and the events table, plus an
+    optional device-side timestamp for buffered readings.
+    """
+    received_at = datetime.now(timezone.utc)
+    dumps = json.dumps
+    records: List[Tuple] = []
+    results: List[Dict[str, Any]] = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({"error": "Event must be an object"})
+            continue
+        device_id = item.get('device_id')
+        event_type = item.get('event_type')
+        payload = item.get('payload')
+        if not isinstance(device_id, str) or not device_id or len(device_id) > DEVICE_ID_MAX_LENGTH:
+            results.append({"error": f"device_id must be a string of 1 to {DEVICE_ID_MAX_LENGTH} characters"})
+            continue
+        if not isinstance(event_type, str) or not event_type or len(event_type) > EVENT_TYPE_MAX_LENGTH:
+            results.append({"error": f"event_type must be a string of 1 to {EVENT_TYPE_MAX_LENGTH} characters"})
+            continue
+        if not isinstance(payload, dict):
+            results.append({"error": "payload must be an object"})
+            continue
+        try:
+            timestamp = _event_time(item.get('timestamp'), received_at)
+            payload_json = dumps(payload, default=str)
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            results.append({"error": str(e)})
+            continue
+        event_id = uuid.uuid4()
+        records.append((event_id, device_id, event_type, payload_json, timestamp))
+        results.append({"id": str(event_id)})
+    return records, results
+
+
+async def ingest_batch(tenant: str, items: List[Any], wait: bool = True) -> Dict[str, Any]:
+    """
+    Validate an upload and queue its valid events as one unit (one COPY);
+    if wait, return once they are committed. Invalid events are reported,
+    not written.
+    """
+    events_schema(tenant)
+    records, results = validate_events(items)
+    if records:
+        ingestor = await get_ingestor()
+        done = ingestor.submit_records(tenant, records, wait)
+        if done is not None:
+            try:
+                await asyncio.wait_for(done, COMMIT_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                raise IngestUnavailable(f"Events not committed within {COMMIT_TIMEOUT_SECONDS:.0f}s")
+    return {"accepted": len(records), "rejected": len(results) - len(records), "results": results}
@@ -0,0 +1,227 @@
+"""
+Event Relay
+Carries tenant event notifications between API processes through Redis streams, with one elected LISTEN per tenant
+"""
+
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+import re
+import uuid
+
+import redis.asyncio as aioredis
+
+from celery_app import REDIS_URL
+from services.event_hub import PostgresListener, Subscription, TenantChannel, notification_keys, stream_message
+
+logger = logging.getLogger(__name__)
+
+# Events kept per tenant stream for resuming clients (approximate trim)
+STREAM_MAXLEN = int(os.getenv("REALTIME_STREAM_MAXLEN", "10000"))
+# A leader that stops renewing is replaced after at most this long
+LEADER_LEASE_SECONDS = 10
+# Blocking XREAD timeout and batch size of the stream reader
+READ_BLOCK_MS = 1000
+READ_COUNT = 1000
+# Notifications per XADD pipeline of a leader, and how many may wait for one
+PUBLISH_BATCH = 500
+OUTBOX_SIZE = 50000
+
+STREAM_ID = re.compile(r'^\d+-\d+$')
+
+
+class RedisRelay:
+    """
+    Cross-process fan-out for EventHub
+
+    For each tenant with subscribers somewhere, one process holds the
+    leader lease (SET NX PX, renewed every third of the lease); it alone
+    LISTENs, fetches the notified events and XADDs each to the tenant's
+    stream. Every process with subscribers reads the streams it follows
+    in one blocking XREAD and hands entries to its TenantChannel, so
+    delivery and stream ids are the same on every process. Clients resume
+    by passing the last stream id they saw.
+
+    NOTIFY is not durable: events of a tenant nobody follows, and those
+    sent while a crashed leader's lease runs out, are not in the stream.
+    """
+
+    RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, lease_seconds: int = LEADER_LEASE_SECONDS):
+        self.client = aioredis.Redis.from_url(redis_url, decode_responses=True)
+        self.lease_ms = lease_seconds * 1000
+        self.token = uuid.uuid4().hex
+        # Set by EventHub
+        self.hub = None
+        # Stream key -> id of the last entry delivered, for followed tenants
+        self.positions: Dict[str, str] = {}
+        # Tenants this process leads, with their LISTEN connections
+        self.listeners: Dict[str, PostgresListener] = {}
+        self.outbox: 'asyncio.Queue[tuple]' = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self.lost = 0
+        self._tasks: List[asyncio.Task] = []
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    @staticmethod
+    def stream_key(tenant: str) -> str:
+        return f"berqenas:realtime:events:{tenant}"
+
+    @staticmethod
+    def leader_key(tenant: str) -> str:
+        return f"berqenas:realtime:leader:{tenant}"
+
+    @property
+    def leading(self) -> Set[str]:
+        return set(self.listeners)
+
+    def _start_tasks(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._read()),
+                asyncio.create_task(self._elect_all()),
+                asyncio.create_task(self._publish()),
+            ]
+
+    async def follow(self, tenant: str):
+        """Start delivering a tenant's stream, from its current end"""
+        key = self.stream_key(tenant)
+        last = await self.client.xrevrange(key, count=1)
+        self.positions[key] = last[0][0] if last else '0-0'
+        self._start_tasks()
+        await self._elect(tenant)
+
+    async def unfollow(self, tenant: str):
+        self.positions.pop(self.stream_key(tenant), None)
+        await self._resign(tenant)
+
+    async def replay(self, channel: TenantChannel, subscription: Subscription, last_event_id: str):
+        """
+        Queue the subscriber's matching events after last_event_id, up to
+        what the channel has delivered (later ones arrive live), newest
+        first if there are more than its queue holds
+        """
+        if not STREAM_ID.match(last_event_id):
+            raise ValueError(f"Invalid last_event_id: {last_event_id}")
+        key = self.stream_key(channel.tenant)
+        delivered = self.positions[key]
+        entries = await self.client.xrevrange(
+            key, max=delivered, min=f"({last_event_id}", count=subscription.queue.maxlen
+        )
+        texts = []
+        for stream_id, fields in reversed(entries):
+            try:
+                device_id, event_type = notification_keys(fields['e'])
+            except (ValueError, KeyError):
+                continue
+            if subscription.matches(device_id, event_type):
+                texts.append(stream_message(fields['e'], stream_id))
+        subscription.prepend(texts)
+
+    async def _read(self):
+        while True:
+            if not self.positions:
+                await asyncio.sleep(READ_BLOCK_MS / 1000)
+                continue
+            try:
+                streams = await self.client.xread(dict(self.positions), count=READ_COUNT, block=READ_BLOCK_MS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reading event streams failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            for key, entries in streams or []:
+                if key not in self.positions or not entries:
+                    continue  # Unfollowed while reading
+                channel = self.hub.channels.get(key.rsplit(':', 1)[1])
+                if channel is not None:
+                    for stream_id, fields in entries:
+                        if 'e' in fields:
+                            channel.deliver(fields['e'], stream_id)
+                self.positions[key] = entries[-1][0]
+
+    async def _elect_all(self):
+        while True:
+            await asyncio.sleep(self.lease_ms / 3000)
+            for key in list(self.positions):
+                tenant = key.rsplit(':', 1)[1]
+                try:
+                    await self._elect(tenant)
+                except Exception as e:
+                    logger.error(f"Leader election for {tenant} failed: {e}")
+
+    async def _elect(self, tenant: str):
+        """Renew the lease if leading, else try to take it and start listening"""
+        key = self.leader_key(tenant)
+        if tenant in self.listeners:
+            if not await self._renew(keys=[key], args=[self.token, self.lease_ms]):
+                logger.warning(f"Lost event leadership of {tenant}")
+                await self.listeners.pop(tenant).close()
+            return
+        if not await self.client.set(key, self.token, nx=True, px=self.lease_ms):
+            return
+        stream = self.stream_key(tenant)
+        listener = PostgresListener(self.hub.dsn, tenant, lambda payload: self._relay(stream, payload))
+        try:
+            await listener.start()
+        except Exception:
+            await self._release(keys=[key], args=[self.token])
+            raise
+        self.listeners[tenant] = listener
+        logger.info(f"Leading event relay of {tenant}")
+
+    async def _resign(self, tenant: str):
+        listener = self.listeners.pop(tenant, None)
+        if listener is not None:
+            await listener.close()
+            await self._release(keys=[self.leader_key(tenant)], args=[self.token])
+
+    def _relay(self, stream: str, payload: str):
+        try:
+            self.outbox.put_nowait((stream, payload))
+        except asyncio.QueueFull:
+            self.lost += 1
+
+    async def _publish(self):
+        """XADD leader notifications in pipelined batches, in arrival order"""
+        while True:
+            batch = [await self.outbox.get()]
+            while len(batch) < PUBLISH_BATCH and not self.outbox.empty():
+                batch.append(self.outbox.get_nowait())
+            pipe = self.client.pipeline(transaction=False)
+            for stream, payload in batch:
+                pipe.xadd(stream, {'e': payload}, maxlen=STREAM_MAXLEN, approximate=True)
+            try:
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"Failed to relay {len(batch)} notifications: {e}")
+                self.lost += len(batch)
+
+    async def close(self):
+        """Hand leadership over right away instead of letting leases expire"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for tenant in list(self.listeners):
+            try:
+                await self._resign(tenant)
+            except Exception as e:
+                logger.error(f"Resigning event leadership of {tenant} failed: {e}")
+        self.positions.clear()
+        await self.client.aclose()
@@ -0,0 +1,222 @@
+"""
+Model Factory
+Builds Pydantic models for introspected tables in-process and keeps them in an LRU cache
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Type
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time
+import hashlib
+import json
+import keyword
+import logging
+import os
+import threading
+
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+logger = logging.getLogger(__name__)
+
+# Python type (by name) of each SQL type, MSSQL and PostgreSQL; others map to Any
+SQL_TYPE_NAMES = {
+    'int': 'int',
+    'integer': 'int',
+    'bigint': 'int',
+    'smallint': 'int',
+    'tinyint': 'int',
+    'bit': 'bool',
+    'boolean': 'bool',
+    'decimal': 'float',
+    'numeric': 'float',
+    'money': 'float',
+    'smallmoney': 'float',
+    'float': 'float',
+    'real': 'float',
+    'double precision': 'float',
+    'varchar': 'str',
+    'nvarchar': 'str',
+    'char': 'str',
+    'nchar': 'str',
+    'text': 'str',
+    'ntext': 'str',
+    'character varying': 'str',
+    'character': 'str',
+    'citext': 'str',
+    'datetime': 'datetime',
+    'datetime2': 'datetime',
+    'smalldatetime': 'datetime',
+    'datetimeoffset': 'datetime',
+    'timestamp without time zone': 'datetime',
+    'timestamp with time zone': 'datetime',
+    'date': 'date',
+    'time': 'time',
+    'time without time zone': 'time',
+    'uniqueidentifier': 'str',
+    'uuid': 'str',
+    'json': 'Any',
+    'jsonb': 'Any',
+}
+
+PYTHON_TYPES = {
+    'int': int, 'bool': bool, 'float': float, 'str': str,
+    'datetime': datetime, 'date': date, 'time': time, 'Any': Any,
+}
+
+# Models of this many tables are kept; the least recently used go first
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "2048"))
+
+_RESERVED = set(dir(BaseModel))
+
+
+def python_type_name(data_type: str) -> str:
+    return SQL_TYPE_NAMES.get(data_type.lower(), 'Any')
+
+
+def field_name(column_name: str, position: int) -> str:
+    """
+    Attribute name of a column in its models; columns that are not valid,
+    public, non-clashing identifiers get a positional name and keep the
+    column name as alias
+    """
+    if (
+        column_name.isidentifier() and not keyword.iskeyword(column_name)
+        and not column_name.startswith('_') and column_name not in _RESERVED
+    ):
+        return column_name
+    return f"column_{position}"
+
+
+def pascal_case(snake_str: str) -> str:
+    """Convert snake_case to PascalCase"""
+    return ''.join(word.capitalize() for word in snake_str.split('_'))
+
+
+def table_fingerprint(table_info) -> str:
+    """SHA-256 over the whole table definition; changes whenever any part of it does"""
+    text = json.dumps(asdict(table_info), sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _max_length(col) -> Optional[int]:
+    if python_type_name(col.data_type) == 'str' and col.max_length and col.max_length > 0:
+        return col.max_length
+    return None
+
+
+def model_fields(table_info, kind: str) -> List[Tuple[str, Any, str, bool, Optional[int]]]:
+    """
+    (attribute, type name, column, required, max length) of every field of
+    a model kind:
+
+    - read: every column, as stored
+    - create: writable (non-identity) columns; non-nullable ones without
+      a default required
+    - update: writable columns, all optional; only the fields sent are written
+    - partial: every column optional, e.g. rows of a projected (fields=) list
+    """
+    fields = []
+    for position, col in enumerate(table_info.columns):
+        if kind in ('create', 'update') and col.is_identity:
+            continue
+        required = not col.is_nullable and (
+            kind == 'read' or (kind == 'create' and not col.has_default)
+        )
+        fields.append((
+            field_name(col.name, position),
+            python_type_name(col.data_type),
+            col.name,
+            required,
+            _max_length(col) if kind in ('create', 'update') else None
+        ))
+    return fields
+
+
+@dataclass(frozen=True)
+class TableModels:
+    """The Pydantic models of one table definition"""
+    read: Type[BaseModel]
+    create: Type[BaseModel]
+    update: Type[BaseModel]
+    partial: Type[BaseModel]
+    fingerprint: str
+
+    def dump(self, model: BaseModel) -> Dict[str, Any]:
+        """Fields the client set, by column name"""
+        return model.model_dump(by_alias=True, exclude_unset=True)
+
+
+def _build(table_info, kind: str, model_name: str) -> Type[BaseModel]:
+    definitions = {}
+    for attribute, type_name, column, required, max_length in model_fields(table_info, kind):
+        python_type = PYTHON_TYPES[type_name]
+        annotation = python_type if required else Optional[python_type]
+        options = {}
+        if attribute != column:
+            options['alias'] = column
+        if max_length is not None:
+            options['max_length'] = max_length
+        definitions[attribute] = (annotation, Field(... if required else None, **options))
+
+    # Request bodies may only name columns of the table
+    config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True,
+        protected_namespaces=(),
+        extra='forbid' if kind in ('create', 'update') else 'ignore'
+    )
+    return create_model(model_name, __config__=config, **definitions)
+
+
+class ModelFactory:
+    """
+    Pydantic models built with create_model from TableInfo, cached by the
+    fingerprint of the table definition
+
+    Every user of a table (dynamic API validation, schema docs) shares
+    one set of compiled validators. A changed definition has a new
+    fingerprint, so stale models are simply never asked for again and age
+    out of the LRU.
+    """
+
+    def __init__(self, max_size: int = MODEL_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._models: 'OrderedDict[str, TableModels]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def models_for(self, table_info, fingerprint: Optional[str] = None) -> TableModels:
+        key = fingerprint or table_fingerprint(table_info)
+        with self._lock:
+            models = self._models.get(key)
+            if models is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return models
+            self.misses += 1
+
+        # Built outside the lock; a concurrent build of the same table is
+        # harmless, one of the results wins
+        name = pascal_case(table_info.name)
+        models = TableModels(
+            read=_build(table_info, 'read', name),
+            create=_build(table_info, 'create', f"{name}Create"),
+            update=_build(table_info, 'update', f"{name}Update"),
+            partial=_build(table_info, 'partial', f"{name}Partial"),
+            fingerprint=key
+        )
+        with self._lock:
+            self._models[key] = models
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+        return models
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._models), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+# Process-wide factory shared by the dynamic CRUD engine and the data API
+model_factory = ModelFactory()
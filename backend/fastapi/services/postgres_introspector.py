@@ -5,7 +5,7 @@ Analyzes PostgreSQL database tables and automatically generates CRUD APIs
 
 import psycopg2
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,6 +20,26 @@ class ColumnInfo:
     max_length: Optional[int]
     is_primary_key: bool
     is_identity: bool
+    has_default: bool = False
+
+
+@dataclass
+class ForeignKeyInfo:
+    """Foreign key constraint information"""
+    name: str
+    columns: List[str]
+    referenced_schema: str
+    referenced_table: str
+    referenced_columns: List[str]
+
+
+@dataclass
+class IndexInfo:
+    """Index information (key columns in index order)"""
+    name: str
+    columns: List[str]
+    is_unique: bool
+    is_primary_key: bool
 
 
 @dataclass
@@ -29,6 +49,9 @@ class TableInfo:
     name: str
     columns: List[ColumnInfo]
     primary_keys: List[str]
+    foreign_keys: List[ForeignKeyInfo] = field(default_factory=list)
+    indexes: List[IndexInfo] = field(default_factory=list)
+    row_estimate: Optional[int] = None
 
 
 class PostgreSQLIntrospector:
@@ -66,7 +89,8 @@ class PostgreSQLIntrospector:
             c.is_nullable,
             c.character_maximum_length,
             CASE WHEN pk.column_name IS NOT NULL THEN true ELSE false END as is_primary_key,
-            CASE WHEN c.column_default LIKE 'nextval%' THEN true ELSE false END as is_identity
+            CASE WHEN c.column_default LIKE 'nextval%%' THEN true ELSE false END as is_identity,
+            c.column_default IS NOT NULL as has_default
         FROM information_schema.columns c
         LEFT JOIN (
             SELECT ku.column_name
@@ -96,7 +120,8 @@ class PostgreSQLIntrospector:
                         is_nullable=row[2] == 'YES',
                         max_length=row[3],
                         is_primary_key=row[4],
-                        is_identity=row[5]
+                        is_identity=row[5],
+                        has_default=row[6]
                     )
                     columns.append(col)
                     
@@ -110,10 +135,221 @@ class PostgreSQLIntrospector:
                     primary_keys=primary_keys
                 )
     
-    def get_all_tables_info(self, schema: str = 'public') -> List[TableInfo]:
-        """Get information for all tables"""
+    def get_all_tables_info(self, schema: str = 'public', bulk: bool = True) -> List[TableInfo]:
+        """
+        Get information for all tables
+        
+        bulk reads the whole schema from pg_catalog in one query; otherwise
+        every table is introspected on its own connection (no foreign keys,
+        indexes or row estimates).
+        """
+        if bulk:
+            return self.get_schema_info(schema)
         tables = self.get_tables(schema)
         return [self.get_table_info(table, schema) for table in tables]
+    
+    def get_schema_info(self, schema: str = 'public', tables: Optional[List[str]] = None) -> List[TableInfo]:
+        """Get columns, keys, foreign keys, indexes and row estimates of all tables in schema, or only of `tables`"""
+        if tables is not None and not tables:
+            return []
+        
+        # One row per table, its details aggregated to JSON. Types and lengths
+        # are computed as information_schema.columns computes them.
+        query = """
+        SELECT
+            c.relname,
+            c.reltuples::bigint,
+            (
+                SELECT json_agg(json_build_object(
+                    'name', a.attname,
+                    'data_type', CASE
+                        WHEN t.typtype = 'd' THEN
+                            CASE
+                                WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+                                WHEN btn.nspname = 'pg_catalog' THEN format_type(t.typbasetype, NULL)
+                                ELSE 'USER-DEFINED'
+                            END
+                        WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+                        WHEN tn.nspname = 'pg_catalog' THEN format_type(a.atttypid, NULL)
+                        ELSE 'USER-DEFINED'
+                    END,
+                    'is_nullable', NOT a.attnotnull,
+                    'max_length', CASE
+                        WHEN a.atttypmod = -1 THEN NULL
+                        WHEN a.atttypid IN ('bpchar'::regtype, 'varchar'::regtype) THEN a.atttypmod - 4
+                        WHEN a.atttypid IN ('bit'::regtype, 'varbit'::regtype) THEN a.atttypmod
+                    END,
+                    'is_primary_key', COALESCE(a.attnum = ANY(pk.conkey), false),
+                    'is_identity', a.attidentity <> ''
+                        OR COALESCE(pg_get_expr(d.adbin, d.adrelid) LIKE 'nextval%%', false),
+                    'has_default', d.adbin IS NOT NULL
+                ) ORDER BY a.attnum)
+                FROM pg_attribute a
+                JOIN pg_type t ON t.oid = a.atttypid
+                JOIN pg_namespace tn ON tn.oid = t.typnamespace
+                LEFT JOIN pg_type bt ON bt.oid = t.typbasetype
+                LEFT JOIN pg_namespace btn ON btn.oid = bt.typnamespace
+                LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            ) AS columns,
+            (
+                SELECT json_agg(json_build_object(
+                    'name', con.conname,
+                    'columns', (
+                        SELECT array_agg(att.attname ORDER BY k.ord)
+                        FROM unnest(con.conkey) WITH ORDINALITY k(attnum, ord)
+                        JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = k.attnum
+                    ),
+                    'referenced_schema', rn.nspname,
+                    'referenced_table', rc.relname,
+                    'referenced_columns', (
+                        SELECT array_agg(att.attname ORDER BY k.ord)
+                        FROM unnest(con.confkey) WITH ORDINALITY k(attnum, ord)
+                        JOIN pg_attribute att ON att.attrelid = con.confrelid AND att.attnum = k.attnum
+                    )
+                ) ORDER BY con.conname)
+                FROM pg_constraint con
+                JOIN pg_class rc ON rc.oid = con.confrelid
+                JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+                WHERE con.conrelid = c.oid AND con.contype = 'f'
+            ) AS foreign_keys,
+            (
+                SELECT json_agg(json_build_object(
+                    'name', ic.relname,
+                    'columns', (
+                        SELECT array_agg(att.attname ORDER BY k.ord)
+                        FROM unnest(i.indkey) WITH ORDINALITY k(attnum, ord)
+                        JOIN pg_attribute att ON att.attrelid = i.indrelid AND att.attnum = k.attnum
+                        WHERE k.ord <= i.indnkeyatts
+                    ),
+                    'is_unique', i.indisunique,
+                    'is_primary_key', i.indisprimary
+                ) ORDER BY ic.relname)
+                FROM pg_index i
+                JOIN pg_class ic ON ic.oid = i.indexrelid
+                WHERE i.indrelid = c.oid
+            ) AS indexes
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_constraint pk ON pk.conrelid = c.oid AND pk.contype = 'p'
+        WHERE n.nspname = %s
+            AND c.relkind IN ('r', 'p')
+            AND (%s::text[] IS NULL OR c.relname = ANY(%s::text[]))
+            AND (
+                pg_has_role(c.relowner, 'USAGE')
+                OR has_table_privilege(c.oid, 'SELECT, INSERT, UPDATE, DELETE, TRUNCATE, REFERENCES, TRIGGER')
+            )
+        ORDER BY c.relname
+        """
+        
+        result = []
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                names = list(tables) if tables is not None else None
+                cursor.execute(query, (schema, names, names))
+                
+                # psycopg2 decodes the json columns into lists of dicts
+                for name, reltuples, columns, foreign_keys, indexes in cursor.fetchall():
+                    column_infos = [ColumnInfo(**col) for col in columns or []]
+                    result.append(TableInfo(
+                        schema=schema,
+                        name=name,
+                        columns=column_infos,
+                        # Column order, as in get_table_info (sync key strings depend on it)
+                        primary_keys=[col.name for col in column_infos if col.is_primary_key],
+                        foreign_keys=[ForeignKeyInfo(**fk) for fk in foreign_keys or []],
+                        indexes=[
+                            IndexInfo(**{**index, 'columns': index['columns'] or []})
+                            for index in indexes or []
+                        ],
+                        # -1: never vacuumed or analyzed (PostgreSQL 14+)
+                        row_estimate=reltuples if reltuples >= 0 else None
+                    ))
+        
+        return result
+    
+    def get_table_versions(self, schema: str = 'public') -> Dict[str, str]:
+        """
+        Cheap per-table definition version: a checksum over the catalog rows
+        of the table's columns, constraints and indexes
+        """
+        query = """
+        SELECT
+            c.relname,
+            md5(concat_ws('|',
+                (
+                    SELECT string_agg(concat_ws(',',
+                        a.attnum, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull,
+                        a.attidentity, pg_get_expr(d.adbin, d.adrelid)
+                    ), ';' ORDER BY a.attnum)
+                    FROM pg_attribute a
+                    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                    WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+                ),
+                (
+                    SELECT string_agg(concat_ws(',',
+                        con.conname, con.contype, con.conkey::text,
+                        con.confrelid::regclass::text, con.confkey::text
+                    ), ';' ORDER BY con.conname)
+                    FROM pg_constraint con
+                    WHERE con.conrelid = c.oid
+                ),
+                (
+                    SELECT string_agg(concat_ws(',',
+                        i.indexrelid::regclass::text, i.indkey::text, i.indnkeyatts, i.indisunique
+                    ), ';' ORDER BY i.indexrelid)
+                    FROM pg_index i
+                    WHERE i.indrelid = c.oid
+                )
+            ))
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s
+            AND c.relkind IN ('r', 'p')
+            AND (
+                pg_has_role(c.relowner, 'USAGE')
+                OR has_table_privilege(c.oid, 'SELECT, INSERT, UPDATE, DELETE, TRUNCATE, REFERENCES, TRIGGER')
+            )
+        ORDER BY c.relname
+        """
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (schema,))
+                return dict(cursor.fetchall())
+    
+    @staticmethod
+    def table_from_dict(data: Dict[str, Any]) -> TableInfo:
+        """Inverse of dataclasses.asdict(table_info)"""
+        return TableInfo(
+            schema=data['schema'],
+            name=data['name'],
+            columns=[ColumnInfo(**col) for col in data['columns']],
+            primary_keys=data['primary_keys'],
+            foreign_keys=[ForeignKeyInfo(**fk) for fk in data.get('foreign_keys', [])],
+            indexes=[IndexInfo(**index) for index in data.get('indexes', [])],
+            row_estimate=data.get('row_estimate')
+        )
+    
+    def get_table_dependencies(self, schema: str = 'public') -> Dict[str, List[str]]:
+        """Get tables referenced by foreign keys of each table in schema"""
+        query = """
+        SELECT src.relname, tgt.relname
+        FROM pg_constraint con
+        JOIN pg_class src ON src.oid = con.conrelid
+        JOIN pg_class tgt ON tgt.oid = con.confrelid
+        JOIN pg_namespace n ON n.oid = src.relnamespace
+        WHERE con.contype = 'f' AND n.nspname = %s
+        """
+        
+        dependencies: Dict[str, List[str]] = {}
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (schema,))
+                for table_name, referenced_table in cursor.fetchall():
+                    dependencies.setdefault(table_name, []).append(referenced_table)
+        
+        return dependencies
 
 
 # Type mapping for PostgreSQL
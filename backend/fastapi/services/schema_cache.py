@@ -0,0 +1,198 @@
+"""
+Schema Cache
+Persists introspected table definitions and re-introspects only tables whose definition changed
+"""
+
+from typing import List, Dict, Optional, Set
+from dataclasses import asdict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.schema_cache import SchemaSnapshot, SchemaTableSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Within this window repeat reads are served without contacting the database
+CACHE_MAX_AGE_SECONDS = 30
+
+# Bumped when TableInfo gains fields, so snapshots written without them
+# count as stale and are introspected again
+SNAPSHOT_FORMAT = 2
+
+
+def database_key(database_type: str, server: str, database: str, username: str) -> str:
+    """
+    Cache key of a database as seen by one login (credentials excluded)
+
+    The key alone does not prove access: SchemaCache checks the login
+    against the database before serving a snapshot.
+    """
+    return f"{database_type}://{username}@{server}/{database}"
+
+
+# sha256 of connection strings (password included) the database accepted -> when
+_verified_logins: Dict[str, float] = {}
+_verified_lock = threading.Lock()
+
+
+def schema_fingerprint(versions: Dict[str, str]) -> str:
+    """Fingerprint of a whole schema from its per-table versions"""
+    digest = hashlib.sha256()
+    for name in sorted(versions):
+        digest.update(f"{name}\0{versions[name]}\n".encode())
+    return digest.hexdigest()
+
+
+class SchemaCache:
+    """
+    Cached introspection of one database schema
+
+    The introspector must provide connection_string, get_connection,
+    get_table_versions (cheap, one query), get_schema_info(schema, tables)
+    and table_from_dict; both MSSQLIntrospector and PostgreSQLIntrospector do.
+
+    Snapshots are shared by everyone using the same server, database and
+    username. Before one is served without contacting the database, the
+    introspector's login is checked with a real connection, and that
+    check is reused for max_age.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        key: str,
+        introspector,
+        schema: str,
+        max_age_seconds: int = CACHE_MAX_AGE_SECONDS
+    ):
+        self.db = db
+        self.key = key
+        self.introspector = introspector
+        self.schema = schema
+        self.max_age = timedelta(seconds=max_age_seconds)
+        # Tables read from the database by the last tables() call
+        self.reintrospected: List[str] = []
+
+    def _snapshot(self) -> Optional[SchemaSnapshot]:
+        return self.db.query(SchemaSnapshot).filter(
+            SchemaSnapshot.database_key == self.key,
+            SchemaSnapshot.schema_name == self.schema
+        ).first()
+
+    def tables(self, refresh: bool = False) -> List:
+        """
+        Get the TableInfo of every table in the schema
+
+        Unless refresh is set, a snapshot checked within max_age is returned
+        as is. Otherwise the table versions are compared with the snapshot
+        and only new or changed tables are introspected.
+        """
+        self.reintrospected = []
+        snapshot = self._snapshot()
+        if (
+            snapshot is not None and not refresh
+            and snapshot.checked_at and datetime.utcnow() - snapshot.checked_at < self.max_age
+        ):
+            self._check_login()
+            return self._load(snapshot)
+
+        versions = {
+            name: f"{SNAPSHOT_FORMAT}/{version}"
+            for name, version in self.introspector.get_table_versions(self.schema).items()
+        }
+        fingerprint = schema_fingerprint(versions)
+        try:
+            snapshot = self._update(snapshot, versions, fingerprint)
+        except IntegrityError:
+            # Another request created the snapshot first; merge into it
+            self.db.rollback()
+            self.reintrospected = []
+            snapshot = self._update(self._snapshot(), versions, fingerprint)
+
+        return self._load(snapshot)
+
+    def _check_login(self):
+        """Connect once, so a wrong password is refused instead of served the cached schema"""
+        digest = hashlib.sha256(self.introspector.connection_string.encode()).hexdigest()
+        now = time.monotonic()
+        max_age = self.max_age.total_seconds()
+        with _verified_lock:
+            verified_at = _verified_logins.get(digest)
+        if verified_at is not None and now - verified_at < max_age:
+            return
+
+        self.introspector.get_connection().close()
+        with _verified_lock:
+            for stale in [d for d, at in _verified_logins.items() if now - at >= max_age]:
+                del _verified_logins[stale]
+            _verified_logins[digest] = now
+
+    def _update(
+        self,
+        snapshot: Optional[SchemaSnapshot],
+        versions: Dict[str, str],
+        fingerprint: str
+    ) -> SchemaSnapshot:
+        if snapshot is None:
+            snapshot = SchemaSnapshot(database_key=self.key, schema_name=self.schema)
+            self.db.add(snapshot)
+
+        if snapshot.fingerprint != fingerprint:
+            cached = {row.table_name: row for row in snapshot.tables}
+            for name in set(cached) - set(versions):
+                snapshot.tables.remove(cached.pop(name))
+
+            stale = [
+                name for name, version in versions.items()
+                if name not in cached or cached[name].version != version
+            ]
+            if stale:
+                for table in self.introspector.get_schema_info(self.schema, tables=stale):
+                    row = cached.get(table.name)
+                    if row is None:
+                        row = SchemaTableSnapshot(table_name=table.name)
+                        snapshot.tables.append(row)
+                    row.version = versions[table.name]
+                    row.table_info = json.dumps(asdict(table))
+                    self.reintrospected.append(table.name)
+                logger.info(
+                    f"Schema {self.key}/{self.schema}: re-introspected "
+                    f"{len(self.reintrospected)} of {len(versions)} tables"
+                )
+
+        snapshot.fingerprint = fingerprint
+        snapshot.checked_at = datetime.utcnow()
+        self.db.commit()
+        return snapshot
+
+    def _load(self, snapshot: SchemaSnapshot) -> List:
+        rows = sorted(snapshot.tables, key=lambda row: row.table_name)
+        return [self.introspector.table_from_dict(json.loads(row.table_info)) for row in rows]
+
+    def pending_generation(self, output_dir: str) -> Set[str]:
+        """Tables whose generated files in output_dir are missing or older than their definition"""
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return set()
+        return {
+            row.table_name for row in snapshot.tables
+            if row.generated_dir != output_dir or row.generated_version != row.version
+        }
+
+    def mark_generated(self, table_names: List[str], output_dir: str):
+        """Record that the files of these tables were written for their current version"""
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return
+        names = set(table_names)
+        for row in snapshot.tables:
+            if row.table_name in names:
+                row.generated_version = row.version
+                row.generated_dir = output_dir
+        self.db.commit()
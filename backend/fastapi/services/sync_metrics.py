@@ -0,0 +1,211 @@
+"""
+Sync Metrics
+Prometheus metrics for remote database sync, exported on /metrics
+
+Syncs run in Celery workers while /metrics is served by the API. Each
+service sets PROMETHEUS_MULTIPROC_DIR to a subdirectory of its own in a
+directory shared by all of them (e.g. /var/lib/berqenas/metrics/worker);
+every process writes its samples there and the API aggregates all
+subdirectories. entrypoint.sh empties a service's subdirectory when its
+container starts, so samples of processes from before a restart go away.
+"""
+
+from typing import List, Iterator, Iterable, Optional, Sequence
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import glob
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TABLE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+# Rows sampled per batch to estimate payload size
+PAYLOAD_SAMPLE_SIZE = 16
+
+ROWS_DETECTED = Counter(
+    'berqenas_sync_rows_detected_total',
+    'Changed rows read from a sync side',
+    ['remote', 'table', 'side']
+)
+ROWS_APPLIED = Counter(
+    'berqenas_sync_rows_applied_total',
+    'Rows written to a sync side',
+    ['remote', 'table', 'target']
+)
+ROWS_SUPPRESSED = Counter(
+    'berqenas_sync_rows_suppressed_total',
+    'Detected rows skipped: unchanged content or echoes of our own writes',
+    ['remote', 'table', 'side', 'reason']
+)
+CONFLICTS = Counter(
+    'berqenas_sync_conflicts_total',
+    'Rows changed differently on both sides',
+    ['remote', 'table', 'type']
+)
+ESTIMATED_PAYLOAD_BYTES = Counter(
+    'berqenas_sync_estimated_payload_bytes_total',
+    'Row payload read from or written to a side, estimated from the text length of sampled rows (not wire bytes)',
+    ['remote', 'side', 'direction']
+)
+FETCH_SECONDS = Histogram(
+    'berqenas_sync_fetch_seconds',
+    'Time to fetch one batch of changes (scan) or the counterparts of a batch (lookup)',
+    ['remote', 'side', 'kind'],
+    buckets=LATENCY_BUCKETS
+)
+APPLY_SECONDS = Histogram(
+    'berqenas_sync_apply_seconds',
+    'Time to apply one batch of changes',
+    ['remote', 'target'],
+    buckets=LATENCY_BUCKETS
+)
+REPLICATION_LAG = Gauge(
+    'berqenas_sync_replication_lag_seconds',
+    'Now minus the oldest change not yet applied',
+    ['remote', 'table', 'side'],
+    multiprocess_mode='mostrecent'
+)
+REPLICATION_SLOT_RETAINED_BYTES = Gauge(
+    'berqenas_sync_replication_slot_retained_bytes',
+    'WAL a native PostgreSQL remote retains for its replication slot',
+    ['remote'],
+    multiprocess_mode='mostrecent'
+)
+TABLE_SECONDS = Histogram(
+    'berqenas_sync_table_seconds',
+    'Wall time of one table sync task',
+    ['remote'],
+    buckets=TABLE_BUCKETS
+)
+TABLE_SYNCS = Counter(
+    'berqenas_sync_tables_total',
+    'Finished table sync tasks',
+    ['remote', 'status']
+)
+TABLES_IN_PROGRESS = Gauge(
+    'berqenas_sync_tables_in_progress',
+    'Table syncs currently holding a remote connection slot',
+    ['remote'],
+    multiprocess_mode='livesum'
+)
+SLOT_WAITS = Counter(
+    'berqenas_sync_slot_waits_total',
+    'Table sync tasks requeued because their remote had no free connection slot',
+    ['remote']
+)
+
+
+class SharedMetricsCollector:
+    """
+    Samples of every process of every container under the shared metrics
+    directory, laid out as <root>/<service>/<container>/ by entrypoint.sh
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def collect(self):
+        files = glob.glob(os.path.join(self.root, '*', '*', '*.db'))
+        return multiprocess.MultiProcessCollector.merge(files, accumulate=True)
+
+
+def metrics_registry():
+    """Registry to export: aggregated over all processes in multiprocess mode"""
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        registry = CollectorRegistry()
+        # This container's directory is <root>/<service>/<container>
+        root = os.path.dirname(os.path.dirname(os.path.normpath(directory)))
+        registry.register(SharedMetricsCollector(root))
+        return registry
+    return REGISTRY
+
+
+def _age_seconds(timestamp: datetime, now: datetime) -> float:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return max(0.0, (now - timestamp).total_seconds())
+
+
+def estimate_payload_bytes(changes: Sequence) -> int:
+    """Estimate the size of a batch from the text length of a sample of its rows"""
+    if not changes:
+        return 0
+    step = max(1, len(changes) // PAYLOAD_SAMPLE_SIZE)
+    sample = [c for c in changes[::step] if c.data is not None][:PAYLOAD_SAMPLE_SIZE]
+    if not sample:
+        return 0
+    sampled = sum(len(str(tuple(c.data.values()))) for c in sample)
+    return sampled * len(changes) // len(sample)
+
+
+class TableSyncMetrics:
+    """Metrics of one table sync, labelled with its remote and table"""
+
+    def __init__(self, remote: Optional[str], table_name: str):
+        self.remote = remote or 'unknown'
+        self.table_name = table_name
+
+    def timed_batches(self, side: str, batches: Iterable[List]) -> Iterator[List]:
+        """Pass change batches through, timing each fetch and counting its rows"""
+        iterator = iter(batches)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            FETCH_SECONDS.labels(self.remote, side, 'scan').observe(time.perf_counter() - start)
+            self.detected(side, batch)
+            yield batch
+
+    @contextmanager
+    def timed_lookup(self, side: str):
+        """Time a lookup of changes by key"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            FETCH_SECONDS.labels(self.remote, side, 'lookup').observe(time.perf_counter() - start)
+
+    def detected(self, side: str, changes: Sequence):
+        ROWS_DETECTED.labels(self.remote, self.table_name, side).inc(len(changes))
+        ESTIMATED_PAYLOAD_BYTES.labels(self.remote, side, 'read').inc(estimate_payload_bytes(changes))
+        timestamps = [c.timestamp for c in changes if c.timestamp is not None]
+        if timestamps:
+            self.lag(side, min(timestamps))
+
+    def suppressed(self, side: str, reason: str, count: int):
+        if count:
+            ROWS_SUPPRESSED.labels(self.remote, self.table_name, side, reason).inc(count)
+
+    def conflicts(self, conflicts: Sequence):
+        for conflict in conflicts:
+            CONFLICTS.labels(self.remote, self.table_name, conflict.conflict_type).inc()
+
+    @contextmanager
+    def timed_apply(self, target: str, changes: Sequence):
+        """Time applying a batch and count its rows once it succeeded"""
+        start = time.perf_counter()
+        yield
+        if not changes:
+            return
+        APPLY_SECONDS.labels(self.remote, target).observe(time.perf_counter() - start)
+        ROWS_APPLIED.labels(self.remote, self.table_name, target).inc(len(changes))
+        ESTIMATED_PAYLOAD_BYTES.labels(self.remote, target, 'written').inc(estimate_payload_bytes(changes))
+
+    def lag(self, side: str, oldest_unapplied: Optional[datetime]):
+        """Record the age of the oldest change on `side` that is not applied yet"""
+        if oldest_unapplied is None:
+            return
+        REPLICATION_LAG.labels(self.remote, self.table_name, side).set(
+            _age_seconds(oldest_unapplied, datetime.utcnow())
+        )
+
+    def caught_up(self, side: str, window_start: datetime):
+        """Everything up to the start of the sync window is applied"""
+        self.lag(side, window_start)
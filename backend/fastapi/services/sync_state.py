@@ -0,0 +1,167 @@
+"""
+Sync State Store
+Persists per-table sync watermarks, resume positions and the pk -> row hash index
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, date
+from decimal import Decimal
+import json
+import logging
+import uuid
+from sqlalchemy.orm import Session
+
+from models.remote import SyncCheckpoint, SyncRowHash
+
+logger = logging.getLogger(__name__)
+
+# Keys per IN (...) lookup; stays under SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _encode(value: Any):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"__bytes__": bytes(value).hex()}
+    raise TypeError(f"Cannot serialize {type(value).__name__} in sync state")
+
+
+def _decode(obj: Dict[str, Any]):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    if "__decimal__" in obj:
+        return Decimal(obj["__decimal__"])
+    if "__bytes__" in obj:
+        return bytes.fromhex(obj["__bytes__"])
+    return obj
+
+
+def dump_state(value: Any) -> Optional[str]:
+    """Serialize a watermark or keyset position, keeping its Python types"""
+    if value is None:
+        return None
+    return json.dumps(value, default=_encode)
+
+
+def load_state(text: Optional[str]) -> Any:
+    """Inverse of dump_state; keyset positions come back as tuples"""
+    if text is None:
+        return None
+    value = json.loads(text, object_hook=_decode)
+    return tuple(value) if isinstance(value, list) else value
+
+
+class SyncStateStore:
+    """Checkpoints and row hash index for the tables of one remote database"""
+
+    def __init__(self, db: Session, remote_db_id: int, job_id: Optional[int] = None):
+        self.db = db
+        self.remote_db_id = remote_db_id
+        self.job_id = job_id
+
+    def _checkpoint(self, table_name: str) -> SyncCheckpoint:
+        checkpoint = self.db.query(SyncCheckpoint).filter(
+            SyncCheckpoint.remote_db_id == self.remote_db_id,
+            SyncCheckpoint.table_name == table_name
+        ).first()
+        if checkpoint is None:
+            checkpoint = SyncCheckpoint(remote_db_id=self.remote_db_id, table_name=table_name)
+            self.db.add(checkpoint)
+        return checkpoint
+
+    def load_checkpoint(self, table_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the stored state of a table
+
+        Returns:
+            {
+                'watermarks': {'cloud': ..., 'local': ...},  # Where the next run starts
+                'positions': {'cloud': ..., 'local': ...}    # Set if the last run did not finish
+            }
+        """
+        checkpoint = self._checkpoint(table_name)
+        positions = {
+            'cloud': load_state(checkpoint.cloud_position),
+            'local': load_state(checkpoint.local_position)
+        }
+        return {
+            'watermarks': {
+                'cloud': load_state(checkpoint.cloud_watermark),
+                'local': load_state(checkpoint.local_watermark)
+            },
+            'positions': {side: p for side, p in positions.items() if p is not None}
+        }
+
+    def save_position(self, table_name: str, side: str, position: tuple):
+        """Record progress after a batch has been applied"""
+        checkpoint = self._checkpoint(table_name)
+        setattr(checkpoint, f"{side}_position", dump_state(position))
+        checkpoint.last_job_id = self.job_id
+        self.db.commit()
+
+    def complete(self, table_name: str, watermarks: Dict[str, Any], echoes_suppressed: int = 0):
+        """Advance the watermarks once a table finished and drop its resume positions"""
+        checkpoint = self._checkpoint(table_name)
+        checkpoint.echoes_suppressed = (checkpoint.echoes_suppressed or 0) + echoes_suppressed
+        checkpoint.cloud_watermark = dump_state(watermarks.get('cloud'))
+        checkpoint.local_watermark = dump_state(watermarks.get('local'))
+        checkpoint.cloud_position = None
+        checkpoint.local_position = None
+        checkpoint.last_job_id = self.job_id
+        self.db.commit()
+
+    def get_hashes(self, table_name: str, keys: List[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """
+        Look up the last agreed row hash for each primary key value
+
+        Returns {key: (row_hash, written_to)}, where written_to is the side
+        the sync itself wrote that version to (None if both sides already
+        had it).
+        """
+        hashes = {}
+        unique_keys = list(set(keys))
+        for i in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+            rows = self.db.query(
+                SyncRowHash.primary_key_value, SyncRowHash.row_hash, SyncRowHash.written_to
+            ).filter(
+                SyncRowHash.remote_db_id == self.remote_db_id,
+                SyncRowHash.table_name == table_name,
+                SyncRowHash.primary_key_value.in_(unique_keys[i:i + LOOKUP_CHUNK_SIZE])
+            ).all()
+            hashes.update({key: (row_hash, written_to) for key, row_hash, written_to in rows})
+        return hashes
+
+    def put_hashes(self, table_name: str, hashes: Dict[str, str], written_to: Optional[str] = None):
+        """Store the agreed row hash for each primary key value"""
+        if not hashes:
+            return
+
+        keys = list(hashes)
+        for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            self.db.query(SyncRowHash).filter(
+                SyncRowHash.remote_db_id == self.remote_db_id,
+                SyncRowHash.table_name == table_name,
+                SyncRowHash.primary_key_value.in_(keys[i:i + LOOKUP_CHUNK_SIZE])
+            ).delete(synchronize_session=False)
+
+        self.db.bulk_insert_mappings(SyncRowHash, [
+            {
+                'remote_db_id': self.remote_db_id,
+                'table_name': table_name,
+                'primary_key_value': key,
+                'row_hash': row_hash,
+                'written_to': written_to,
+                'job_id': self.job_id
+            }
+            for key, row_hash in hashes.items()
+        ])
+        self.db.commit()
@@ -0,0 +1,398 @@
+"""
+Remote Sync Celery Tasks
+Fans a RemoteDatabase sync out into per-table tasks, ordered by foreign keys
+and capped per remote so on-premise servers are not overloaded
+"""
+
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import time
+import uuid
+import redis
+from celery import chain, group
+from celery.signals import worker_process_shutdown
+
+from celery_app import celery_app, REDIS_URL
+from database import SessionLocal
+from models.remote import RemoteDatabase, SyncJob, SyncLog, SyncCheckpoint
+from services.sync_state import SyncStateStore, load_state
+from services import sync_metrics
+
+logger = logging.getLogger(__name__)
+
+# Berqenas Cloud database that remotes are synced into
+CLOUD_DATABASE_URL = os.getenv("CLOUD_DATABASE_URL", os.getenv("DATABASE_URL", ""))
+
+# Seconds a table task waits before retrying when its remote has no free slot
+SLOT_RETRY_SECONDS = 15
+# A slot is released automatically if its worker dies without releasing it
+SLOT_LEASE_SECONDS = int(os.getenv("SYNC_SLOT_LEASE_SECONDS", 6 * 60 * 60))
+# Warn when a native PostgreSQL remote's replication slot retains more WAL than this
+SLOT_LAG_WARN_BYTES = int(os.getenv("SYNC_SLOT_LAG_WARN_BYTES", 1024 ** 3))
+
+
+class RemoteConnectionLimiter:
+    """
+    Cluster-wide counting semaphore per remote database (Redis sorted set)
+
+    Members are slot tokens scored by lease expiry, so slots held by a
+    crashed worker expire instead of blocking the remote forever.
+    """
+
+    ACQUIRE_SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, lease_seconds: int = SLOT_LEASE_SECONDS):
+        self.client = redis.Redis.from_url(redis_url)
+        self.lease_seconds = lease_seconds
+        self._acquire = self.client.register_script(self.ACQUIRE_SCRIPT)
+
+    @staticmethod
+    def _key(remote_db_id: int) -> str:
+        return f"berqenas:sync:slots:{remote_db_id}"
+
+    def acquire(self, remote_db_id: int, limit: int) -> Optional[str]:
+        """Take a slot, returning its token, or None if the remote is at its limit"""
+        now = time.time()
+        token = uuid.uuid4().hex
+        acquired = self._acquire(
+            keys=[self._key(remote_db_id)],
+            args=[now, now + self.lease_seconds, limit, token]
+        )
+        return token if acquired else None
+
+    def release(self, remote_db_id: int, token: str):
+        """Give a slot back"""
+        self.client.zrem(self._key(remote_db_id), token)
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid=None, **kwargs):
+    """Drop live gauges of an exiting worker process from the shared metrics directory"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def build_connection_string(remote_db: RemoteDatabase) -> str:
+    """Build a driver connection string for a remote reached over WireGuard"""
+    if remote_db.database_type == 'mssql':
+        return (
+            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+            f"SERVER={remote_db.wireguard_ip},{remote_db.database_port};"
+            f"DATABASE={remote_db.database_name};"
+            f"UID={remote_db.username};"
+            f"PWD={remote_db.password}"
+        )
+    return (
+        f"host={remote_db.wireguard_ip} port={remote_db.database_port} "
+        f"dbname={remote_db.database_name} user={remote_db.username} password={remote_db.password}"
+    )
+
+
+def get_remote_introspector(remote_db: RemoteDatabase):
+    """Get the schema introspector matching the remote database type"""
+    connection_string = build_connection_string(remote_db)
+    if remote_db.database_type == 'mssql':
+        from services.auto_api_generator import MSSQLIntrospector
+        return MSSQLIntrospector(connection_string)
+    elif remote_db.database_type == 'postgresql':
+        from services.postgres_introspector import PostgreSQLIntrospector
+        return PostgreSQLIntrospector(connection_string)
+    raise ValueError(f"Unsupported database type: {remote_db.database_type}")
+
+
+def order_tables_by_dependencies(
+    tables: List[str],
+    dependencies: Dict[str, List[str]]
+) -> List[List[str]]:
+    """
+    Group tables into levels so referenced tables sync before referencing ones
+
+    Tables within a level are independent and can sync in parallel.
+    Tables caught in a foreign key cycle are placed in a final level.
+    """
+    table_set = set(tables)
+    pending = {
+        t: {d for d in dependencies.get(t, []) if d in table_set and d != t}
+        for t in tables
+    }
+
+    levels = []
+    while pending:
+        ready = sorted(t for t, deps in pending.items() if not deps)
+        if not ready:
+            logger.warning(f"Foreign key cycle between tables: {sorted(pending)}")
+            levels.append(sorted(pending))
+            break
+
+        levels.append(ready)
+        for t in ready:
+            del pending[t]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+    return levels
+
+
+def _log(db, job_id: int, message: str, level: str = "info"):
+    db.add(SyncLog(job_id=job_id, level=level, message=message))
+    db.commit()
+
+
+def _save_batch_tuning(db, remote_db_id: int, sizes: Dict[str, int]):
+    """Persist learned batch sizes so the next run starts from them (also after failures)"""
+    try:
+        db.rollback()
+        db.query(RemoteDatabase).filter(RemoteDatabase.id == remote_db_id).update(
+            {
+                RemoteDatabase.sync_fetch_batch_size: sizes['fetch'],
+                RemoteDatabase.sync_apply_batch_size: sizes['apply']
+            },
+            synchronize_session=False
+        )
+        db.commit()
+    except Exception as e:
+        logger.warning(f"Could not save batch tuning for remote {remote_db_id}: {e}")
+
+
+def _release_change_log(db, job: SyncJob, tables: Optional[List[str]] = None):
+    """
+    Advance a native PostgreSQL remote's replication slot past what every table has synced
+
+    The slot moves to the oldest watermark of the job's tables, so a table
+    that failed holds it at its last successful run rather than blocking
+    it for good. Tables that never finished a run have no watermark; they
+    start from a snapshot. Warns when the slot retains much WAL.
+    """
+    remote_db = job.remote_db
+    if remote_db.change_source != 'native' or remote_db.database_type != 'postgresql':
+        return
+
+    from services.change_sources import PostgresLogicalReplicationSource, lsn_to_int
+
+    query = db.query(SyncCheckpoint).filter(SyncCheckpoint.remote_db_id == remote_db.id)
+    if tables is not None:
+        query = query.filter(SyncCheckpoint.table_name.in_(tables))
+    else:
+        query = query.filter(SyncCheckpoint.last_job_id == job.id)
+    watermarks = [load_state(c.local_watermark) for c in query.all()]
+    lsns = [w['lsn'] for w in watermarks if isinstance(w, dict) and 'lsn' in w]
+
+    try:
+        source = PostgresLogicalReplicationSource(build_connection_string(remote_db))
+        if lsns:
+            source.advance_slot(min(lsns, key=lsn_to_int))
+        retained = source.retained_wal_bytes()
+    except Exception as e:
+        # Not fatal: the slot only retains more WAL until the next run
+        logger.warning(f"Could not advance replication slot for remote {remote_db.id}: {e}")
+        _log(db, job.id, f"Could not advance replication slot: {e}", "warning")
+        return
+
+    if retained is None:
+        return
+    sync_metrics.REPLICATION_SLOT_RETAINED_BYTES.labels(remote_db.name).set(retained)
+    if retained > SLOT_LAG_WARN_BYTES:
+        message = (
+            f"Replication slot retains {retained / 1024 ** 2:,.0f} MiB of WAL; "
+            f"a table that keeps failing holds it back"
+        )
+        logger.warning(f"Remote {remote_db.id}: {message}")
+        _log(db, job.id, message, "warning")
+
+
+@celery_app.task(name="services.sync_tasks.run_remote_sync")
+def run_remote_sync(job_id: int):
+    """Plan a remote database sync and dispatch its per-table tasks"""
+    db = SessionLocal()
+    try:
+        job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+        if not job:
+            return
+        remote_db = job.remote_db
+
+        try:
+            introspector = get_remote_introspector(remote_db)
+            tables = introspector.get_all_tables_info(remote_db.schema)
+            dependencies = introspector.get_table_dependencies(remote_db.schema)
+        except Exception as e:
+            job.status = "failed"
+            job.error_message = str(e)
+            job.completed_at = datetime.utcnow()
+            _log(db, job_id, f"Sync planning failed: {e}", "error")
+            return
+
+        if remote_db.sync_tables:
+            selected = set(json.loads(remote_db.sync_tables))
+            tables = [t for t in tables if t.name in selected]
+
+        primary_keys = {}
+        for table in tables:
+            if table.primary_keys:
+                primary_keys[table.name] = table.primary_keys
+            else:
+                _log(db, job_id, f"Skipping {table.name}: no primary key", "warning")
+
+        levels = order_tables_by_dependencies(list(primary_keys), dependencies)
+
+        job.status = "running"
+        _log(db, job_id, f"Syncing {len(primary_keys)} tables in {len(levels)} dependency levels")
+
+        # Levels run one after another; tables inside a level run in parallel
+        workflow = chain(
+            *[
+                group(sync_table_task.si(job_id, table, primary_keys[table]) for table in level)
+                for level in levels
+            ],
+            finalize_remote_sync.si(job_id, list(primary_keys))
+        )
+        workflow.apply_async()
+    finally:
+        db.close()
+
+
+@celery_app.task(name="services.sync_tasks.sync_table_task", bind=True, max_retries=None)
+def sync_table_task(self, job_id: int, table_name: str, primary_keys: List[str]) -> Dict[str, Any]:
+    """Sync one table of a remote database, holding one of its connection slots"""
+    from services.bidirectional_sync import BiDirectionalSync, DEFAULT_BATCH_SIZE
+    from services.bulk_apply import DEFAULT_APPLY_BATCH_SIZE
+
+    db = SessionLocal()
+    limiter = RemoteConnectionLimiter()
+    try:
+        # A task that raises would stop the chain before finalize_remote_sync,
+        # leaving the job running forever; failures are returned instead
+        try:
+            job = db.query(SyncJob).filter(SyncJob.id == job_id).one()
+            remote_db = job.remote_db
+            token = limiter.acquire(remote_db.id, remote_db.max_sync_connections or 4)
+        except Exception as e:
+            logger.error(f"Could not start sync of table {table_name} (job {job_id}): {e}")
+            db.rollback()
+            _log(db, job_id, f"Table {table_name} failed to start: {e}", "error")
+            return {'table': table_name, 'error': str(e)}
+
+        if token is None:
+            sync_metrics.SLOT_WAITS.labels(remote_db.name).inc()
+            raise self.retry(countdown=SLOT_RETRY_SECONDS)
+
+        in_progress = sync_metrics.TABLES_IN_PROGRESS.labels(remote_db.name)
+        in_progress.inc()
+        started = time.perf_counter()
+        syncer = None
+        try:
+            state = SyncStateStore(db, remote_db.id, job_id)
+            checkpoint = state.load_checkpoint(table_name)
+            # Batch sizes start from what earlier runs learned about this remote's link
+            syncer = BiDirectionalSync(
+                cloud_connection=CLOUD_DATABASE_URL,
+                local_connection=build_connection_string(remote_db),
+                database_type=remote_db.database_type,
+                conflict_strategy=remote_db.conflict_strategy or 'latest_wins',
+                batch_size=remote_db.sync_fetch_batch_size or DEFAULT_BATCH_SIZE,
+                apply_batch_size=remote_db.sync_apply_batch_size or DEFAULT_APPLY_BATCH_SIZE,
+                state=state,
+                change_source=remote_db.change_source or 'polling',
+                remote_name=remote_db.name,
+                adaptive=True
+            )
+            # Watermarks and resume positions come from the table's own checkpoint
+            result = syncer.sync_table(
+                table_name,
+                primary_keys,
+                checkpoint['watermarks']['cloud'] or datetime(1970, 1, 1),
+                checkpoint['watermarks']['local'],
+                checkpoint['positions']
+            )
+        except Exception as e:
+            logger.error(f"Sync failed for table {table_name} (job {job_id}): {e}")
+            _log(db, job_id, f"Table {table_name} failed: {e}", "error")
+            sync_metrics.TABLE_SYNCS.labels(remote_db.name, 'failed').inc()
+            return {'table': table_name, 'error': str(e)}
+        finally:
+            limiter.release(remote_db.id, token)
+            in_progress.dec()
+            sync_metrics.TABLE_SECONDS.labels(remote_db.name).observe(time.perf_counter() - started)
+            if syncer is not None:
+                _save_batch_tuning(db, remote_db.id, syncer.tuned_batch_sizes())
+
+        sync_metrics.TABLE_SYNCS.labels(remote_db.name, 'completed').inc()
+
+        synced = result['cloud_to_local'] + result['local_to_cloud']
+        # Atomic increment; sibling table tasks update the same job concurrently
+        db.query(SyncJob).filter(SyncJob.id == job_id).update(
+            {SyncJob.records_synced: SyncJob.records_synced + synced},
+            synchronize_session=False
+        )
+        _log(
+            db, job_id,
+            f"Table {table_name}: {result['cloud_to_local']} to local, "
+            f"{result['local_to_cloud']} to cloud, {len(result['conflicts'])} conflicts, "
+            f"{sum(result['echoes_suppressed'].values())} echoes suppressed"
+        )
+        return {'table': table_name, 'synced': synced}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="services.sync_tasks.finalize_remote_sync")
+def finalize_remote_sync(job_id: int, tables: Optional[List[str]] = None):
+    """Close out a sync job once every table task has finished"""
+    db = SessionLocal()
+    try:
+        job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+        if not job:
+            return
+
+        failed = db.query(SyncLog).filter(SyncLog.job_id == job_id, SyncLog.level == "error").count()
+        job.completed_at = datetime.utcnow()
+        if failed:
+            job.status = "failed"
+            job.error_message = f"{failed} tables failed to sync"
+        else:
+            job.status = "completed"
+            # Changes made while the job ran are picked up by the next run
+            job.remote_db.last_sync = job.started_at
+        # Tables that did sync let the slot advance even if others failed
+        _release_change_log(db, job, tables)
+
+        _log(db, job_id, f"Sync {job.status}. Synced {job.records_synced} records.")
+    finally:
+        db.close()
+
+
+@celery_app.task(name="services.sync_tasks.dispatch_due_syncs")
+def dispatch_due_syncs():
+    """Start syncs for remotes whose interval has elapsed (run by Celery beat)"""
+    from services.bidirectional_sync import SyncScheduler
+
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        remotes = db.query(RemoteDatabase).filter(
+            RemoteDatabase.is_active == True,
+            RemoteDatabase.sync_interval_minutes.isnot(None)
+        ).all()
+
+        scheduler = SyncScheduler()
+        for remote_db in remotes:
+            if remote_db.last_sync and remote_db.last_sync + timedelta(minutes=remote_db.sync_interval_minutes) > now:
+                continue
+            in_progress = db.query(SyncJob).filter(
+                SyncJob.remote_db_id == remote_db.id,
+                SyncJob.status.in_(["pending", "running"])
+            ).count()
+            if not in_progress:
+                scheduler.run_sync_now(remote_db.id, db)
+    finally:
+        db.close()
@@ -0,0 +1,30 @@
+-- Berqenas Remote Sync Migration
+-- This script adds the sync settings of remote_databases to an existing platform database
+
+-- Base.metadata.create_all creates the new sync tables (sync_checkpoints,
+-- sync_row_hashes, schema_snapshots, ...) on startup, but it never adds
+-- columns to a table that already exists. Run this once against the
+-- platform database before starting the new API and workers:
+--
+--   psql "$DATABASE_URL" -f infra/postgres/remote_sync_migration.sql
+--
+-- MIGRATION: safe on a live database. On PostgreSQL 11+ adding a column
+-- with a constant default does not rewrite the table, so each ALTER only
+-- holds its ACCESS EXCLUSIVE lock for a moment. Re-running it is a no-op.
+
+BEGIN;
+
+-- Interval schedule persisted by SyncScheduler; NULL = manual sync only
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS sync_interval_minutes INTEGER;
+-- JSON list of tables to sync; NULL = all tables
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS sync_tables TEXT;
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS conflict_strategy VARCHAR DEFAULT 'latest_wins';
+-- Concurrent table syncs against the remote (its Redis lease semaphore)
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS max_sync_connections INTEGER DEFAULT 4;
+-- polling, or native (Change Tracking / logical replication)
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS change_source VARCHAR DEFAULT 'polling';
+-- Batch sizes learned by adaptive batching; NULL = start from the default
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS sync_fetch_batch_size INTEGER;
+ALTER TABLE remote_databases ADD COLUMN IF NOT EXISTS sync_apply_batch_size INTEGER;
+
+COMMIT;
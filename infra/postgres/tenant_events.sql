@@ -11,9 +11,26 @@ CREATE TABLE IF NOT EXISTS tenant_:tenant_name.events (
   processed BOOLEAN DEFAULT false,
   processed_at TIMESTAMPTZ,
   error_message TEXT,
-  retry_count INTEGER DEFAULT 0
+  retry_count INTEGER DEFAULT 0,
+  seq BIGINT GENERATED ALWAYS AS IDENTITY
 );
 
+-- Insertion order, named by notifications (schemas created before it existed)
+--
+-- MIGRATION: run in a maintenance window on existing tenants. Adding an
+-- identity column rewrites the whole table to number its rows, holding
+-- an ACCESS EXCLUSIVE lock throughout: every insert, COPY and read of
+-- the events table waits until it is done. Stop ingestion (or scale the
+-- API down) first, and expect time roughly proportional to table size.
+-- The unique index below is built without CONCURRENTLY and blocks
+-- writes as well; on a table that already has seq it is a no-op. On new
+-- schemas both statements are no-ops.
+ALTER TABLE tenant_:tenant_name.events
+  ADD COLUMN IF NOT EXISTS seq BIGINT GENERATED ALWAYS AS IDENTITY;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_events_seq
+  ON tenant_:tenant_name.events (seq);
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_events_device_timestamp 
   ON tenant_:tenant_name.events (device_id, timestamp DESC);
@@ -29,27 +46,45 @@ CREATE INDEX IF NOT EXISTS idx_events_timestamp
   ON tenant_:tenant_name.events (timestamp DESC);
 
 -- Create NOTIFY trigger function
-CREATE OR REPLACE FUNCTION tenant_:tenant_name.notify_event()
+-- Once per INSERT/COPY statement, not per row: notifies the seq ranges of
+-- the inserted rows, {"r": [[first, last], ...]}, in chunks well below the
+-- 8000 byte NOTIFY limit. Listeners fetch the events themselves, so
+-- payload size does not matter and the writer serializes nothing.
+CREATE OR REPLACE FUNCTION tenant_:tenant_name.notify_events()
 RETURNS TRIGGER AS $$
+DECLARE
+  ranges TEXT;
 BEGIN
-  PERFORM pg_notify(
-    'tenant_:tenant_name_events',
-    json_build_object(
-      'id', NEW.id,
-      'device_id', NEW.device_id,
-      'event_type', NEW.event_type,
-      'timestamp', NEW.timestamp,
-      'payload', NEW.payload
-    )::text
-  );
-  RETURN NEW;
+  FOR ranges IN
+    SELECT string_agg(format('[%s,%s]', first_seq, last_seq), ',' ORDER BY first_seq)
+    FROM (
+      SELECT
+        min(seq) AS first_seq,
+        max(seq) AS last_seq,
+        (row_number() OVER (ORDER BY min(seq)) - 1) / 150 AS chunk
+      FROM (
+        SELECT seq, seq - row_number() OVER (ORDER BY seq) AS island
+        FROM inserted
+      ) numbered
+      GROUP BY island
+    ) islands
+    GROUP BY chunk
+  LOOP
+    PERFORM pg_notify('tenant_:tenant_name_events', '{"r":[' || ranges || ']}');
+  END LOOP;
+  RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Replace the per-row trigger of earlier versions of this script
+DROP TRIGGER IF EXISTS event_notify ON tenant_:tenant_name.events;
+DROP FUNCTION IF EXISTS tenant_:tenant_name.notify_event();
+
 -- Create trigger for real-time notifications
 CREATE TRIGGER event_notify
 AFTER INSERT ON tenant_:tenant_name.events
-FOR EACH ROW EXECUTE FUNCTION tenant_:tenant_name.notify_event();
+REFERENCING NEW TABLE AS inserted
+FOR EACH STATEMENT EXECUTE FUNCTION tenant_:tenant_name.notify_events();
 
 -- Create function to mark event as processed
 CREATE OR REPLACE FUNCTION tenant_:tenant_name.mark_event_processed(